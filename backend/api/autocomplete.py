@@ -0,0 +1,77 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from recipes.models import Ingredient
+
+
+def normalize(value):
+    """ Ключ поиска: без учета регистра и различия е/ё. """
+    return value.strip().lower().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+    Отсортированный по ключу список позволяет найти все совпадения
+    по началу названия двоичным поиском; совпадения внутри названия
+    добавляются следом, если лимит не исчерпан.
+    Индекс строится при первом обращении, сбрасывается сигналами
+    при изменении ингредиентов и перестраивается не реже чем
+    раз в INGREDIENT_INDEX_TTL секунд, чтобы изменения,
+    сделанные в других процессах, не терялись.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None
+        self._items = None
+        self._built_at = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._keys = None
+            self._items = None
+
+    def _build(self):
+        rows = sorted(
+            (normalize(name), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').order_by().iterator()
+        )
+        keys = [key for key, *_ in rows]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in rows
+        ]
+        return keys, items
+
+    def _get(self):
+        with self._lock:
+            expired = (time.monotonic() - self._built_at
+                       > settings.INGREDIENT_INDEX_TTL)
+            if self._keys is None or expired:
+                self._keys, self._items = self._build()
+                self._built_at = time.monotonic()
+            return self._keys, self._items
+
+    def search(self, query, limit=None):
+        """ Совпадения по началу названия, затем внутри названия. """
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        keys, items = self._get()
+        query = normalize(query)
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\uffff', start)
+        result = items[start:min(end, start + limit)]
+        if len(result) < limit:
+            for position, key in enumerate(keys):
+                if query in key and not key.startswith(query):
+                    result.append(items[position])
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,202 @@
+import hashlib
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers
+)
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+VERSION_KEY: str = 'version:{0}'
+LOCAL_CACHE_WARNING: str = (
+    'Кэш в памяти процесса (LocMemCache): веб-процессы увидят результат '
+    'не сразу, а после истечения версии из VERSION_TIMEOUTS. '
+    'Для нескольких процессов задайте общий кэш в CACHE_URL.')
+
+
+def version_key(model, scope=None):
+    """
+    Ключ версии модели. scope сужает версию до части данных:
+    пользователя, автора, тэга или отдельного рецепта.
+    """
+    label = model._meta.label_lower
+    if scope is not None:
+        label = f'{label}:{scope}'
+    return VERSION_KEY.format(label)
+
+
+def is_process_local_cache():
+    """
+    Кэш в памяти процесса: версии, которые записывает management-команда,
+    не видны веб-процессам, пока не истечет VERSION_TIMEOUTS.
+    """
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def _set_many(versions):
+    """ Запись версий; версии из VERSION_TIMEOUTS - с ограниченным
+    временем жизни, остальные - без него. """
+    groups = defaultdict(dict)
+    for key, version in versions.items():
+        label = key.partition(':')[2]
+        groups[settings.VERSION_TIMEOUTS.get(label)][key] = version
+    for timeout, group in groups.items():
+        cache.set_many(group, timeout)
+
+
+def bump_version(model, *scopes):
+    """
+    Новая версия данных модели (или её частей, если заданы scopes).
+    Версия - время изменения в наносекундах: она растет при каждом
+    изменении и не повторяется после очистки кэша.
+    """
+    version = time.time_ns()
+    _set_many(
+        {version_key(model, scope): version for scope in scopes or (None,)})
+
+
+def _get_many(keys):
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        _set_many(missing)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def get_versions(models, scope=None):
+    """ Текущие версии моделей; отсутствующие в кэше создаются. """
+    return _get_many([version_key(model, scope) for model in models])
+
+
+def get_scoped_versions(model, scopes):
+    """ Текущие версии частей данных модели. """
+    return _get_many([version_key(model, scope) for scope in scopes])
+
+
+class ConditionalGetMixin:
+    """
+    Условные GET-запросы для list и retrieve.
+    ETag и Last-Modified вычисляются по версиям моделей, от которых
+    зависит ответ, без обращения к базе данных. Если данные не менялись,
+    возвращается 304 и сериализация не выполняется.
+    version_models - общие данные, personal_models - данные пользователя
+    (избранное, корзина, подписки), для них ETag свой у каждого.
+    get_extra_versions - версии прочих данных, например рейтингов.
+    """
+    version_models = ()
+    personal_models = ()
+    cache_max_age = 0
+
+    def get_extra_versions(self, request, **kwargs):
+        """ Версии других данных, от которых зависит ответ. """
+        return []
+
+    def get_validators(self, request, **kwargs):
+        versions = get_versions(self.version_models)
+        versions += self.get_extra_versions(request, **kwargs)
+        user = request.user
+        personal = bool(self.personal_models) and user.is_authenticated
+        if personal:
+            versions += get_versions(self.personal_models, user.id)
+        source = '|'.join(
+            [request.get_full_path(), str(user.id if personal else '')]
+            + [str(version) for version in versions])
+        etag = quote_etag(hashlib.md5(source.encode()).hexdigest())
+        return etag, max(versions) // 10 ** 9, personal
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag, last_modified, personal = self.get_validators(
+            request, **kwargs)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            cache_control = {'max_age': self.cache_max_age}
+            if personal:
+                cache_control.update(private=True, no_cache=True)
+            else:
+                cache_control.update(public=True)
+            patch_cache_control(response, **cache_control)
+            if self.personal_models:
+                patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
+
+
+class ResponseCacheMixin:
+    """
+    Кэширование ответов list и retrieve для анонимных пользователей.
+    Ключ строится из нормализованных параметров запроса и версий
+    зависимостей: при изменении данных меняется версия, и устаревшие
+    записи больше не запрашиваются, а вытесняются кэшем (LRU).
+    Зависимости ответа задает get_response_dependencies;
+    response_cache_models - общие модели, изменение которых
+    затрагивает все ответы.
+    """
+    response_cache_model = None
+    response_cache_models = ()
+    response_cache_ignored_params = ()
+
+    def get_response_dependencies(self, request, **kwargs):
+        return ()
+
+    def get_response_cache_key(self, request, **kwargs):
+        params = sorted(
+            (name, sorted(value for value in values if value))
+            for name, values in request.query_params.lists()
+            if name not in self.response_cache_ignored_params
+        )
+        versions = get_versions(self.response_cache_models)
+        versions += get_scoped_versions(
+            self.response_cache_model,
+            self.get_response_dependencies(request, **kwargs))
+        source = '|'.join(
+            [request.get_host(), request.path, str(params)]
+            + [str(version) for version in versions])
+        return 'response:{0}'.format(hashlib.md5(source.encode()).hexdigest())
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = self.get_response_cache_key(request, **kwargs)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+
+def recipe_dependencies(recipe):
+    """ Части кэша, в которые может попасть рецепт. """
+    return (
+        'all',
+        f'recipe:{recipe.pk}',
+        f'author:{recipe.author_id}',
+        *(f'tag:{slug}' for slug in recipe.tags.values_list('slug', flat=True))
+    )
@@ -0,0 +1,108 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class Echo:
+    """
+    Псевдо-буфер для csv.writer: возвращает записанную строку.
+    """
+    def write(self, value):
+        return value
+
+
+class ShoppingListExporter(ABC):
+    """
+    Базовый класс выгрузки списка покупок.
+    Наследники задают формат строки, заголовок и окончание файла.
+    """
+    extension = None
+    content_type = None
+
+    def header(self):
+        return ()
+
+    @abstractmethod
+    def row(self, item):
+        """ Строка файла для одного ингредиента. """
+
+    def footer(self):
+        return ()
+
+    def stream(self, items):
+        """ Построчная выгрузка: файл не собирается в памяти целиком. """
+        yield from self.header()
+        for item in items:
+            yield self.row(item)
+        yield from self.footer()
+
+
+class TextExporter(ShoppingListExporter):
+    """ Выгрузка в текстовый файл. """
+    extension = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def row(self, item):
+        return (f'{item["ingredient__name"]} '
+                f'({item["ingredient__measurement_unit"]}) '
+                f'- {item["amount"]}\n')
+
+
+class CsvExporter(ShoppingListExporter):
+    """ Выгрузка в csv. """
+    extension = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+
+    def __init__(self):
+        self.writer = csv.writer(Echo())
+
+    def header(self):
+        yield self.writer.writerow(
+            ('Ингредиент', 'Единица измерения', 'Количество'))
+
+    def row(self, item):
+        return self.writer.writerow((
+            item['ingredient__name'],
+            item['ingredient__measurement_unit'],
+            item['amount'],
+        ))
+
+
+class JsonExporter(ShoppingListExporter):
+    """ Выгрузка в json: массив объектов, записываемый по частям. """
+    extension = 'json'
+    content_type = 'application/json'
+
+    def __init__(self):
+        self.separator = ''
+
+    def header(self):
+        yield '['
+
+    def row(self, item):
+        separator, self.separator = self.separator, ','
+        return separator + json.dumps({
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['amount'],
+        }, ensure_ascii=False)
+
+    def footer(self):
+        yield ']'
+
+
+EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (TextExporter, CsvExporter, JsonExporter)
+}
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """
+    Параметр ?format= задаёт формат файла выгрузки,
+    а не рендерер DRF.
+    """
+    def filter_renderers(self, renderers, format):
+        return renderers
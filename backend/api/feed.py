@@ -0,0 +1,104 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .caching import get_scoped_versions, get_versions
+from recipes.models import RecipeList
+from users.models import Subscribe
+
+AUTHOR_HEAD_KEY: str = 'feed-author:{0}:{1}'
+USER_HEAD_KEY: str = 'feed-user:{0}:{1}:{2}'
+
+
+def feed_scope(user_id):
+    """ Часть версии рецептов, от которой зависит лента пользователя. """
+    return f'feed:{user_id}'
+
+
+def author_heads(author_ids, size=settings.FEED_HEAD_SIZE):
+    """
+    Последние size рецептов каждого автора: списки (время публикации
+    в секундах, id) по убыванию; числа читаются из кэша быстрее дат.
+    Список автора хранится в кэше до изменения его рецептов и общий
+    для всех подписчиков; недостающие строятся одним запросом.
+    """
+    versions = get_scoped_versions(
+        RecipeList, [f'author:{author_id}' for author_id in author_ids])
+    keys = {
+        author_id: AUTHOR_HEAD_KEY.format(author_id, version)
+        for author_id, version in zip(author_ids, versions)
+    }
+    cached = cache.get_many(keys.values())
+    heads = {author_id: cached[key] for author_id, key in keys.items()
+             if key in cached}
+    missing = [author_id for author_id in author_ids
+               if author_id not in heads]
+    if missing:
+        for author_id in missing:
+            heads[author_id] = []
+        rows = RecipeList.objects.latest_per_author(missing, size).order_by(
+            'author_id', '-pub_date', '-id'
+        ).values_list('author_id', 'pub_date', 'id')
+        for author_id, pub_date, recipe_id in rows:
+            heads[author_id].append((pub_date.timestamp(), recipe_id))
+        cache.set_many(
+            {keys[author_id]: heads[author_id] for author_id in missing},
+            settings.RESPONSE_CACHE_TIMEOUT)
+    return [heads[author_id] for author_id in author_ids]
+
+
+def merge_heads(heads, size=settings.FEED_HEAD_SIZE):
+    """
+    Начало ленты слиянием отсортированных списков авторов.
+    Список автора не длиннее size, поэтому первые size элементов
+    слияния совпадают с началом полной ленты. complete - в ленте
+    нет других рецептов.
+    """
+    merged = list(islice(heapq.merge(*heads, reverse=True), size + 1))
+    complete = len(merged) <= size and all(
+        len(head) < size for head in heads)
+    return merged[:size], complete
+
+
+def feed_head(user, size=settings.FEED_HEAD_SIZE):
+    """
+    Начало ленты пользователя: ([(время, id), ...], complete).
+    Хранится в кэше до изменения подписок или публикации (удаления)
+    рецепта одним из авторов, на которых подписан пользователь.
+    """
+    subscribe_version, = get_versions((Subscribe,), user.id)
+    feed_version, = get_scoped_versions(RecipeList, (feed_scope(user.id),))
+    key = USER_HEAD_KEY.format(user.id, subscribe_version, feed_version)
+    head = cache.get(key)
+    if head is None:
+        author_ids = list(Subscribe.objects.filter(user=user).order_by(
+            'author_id').values_list('author_id', flat=True))
+        head = merge_heads(author_heads(author_ids, size), size)
+        cache.set(key, head, settings.RESPONSE_CACHE_TIMEOUT)
+    return head
+
+
+def covering_ids(head, cursor, position, page_size):
+    """
+    Ключи рецептов, среди которых лежит страница курсора вместе
+    с лишним рецептом для проверки следующей страницы, или None,
+    если страница выходит за начало ленты. position - (дата, id)
+    последнего рецепта предыдущей страницы.
+    """
+    items, complete = head
+    offset, after = 0, None
+    if cursor is not None:
+        if cursor.reverse:
+            return None
+        offset = cursor.offset
+    if position is not None:
+        pub_date, recipe_id = position
+        after = (pub_date.timestamp(), recipe_id)
+    ids = [recipe_id for pub_date, recipe_id in items
+           if after is None or (pub_date, recipe_id) < after]
+    needed = offset + page_size + 1
+    if len(ids) < needed and not complete:
+        return None
+    return ids[:needed]
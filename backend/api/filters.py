@@ -1,21 +1,147 @@
+from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (
+    Case,
+    Exists,
+    IntegerField,
+    OuterRef,
+    Value,
+    When
+)
 from django_filters import rest_framework as filters
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import RecipeList
+from .caching import get_versions
+from recipes.models import RecipeList, Tag, TagInRecipe
+from recipes.search import search_engine
 
 
-class IngredientFilter(SearchFilter):
+class IngredientFilter(BaseFilterBackend):
     """
-    Поиск по имени Ингредиента.
+    Поиск по имени Ингредиента средствами базы данных.
+    Сначала совпадения по началу названия, затем внутри названия.
     """
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param, '').strip()
+        if not name:
+            return queryset
+        return queryset.filter(name__icontains=name).annotate(
+            rank=Case(
+                When(name__istartswith=name, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField())
+        ).order_by('rank', 'name')[:settings.INGREDIENT_SEARCH_LIMIT]
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """
+    Полнотекстовый поиск рецептов ?search= по названию, ингредиентам
+    и описанию. Поисковый движок выбирается по базе данных
+    (recipes.search) и добавляет релевантность search_rank.
+    """
+    search_param = 'search'
+
+    @classmethod
+    def get_search_query(cls, request):
+        return request.query_params.get(cls.search_param, '').strip()[
+            :settings.SEARCH_QUERY_MAX_LENGTH]
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_query(request)
+        if not query:
+            return queryset
+        return search_engine().search(queryset, query)
+
+
+class RecipeOrderingFilter(BaseFilterBackend):
+    """
+    Сортировка рецептов ?ordering=popular|trending|cooking_time|-pub_date.
+    Сортировка идет по хранимым столбцам с индексами: счетчику избранного
+    и рейтингу, который пересчитывает команда update_trending.
+    Результаты поиска по умолчанию сортируются по релевантности.
+    Неизвестное значение - сортировка по умолчанию.
+    """
+    ordering_param = 'ordering'
+    default = '-pub_date'
+    search_default = 'relevance'
+    orderings = {
+        'popular': ('-favorites_count', '-id'),
+        'trending': ('-trending_score', '-id'),
+        'cooking_time': ('cooking_time', 'id'),
+        '-pub_date': ('-pub_date', '-id'),
+        'relevance': ('-search_rank', '-id'),
+    }
+
+    @classmethod
+    def get_ordering_name(cls, request):
+        name = request.query_params.get(cls.ordering_param, '').strip()
+        if RecipeSearchFilter.get_search_query(request):
+            return name if name in cls.orderings else cls.search_default
+        if name == cls.search_default:
+            return cls.default
+        return name if name in cls.orderings else cls.default
+
+    def get_ordering(self, request, queryset, view):
+        """ Ключ сортировки; по нему же строится курсор пагинации. """
+        return self.orderings[self.get_ordering_name(request)]
+
+    def filter_queryset(self, request, queryset, view):
+        return queryset.order_by(
+            *self.get_ordering(request, queryset, view))
+
+
+def get_tag_ids(slugs):
+    """ Идентификаторы тэгов по слагам; соответствие хранится в кэше
+    до изменения тэгов. """
+    version, = get_versions((Tag,))
+    tag_ids = cache.get_or_set(
+        f'tag-ids:{version}',
+        lambda: dict(Tag.objects.values_list('slug', 'id')),
+        None)
+    return [tag_ids[slug] for slug in slugs if slug in tag_ids]
+
+
+class SlugListField(forms.Field):
+    """ Поле со списком значений из повторяющегося параметра. """
+    widget = forms.SelectMultiple
+
+    def to_python(self, value):
+        return [slug for slug in value or () if slug]
+
+
+class TagsFilter(filters.Filter):
+    """
+    Фильтр по слагам тэгов через EXISTS по таблице связи, без JOIN
+    и DISTINCT: рецепт с несколькими тэгами не дублируется.
+    ?tags_mode=any - хотя бы один тэг (по умолчанию), all - все тэги.
+    """
+    field_class = SlugListField
+    mode_param = 'tags_mode'
+
+    def filter(self, queryset, value):
+        if not value:
+            return queryset
+        slugs = set(value)
+        tag_ids = get_tag_ids(slugs)
+        if self.parent.data.get(self.mode_param) == 'all':
+            if len(tag_ids) < len(slugs):
+                return queryset.none()
+            for tag_id in tag_ids:
+                queryset = queryset.filter(Exists(TagInRecipe.objects.filter(
+                    recipelist=OuterRef('pk'), tag_id=tag_id)))
+            return queryset
+        return queryset.filter(Exists(TagInRecipe.objects.filter(
+            recipelist=OuterRef('pk'), tag_id__in=tag_ids)))
+
 
 class RecipeFilter(filters.FilterSet):
     """
     Фильтр для Рецепта.
     """
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = TagsFilter()
     is_favorited = filters.BooleanFilter(
         field_name='is_favorited',
         method='filter_favorited')
@@ -25,12 +151,12 @@ class RecipeFilter(filters.FilterSet):
 
     def filter_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shopping_cart__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
 
     class Meta:
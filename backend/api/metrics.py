@@ -0,0 +1,234 @@
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+DURATION_BUCKETS: tuple = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class QueryBudgetExceededError(Exception):
+    """ Запрос к API выполнил больше SQL-запросов, чем разрешено. """
+
+
+class RequestMetrics:
+    """ Показатели одного запроса к API. """
+    __slots__ = ('endpoint', 'queries', 'db_time', 'serializer_time',
+                 'serializer_depth', 'total_time')
+
+    def __init__(self):
+        self.endpoint = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.total_time = 0.0
+
+    def server_timing(self):
+        """ Значение заголовка Server-Timing, длительности в мс. """
+        return (
+            f'db;dur={self.db_time * 1000:.1f};'
+            f'desc="{self.queries} queries", '
+            f'serialize;dur={self.serializer_time * 1000:.1f}, '
+            f'total;dur={self.total_time * 1000:.1f}'
+        )
+
+
+def current_metrics():
+    """ Показатели текущего запроса или None вне запроса. """
+    return getattr(_local, 'metrics', None)
+
+
+def set_endpoint(endpoint):
+    """ Метка текущего запроса, например RecipesViewSet.list. """
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.endpoint = endpoint
+
+
+@contextmanager
+def measure_serializer():
+    """ Время сериализации; вложенные сериализаторы не считаются дважды. """
+    metrics = current_metrics()
+    if metrics is None or metrics.serializer_depth:
+        yield
+        return
+    metrics.serializer_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += time.perf_counter() - start
+        metrics.serializer_depth -= 1
+
+
+class MetricsRegistry:
+    """
+    Накопленные показатели по меткам запросов.
+    Хранятся в памяти процесса: при нескольких воркерах каждый
+    отдает свои значения, суммирование - на стороне Prometheus.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+
+    def record(self, metrics, budget_exceeded=False):
+        with self.lock:
+            stats = self.endpoints.setdefault(metrics.endpoint, {
+                'requests': 0,
+                'queries': 0,
+                'db_time': 0.0,
+                'serializer_time': 0.0,
+                'total_time': 0.0,
+                'budget_exceeded': 0,
+                'buckets': [0] * len(self.buckets),
+            })
+            stats['requests'] += 1
+            stats['queries'] += metrics.queries
+            stats['db_time'] += metrics.db_time
+            stats['serializer_time'] += metrics.serializer_time
+            stats['total_time'] += metrics.total_time
+            stats['budget_exceeded'] += budget_exceeded
+            for index, bound in enumerate(self.buckets):
+                if metrics.total_time <= bound:
+                    stats['buckets'][index] += 1
+
+    def render(self):
+        """ Показатели в текстовом формате Prometheus. """
+        with self.lock:
+            endpoints = {
+                endpoint: dict(stats, buckets=list(stats['buckets']))
+                for endpoint, stats in sorted(self.endpoints.items())
+            }
+        lines = []
+        for name, kind, key, help_text in (
+            ('requests_total', 'counter', 'requests',
+             'Количество запросов.'),
+            ('db_queries_total', 'counter', 'queries',
+             'Количество SQL-запросов.'),
+            ('db_seconds_total', 'counter', 'db_time',
+             'Время выполнения SQL-запросов.'),
+            ('serializer_seconds_total', 'counter', 'serializer_time',
+             'Время сериализации ответов.'),
+            ('query_budget_exceeded_total', 'counter', 'budget_exceeded',
+             'Запросы, превысившие бюджет SQL-запросов.'),
+        ):
+            lines.append(f'# HELP foodgram_{name} {help_text}')
+            lines.append(f'# TYPE foodgram_{name} {kind}')
+            for endpoint, stats in endpoints.items():
+                lines.append(
+                    f'foodgram_{name}{{endpoint="{endpoint}"}} {stats[key]}')
+        name = 'foodgram_request_duration_seconds'
+        lines.append(f'# HELP {name} Время обработки запроса.')
+        lines.append(f'# TYPE {name} histogram')
+        for endpoint, stats in endpoints.items():
+            for bound, count in zip(self.buckets, stats['buckets']):
+                lines.append(
+                    f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} '
+                    f'{count}')
+            lines.append(
+                f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} '
+                f'{stats["requests"]}')
+            lines.append(
+                f'{name}_sum{{endpoint="{endpoint}"}} {stats["total_time"]}')
+            lines.append(
+                f'{name}_count{{endpoint="{endpoint}"}} {stats["requests"]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class QueryMetricsMiddleware:
+    """
+    Учет SQL-запросов, времени базы данных, сериализации и обработки
+    запроса. Показатели отдаются в заголовке Server-Timing и накапливаются
+    для /api/_metrics; превышение QUERY_BUDGETS пишется в лог, а при
+    QUERY_BUDGET_STRICT (в тестах) приводит к ошибке.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        _local.metrics = metrics
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(self.execute))
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        metrics.total_time = time.perf_counter() - start
+        if metrics.endpoint is None:
+            match = request.resolver_match
+            metrics.endpoint = match.view_name if match else 'unmatched'
+        response['Server-Timing'] = metrics.server_timing()
+        budget = settings.QUERY_BUDGETS.get(metrics.endpoint)
+        exceeded = budget is not None and metrics.queries > budget
+        registry.record(metrics, exceeded)
+        if exceeded:
+            message = (f'{metrics.endpoint}: {metrics.queries} SQL-запросов '
+                       f'при бюджете {budget}.')
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceededError(message)
+            logger.warning(message)
+        return response
+
+    @staticmethod
+    def execute(execute, sql, params, many, context):
+        metrics = current_metrics()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if metrics is not None:
+                metrics.queries += 1
+                metrics.db_time += time.perf_counter() - start
+
+
+class MetricsMixin:
+    """ Метка запроса по классу и действию представления. """
+
+    def initial(self, request, *args, **kwargs):
+        action = getattr(self, 'action', None) or request.method.lower()
+        set_endpoint(f'{type(self).__name__}.{action}')
+        super().initial(request, *args, **kwargs)
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    """ Список объектов с учетом времени сериализации. """
+
+    @property
+    def data(self):
+        with measure_serializer():
+            return super().data
+
+
+class TimedSerializerMixin:
+    """ Учет времени сериализации; для списков - TimedListSerializer. """
+
+    @property
+    def data(self):
+        with measure_serializer():
+            return super().data
@@ -1,8 +1,250 @@
+import json
+from collections import OrderedDict
+
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .feed import covering_ids
+
+COUNT_EXACT: str = 'exact'
+COUNT_ESTIMATE: str = 'estimate'
+COUNT_NONE: str = 'none'
+
+
+def reverse_ordering(ordering):
+    """ Обратный порядок сортировки. """
+    return tuple(
+        field[1:] if field.startswith('-') else f'-{field}'
+        for field in ordering)
+
+
+def get_ordering_field(queryset, name):
+    """ Поле модели или аннотации, по которому сортируется queryset. """
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    return queryset.model._meta.get_field(name)
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк по плану запроса PostgreSQL без выполнения COUNT(*).
+    Для других баз данных - точный подсчет.
+    """
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """ Пагинатор с оценочным числом объектов. """
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Пагинация по ключу (курсору): следующая страница выбирается условием
+    по ключу сортировки, а не смещением, и не требует COUNT(*).
+    Позиция курсора - значения всех полей сортировки, последнее из
+    которых уникально (id): при равных значениях первого поля, например
+    числа добавлений в избранное, страница выбирается условием
+    (ключ, id) < (%s, %s), а не смещением от первого рецепта с тем же
+    значением, как в CursorPagination.
+    """
+    page_size = settings.DEFAULT_PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+        queryset = queryset.order_by(*(
+            reverse_ordering(self.ordering) if reverse else self.ordering))
+        if current_position is not None:
+            queryset = queryset.filter(self.get_position_filter(
+                self.get_position_values(queryset, current_position),
+                reverse))
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering)
+        has_current = current_position is not None or offset > 0
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = (
+                has_current, following_position is not None)
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next, self.has_previous = (
+                following_position is not None, has_current)
+            self.next_position = following_position
+            self.previous_position = current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        """ Позиция - значения всех полей сортировки списком json. """
+        return json.dumps([
+            str(instance[name] if isinstance(instance, dict)
+                else getattr(instance, name))
+            for name in (field.lstrip('-') for field in ordering)])
+
+    def get_position_values(self, queryset, position):
+        """ Значения полей сортировки из позиции курсора. """
+        try:
+            values = json.loads(position)
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                get_ordering_field(queryset, name.lstrip('-')).to_python(
+                    value)
+                for name, value in zip(self.ordering, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_position_filter(self, values, reverse):
+        """
+        Строки после позиции в порядке выдачи: для сортировки (a, id)
+        условие a < x OR (a = x AND id < y), а также a <= x, по которому
+        база данных выбирает диапазон индекса по первому полю.
+        """
+        condition = None
+        for field, value in reversed(list(zip(self.ordering, values))):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            after = Q(**{f'{name}__{lookup}': value})
+            condition = after if condition is None else (
+                after | Q(**{name: value}) & condition)
+        return Q(**{f'{name}__{lookup}e': value}) & condition
+
+
+class FeedPagination(KeysetPagination):
+    """
+    Пагинация ленты подписок. Страница, которая целиком лежит в начале
+    ленты из кэша (view.get_feed_head), выбирается по первичным ключам;
+    остальные - условием по автору и дате по индексу (author, pub_date).
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor = self.decode_cursor(request)
+        position = None
+        if cursor is not None and cursor.position is not None:
+            position = self.get_position_values(queryset, cursor.position)
+        ids = covering_ids(
+            view.get_feed_head(), cursor, position,
+            self.get_page_size(request))
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        return super().paginate_queryset(queryset, request, view)
+
+
+class SequencePagination(PageNumberPagination):
+    """
+    Пагинация готовой последовательности результатов
+    (например, из индекса в памяти), а не QuerySet.
+    """
+    page_size = settings.DEFAULT_PAGE_SIZE
+    page_size_query_param = 'limit'
 
 
 class LimitPageNumberPagination(PageNumberPagination):
-    """ Пагинация. """
+    """
+    Пагинация.
+    ?count=estimate - оценочное число объектов, ?count=none - без подсчета.
+    ?cursor= - пагинация по ключу, если представление задает cursor_ordering.
+    """
     page_size = settings.DEFAULT_PAGE_SIZE
     page_size_query_param = 'limit'
+    count_query_param = 'count'
+    cursor_query_param = 'cursor'
+    cursor_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.cursor_paginator = None
+        self.count_mode = request.query_params.get(
+            self.count_query_param, COUNT_EXACT)
+        cursor_ordering = getattr(view, 'cursor_ordering', None)
+        if self.cursor_query_param in request.query_params and cursor_ordering:
+            self.cursor_paginator = self.cursor_pagination_class()
+            self.cursor_paginator.ordering = cursor_ordering
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        if self.count_mode == COUNT_NONE:
+            return self.paginate_without_count(queryset, request)
+        if self.count_mode == COUNT_ESTIMATE:
+            self.django_paginator_class = EstimatedCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+    def paginate_without_count(self, queryset, request):
+        """ Страница со смещением, без COUNT(*): читается лишняя строка,
+        чтобы узнать, есть ли следующая страница. """
+        page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(
+                request.query_params.get(self.page_query_param, 1))
+            if self.page_number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=request.query_params.get(self.page_query_param),
+                message='Неверный номер страницы.'))
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next_page = len(rows) > page_size
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        if self.count_mode == COUNT_NONE:
+            return Response(OrderedDict([
+                ('count', None),
+                ('next', self.get_next_link()),
+                ('previous', self.get_previous_link()),
+                ('results', data)
+            ]))
+        return super().get_paginated_response(data)
+
+    def get_next_link(self):
+        if self.count_mode != COUNT_NONE:
+            return super().get_next_link()
+        if not self.has_next_page:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.count_mode != COUNT_NONE:
+            return super().get_previous_link()
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(
+            url, self.page_query_param, self.page_number - 1)
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .caching import get_versions
+from recipes.models import FavoriteRecipe, RelatedRecipe, ShoppingCart
+
+RECOMMENDED_KEY: str = 'recommended:{0}:{1}:{2}:{3}'
+
+
+def recommended_ids(user, limit=settings.RECOMMENDED_LIMIT,
+                    seeds=settings.RECOMMENDED_SEED_LIMIT):
+    """
+    Рекомендации пользователю: id рецептов по убыванию суммарной
+    связи с seeds последними рецептами его избранного, без рецептов
+    из избранного и корзины. Списки связей рассчитаны командой
+    update_recommendations, поэтому это одна агрегация по индексу
+    (recipe, -score). Результат хранится в кэше до изменения
+    избранного или корзины пользователя либо нового расчета связей.
+    """
+    versions = get_versions((FavoriteRecipe, ShoppingCart), user.id)
+    related_version, = get_versions((RelatedRecipe,))
+    key = RECOMMENDED_KEY.format(user.id, *versions, related_version)
+    ids = cache.get(key)
+    if ids is None:
+        favorites = FavoriteRecipe.objects.filter(user=user)
+        seed_ids = list(favorites.order_by('-created', '-id').values_list(
+            'recipe_id', flat=True)[:seeds])
+        ids = list(RelatedRecipe.objects.filter(
+            recipe_id__in=seed_ids
+        ).exclude(
+            related_id__in=favorites.values('recipe_id')
+        ).exclude(
+            related_id__in=ShoppingCart.objects.filter(
+                user=user).values('recipe_id')
+        ).order_by().values('related_id').annotate(
+            total=Sum('score')
+        ).order_by('-total', '-related_id').values_list(
+            'related_id', flat=True)[:limit])
+        cache.set(key, ids, settings.RESPONSE_CACHE_TIMEOUT)
+    return ids
@@ -1,17 +1,23 @@
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.hashers import make_password
+from django.db import transaction
 from djoser.serializers import UserSerializer as UserHandleSerializer
 from rest_framework import serializers, validators
 from rest_framework.generics import get_object_or_404
 
-from .services import Base64ImageField
+from .metrics import TimedListSerializer, TimedSerializerMixin
+from .services import Base64ImageField, ThumbnailsField
 from recipes.models import (
     Ingredient,
     IngredientInRecipe,
     FavoriteRecipe,
     RecipeList,
     ShoppingCart,
+    ShoppingListItem,
     Tag,
+    TagInRecipe,
+    ingredients_changed,
 )
 from users.models import Subscribe
 
@@ -19,7 +25,7 @@ from users.models import Subscribe
 User = get_user_model()
 
 
-class UserSerializer(UserHandleSerializer):
+class UserSerializer(TimedSerializerMixin, UserHandleSerializer):
     """
     Сериализатор для обработки данных о пользователях.
     """
@@ -30,9 +36,12 @@ class UserSerializer(UserHandleSerializer):
         fields = ('id', 'email', 'username',
                   'first_name', 'last_name',
                   'is_subscribed')
+        list_serializer_class = TimedListSerializer
 
     def get_is_subscribed(self, obj):
         """ Проверка подписки. """
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -73,22 +82,24 @@ class UserPasswordSerializer(serializers.Serializer):
         return validated_data
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для тега.
     """
     class Meta:
         model = Tag
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для ингредиента.
     """
     class Meta:
         model = Ingredient
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
 
 
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
@@ -111,19 +122,42 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         ]
 
 
-class FavoriteOrSubscribeSerializer(serializers.ModelSerializer):
+class FavoriteOrSubscribeSerializer(TimedSerializerMixin,
+                                    serializers.ModelSerializer):
     """
     Сериализатор для избранного или подписок.
     """
     image = Base64ImageField()
+    thumbnails = ThumbnailsField()
 
     class Meta:
         model = RecipeList
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class SubscribeSerializer(serializers.ModelSerializer):
+class BulkIdsSerializer(serializers.Serializer):
+    """
+    Сериализатор списка id для пакетных операций.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_IDS)
+
+
+class CookableQuerySerializer(serializers.Serializer):
+    """
+    Сериализатор параметров поиска «что приготовить».
+    """
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.COOKABLE_MAX_INGREDIENTS)
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+
+class SubscribeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для подписчика.
     """
@@ -141,6 +175,7 @@ class SubscribeSerializer(serializers.ModelSerializer):
         fields = ('id', 'email', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count',)
         read_only_fields = ('is_subscribed', 'recipes_count',)
+        list_serializer_class = TimedListSerializer
 
     def validate(self, data):
         """ Проверка данных на уровне сериализатора. """
@@ -161,25 +196,30 @@ class SubscribeSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """ Проверка подписки. """
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Subscribe.objects.filter(
             user=obj.user, author=obj.author).exists()
 
     def get_recipes(self, obj):
         """ Получение рецептов автора. """
-        request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
-        recipes = RecipeList.objects.filter(author=obj.author)
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(obj.author, 'limited_recipes'):
+            recipes = obj.author.limited_recipes
+        else:
+            request = self.context.get('request')
+            recipes_limit = request.GET.get('recipes_limit')
+            recipes = RecipeList.objects.filter(author=obj.author)
+            if recipes_limit:
+                recipes = recipes[:int(recipes_limit)]
         serializer = FavoriteOrSubscribeSerializer(recipes, many=True)
         return serializer.data
 
     def get_recipes_count(self, obj):
-        """ Подсчет рецептов автора. """
-        return RecipeList.objects.filter(author=obj.author).count()
+        """ Количество рецептов автора из счетчика. """
+        return obj.author.recipes_count
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор рецепта.
     """
@@ -188,6 +228,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         many=True
     )
     image = Base64ImageField()
+    thumbnails = ThumbnailsField()
     author = UserSerializer(
         read_only=True
     )
@@ -202,8 +243,9 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeList
         fields = ('id', 'tags', 'author', 'ingredients',
-                  'name', 'image', 'text', 'cooking_time',
+                  'name', 'image', 'thumbnails', 'text', 'cooking_time',
                   'is_favorited', 'is_in_shopping_cart')
+        list_serializer_class = TimedListSerializer
 
     @staticmethod
     def __create_ingredients(recipe, ingredients):
@@ -213,27 +255,92 @@ class RecipeSerializer(serializers.ModelSerializer):
              ingredient_id=ingredient.get('id'),
              amount=ingredient.get('amount'))
              for ingredient in ingredients])
+        ingredients_changed.send(sender=RecipeList, recipe_ids=[recipe.pk])
 
     def create(self, validated_data):
         """ Создание рецепта. """
         image = validated_data.pop('image')
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = RecipeList.objects.create(image=image, **validated_data)
-        recipe.tags.set(tags)
-        self.__create_ingredients(recipe, ingredients)
+        with transaction.atomic():
+            recipe = RecipeList.objects.create(image=image, **validated_data)
+            recipe.tags.set(tags)
+            self.__create_ingredients(recipe, ingredients)
         return recipe
 
+    @staticmethod
+    def __sync_tags(recipe, tags):
+        """ Тэги рецепта: удаляются и добавляются только отличия. """
+        current = set(TagInRecipe.objects.filter(
+            recipelist=recipe).values_list('tag_id', flat=True))
+        removed = current - set(tags)
+        added = [tag for tag in tags if tag not in current]
+        if removed:
+            recipe.tags.remove(*removed)
+        if added:
+            recipe.tags.add(*added)
+
+    @staticmethod
+    def __sync_ingredients(recipe, ingredients):
+        """
+        Ингредиенты рецепта по разнице с сохраненными: новые - одним
+        bulk_create, измененные количества - одним bulk_update, лишние -
+        одним удалением; неизменные строки не трогаются. Сводные списки
+        покупок пользователей с рецептом в корзине меняются на разницу.
+        """
+        amounts = {ingredient['id']: ingredient['amount']
+                   for ingredient in ingredients}
+        rows = {}
+        removed = []
+        old_amounts = {}
+        for pk, ingredient_id, amount in IngredientInRecipe.objects.filter(
+                recipe=recipe).values_list('pk', 'ingredient_id', 'amount'):
+            if ingredient_id in amounts:
+                rows[ingredient_id] = (pk, amount)
+            else:
+                removed.append(pk)
+            if ingredient_id is not None:
+                old_amounts[ingredient_id] = amount
+        changed = [
+            IngredientInRecipe(pk=rows[ingredient_id][0], amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id in rows and rows[ingredient_id][1] != amount
+        ]
+        created = [
+            IngredientInRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                               amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in rows
+        ]
+        if not (removed or changed or created):
+            return
+        if removed:
+            IngredientInRecipe.objects.filter(pk__in=removed).delete()
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        if created:
+            IngredientInRecipe.objects.bulk_create(created)
+        deltas = {
+            ingredient_id: amounts.get(ingredient_id, 0)
+            - old_amounts.get(ingredient_id, 0)
+            for ingredient_id in {*amounts, *old_amounts}
+        }
+        if any(deltas.values()):
+            ShoppingListItem.objects.change_amounts(deltas, list(
+                ShoppingCart.objects.filter(recipe=recipe).values_list(
+                    'user_id', flat=True)))
+        ingredients_changed.send(sender=RecipeList, recipe_ids=[recipe.pk])
+
     def update(self, instance, validated_data):
-        """ Обновление рецепта. """
-        instance.tags.clear()
-        instance.tags.set(validated_data.pop('tags'))
-        IngredientInRecipe.objects.filter(recipe=instance).delete()
-        self.__create_ingredients(
-            recipe=instance,
-            ingredients=validated_data.pop('ingredients')
-        )
-        super().update(instance, validated_data)
+        """
+        Обновление рецепта: тэги и ингредиенты синхронизируются
+        по разнице с сохраненными в одной транзакции с рецептом.
+        """
+        with transaction.atomic():
+            self.__sync_tags(instance, validated_data.pop('tags'))
+            self.__sync_ingredients(
+                instance, validated_data.pop('ingredients'))
+            super().update(instance, validated_data)
         return instance
 
     def to_internal_value(self, data):
@@ -246,6 +353,8 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         """ Проверка рецепта в списке избранного. """
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -254,21 +363,27 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """ Проверка рецепта в корзине покупок. """
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if not user or user.is_anonymous:
             return False
         return ShoppingCart.objects.filter(recipe=obj,
                                            user=user).exists()
 
-    def validate(self, data):
-        """ Валидация различных данных на уровне сериализатора. """
-        ingredients = data.get('ingredients')
-        errors = []
-        if not ingredients:
-            errors.append('Добавьте минимум один ингредиент для рецепта.')
+    @staticmethod
+    def __check_ingredients(ingredients, errors):
+        """ Количества и id ингредиентов целыми числами, без повторов. """
         added_ingredients = []
-        for ingredient in ingredients:
-            if int(ingredient['amount']) <= 0:
+        for ingredient in ingredients or ():
+            try:
+                ingredient['id'] = int(ingredient['id'])
+                ingredient['amount'] = int(ingredient['amount'])
+            except (KeyError, TypeError, ValueError):
+                errors.append(
+                    'Для ингредиента укажите целые id и количество.')
+                continue
+            if ingredient['amount'] <= 0:
                 errors.append(
                     'Количество ингредиента с id {0} должно '
                     'быть целым и больше 0.'.format(ingredient['id'])
@@ -278,9 +393,38 @@ class RecipeSerializer(serializers.ModelSerializer):
                     'Дважды один тот же ингредиент в рецепт поместить нельзя.'
                 )
             added_ingredients.append(ingredient['id'])
-        tags = data.get('tags')
+        return added_ingredients
+
+    @staticmethod
+    def __check_exist(model, ids, message, errors):
+        """ Существование id - одним запросом IN, а не ошибкой внешнего
+        ключа при записи. """
+        if not ids:
+            return
+        found = set(model.objects.filter(pk__in=ids).values_list(
+            'pk', flat=True))
+        missing = sorted(set(ids) - found)
+        if missing:
+            errors.append('{0} с id {1} не найдены.'.format(
+                message, ', '.join(map(str, missing))))
+
+    def validate(self, data):
+        """ Валидация различных данных на уровне сериализатора. """
+        ingredients = data.get('ingredients')
+        errors = []
+        if not ingredients:
+            errors.append('Добавьте минимум один ингредиент для рецепта.')
+        added_ingredients = self.__check_ingredients(ingredients, errors)
+        try:
+            tags = [int(tag) for tag in data.get('tags') or ()]
+        except (TypeError, ValueError):
+            errors.append('Тэги указываются целыми id.')
+            tags = []
         if len(tags) > len(set(tags)):
             errors.append('Один и тот же тэг нельзя применять дважды.')
+        self.__check_exist(
+            Ingredient, added_ingredients, 'Ингредиенты', errors)
+        self.__check_exist(Tag, tags, 'Тэги', errors)
         cooking_time = float(data.get('cooking_time'))
         if cooking_time < 1:
             errors.append(
@@ -290,3 +434,14 @@ class RecipeSerializer(serializers.ModelSerializer):
         data['ingredients'] = ingredients
         data['tags'] = tags
         return data
+
+
+class CookableRecipeSerializer(RecipeSerializer):
+    """
+    Сериализатор рецепта с числом имеющихся и недостающих ингредиентов.
+    """
+    matched = serializers.IntegerField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('matched', 'missing')
@@ -1,51 +1,154 @@
-import base64
+import binascii
+import hashlib
+import re
+from io import BytesIO
 
+from django.conf import settings
 from django.core.files.base import ContentFile
-from django.http import HttpResponse
-from rest_framework import serializers
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from rest_framework import serializers, status
+from rest_framework.response import Response
 
-from recipes.models import ShoppingCart
+from .exporters import EXPORTERS, TextExporter
+from recipes.images import thumbnail_names
+from recipes.models import ShoppingListItem
+
+QUALITY = re.compile(r'^\s*q\s*=\s*([01](?:\.\d{0,3})?)\s*$', re.I)
+BASE64_CHUNK_SIZE: int = 64 * 1024
+WHITESPACE = re.compile(r'\s+')
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Клиент принимает gzip: кодировка gzip (или *, если gzip не назван)
+    указана в Accept-Encoding с ненулевым весом q, так что
+    "gzip;q=0" сжатие отключает.
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            match = QUALITY.match(param)
+            if match:
+                quality = float(match.group(1))
+        qualities[coding.strip().lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0)) > 0
+
+
+def decode_image(encoded, limit):
+    """
+    Декодирование base64 частями с проверкой размера и подсчетом
+    хэша содержимого: слишком большой файл отклоняется до декодирования.
+    """
+    if WHITESPACE.search(encoded):
+        encoded = WHITESPACE.sub('', encoded)
+    if len(encoded) // 4 * 3 > limit + 2:
+        raise serializers.ValidationError(
+            'Размер изображения не должен превышать {0:g} МБ.'.format(
+                round(limit / (1024 * 1024), 2)))
+    content = BytesIO()
+    digest = hashlib.sha256()
+    for start in range(0, len(encoded), BASE64_CHUNK_SIZE):
+        try:
+            chunk = binascii.a2b_base64(
+                encoded[start:start + BASE64_CHUNK_SIZE])
+        except binascii.Error:
+            raise serializers.ValidationError(
+                'Некорректные данные изображения.')
+        digest.update(chunk)
+        content.write(chunk)
+    return content.getvalue(), digest.hexdigest()
 
 
 class Base64ImageField(serializers.ImageField):
     """
     Декодируем изображение.
+    Файл называется по хэшу содержимого: повторная загрузка того же
+    изображения ссылается на уже сохраненный файл.
     """
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            content, digest = decode_image(imgstr, settings.MAX_IMAGE_SIZE)
+            model_field = self.parent.Meta.model._meta.get_field(self.source)
+            name = model_field.storage.hashed_name(
+                model_field.generate_filename(None, f'{digest}.{ext}'),
+                digest)
+            if model_field.storage.exists(name):
+                return name
+            data = ContentFile(content, name=f'{digest}.{ext}')
         return super().to_internal_value(data)
 
 
+class ThumbnailsField(serializers.Field):
+    """
+    Ссылки на миниатюры изображения: {ширина: {формат: url}}.
+    """
+    def __init__(self, **kwargs):
+        kwargs['source'] = 'image'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, image):
+        if not image:
+            return None
+        request = self.context.get('request')
+        thumbnails = {}
+        for width, names in thumbnail_names(image.name).items():
+            thumbnails[str(width)] = {}
+            for extension, name in names.items():
+                url = image.storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                thumbnails[str(width)][extension] = url
+        return thumbnails
+
+
+def get_shopping_list(user):
+    """
+    Суммарное количество ингредиентов из корзины пользователя.
+    Читается из сводной таблицы, которая обновляется при изменении корзины.
+    """
+    return ShoppingListItem.objects.filter(
+        user=user, amount__gt=0
+    ).values(
+        'ingredient',
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount'
+    ).order_by('ingredient__name', 'ingredient__measurement_unit')
+
+
 def collect_shopping_cart(request):
     """
     Формирование корзины (списка) покупок.
+    Строки читаются до начала ответа - одним запросом, который учитывают
+    QueryMetricsMiddleware и бюджет запросов (список одного пользователя
+    не длиннее справочника ингредиентов); файл формируется и сжимается
+    потоком.
     """
-    shopping_cart = ShoppingCart.objects.filter(user=request.user).all()
-    shopping_list = {}
-    for item in shopping_cart:
-        for recipe_ingredient in item.recipe.recipe_ingredients.all():
-            name = recipe_ingredient.ingredient.name
-            measuring_unit = recipe_ingredient.ingredient.measurement_unit
-            amount = recipe_ingredient.amount
-            if name not in shopping_list:
-                shopping_list[name] = {
-                    'name': name,
-                    'measurement_unit': measuring_unit,
-                    'amount': amount
-                }
-            else:
-                shopping_list[name]['amount'] += amount
-    content = (
-        [f'{item["name"]} ({item["measurement_unit"]}) '
-         f'- {item["amount"]}\n'
-         for item in shopping_list.values()]
-    )
-    filename = 'shopping_list.txt'
-    response = HttpResponse(content, content_type='text/plain')
+    format = request.query_params.get('format', TextExporter.extension)
+    if format not in EXPORTERS:
+        return Response(
+            {'errors': 'Доступные форматы: {0}.'.format(
+                ', '.join(EXPORTERS))},
+            status=status.HTTP_400_BAD_REQUEST)
+    exporter = EXPORTERS[format]()
+    content = exporter.stream(list(get_shopping_list(request.user)))
+    content = (chunk.encode('utf-8') for chunk in content)
+    response = StreamingHttpResponse(
+        content_type=exporter.content_type)
+    if accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        content = compress_sequence(content)
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response.streaming_content = content
+    filename = 'shopping_list.{0}'.format(exporter.extension)
     response['Content-Disposition'] = (
-        f'attachment; filename={0}'.format(filename)
+        'attachment; filename="{0}"'.format(filename)
     )
     return response
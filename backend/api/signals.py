@@ -0,0 +1,180 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
+from django.dispatch import receiver
+
+from .autocomplete import ingredient_index
+from .caching import bump_version, recipe_dependencies
+from .feed import feed_scope
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    IngredientInRecipe,
+    RecipeList,
+    ShoppingCart,
+    Tag,
+    ingredients_changed
+)
+from recipes.batching import CommitBatch
+from recipes.cookable import cookable_index
+from recipes.search import search_engine
+from users.models import Subscribe, links_added, links_removed
+
+User = get_user_model()
+
+VERSIONED_MODELS = (Tag, Ingredient, RecipeList, IngredientInRecipe, User)
+PERSONAL_MODELS = (FavoriteRecipe, ShoppingCart, Subscribe)
+# Поля пользователя в ответах API (UserSerializer).
+USER_API_FIELDS = frozenset(('email', 'username', 'first_name', 'last_name'))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    """ Сброс индекса автодополнения при изменении ингредиентов. """
+    ingredient_index.invalidate()
+
+
+def update_search_index(recipe_ids):
+    """ Переиндексация рецептов и новая версия результатов поиска. """
+    search_engine().update(recipe_ids)
+    bump_version(RecipeList, 'search')
+
+
+search_updates = CommitBatch(update_search_index)
+cookable_updates = CommitBatch(cookable_index.update)
+
+
+def schedule_search_update(*recipe_ids):
+    """ Переиндексация после фиксации транзакции: к этому моменту
+    ингредиенты рецепта, созданные bulk_create, уже записаны.
+    Рецепт переиндексируется один раз на транзакцию, сколько бы его
+    строк ни изменилось. """
+    search_updates.add(recipe_ids)
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(sender, instance, created=False, **kwargs):
+    """ Переименование ингредиента меняет документы его рецептов. """
+    if not created:
+        schedule_search_update(*IngredientInRecipe.objects.filter(
+            ingredient=instance).values_list('recipe_id', flat=True))
+
+
+def schedule_cookable_update(*recipe_ids):
+    """ Новый состав рецептов в индексе «что приготовить»
+    после фиксации транзакции, один раз на транзакцию. """
+    cookable_updates.add(recipe_ids)
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def reindex_recipe_ingredients(sender, instance, **kwargs):
+    schedule_search_update(instance.recipe_id)
+    schedule_cookable_update(instance.recipe_id)
+
+
+@receiver(ingredients_changed, sender=RecipeList)
+def reindex_changed_ingredients(sender, recipe_ids, **kwargs):
+    """ Ингредиенты, созданные bulk_create из сериализатора рецепта. """
+    schedule_cookable_update(*recipe_ids)
+
+
+@receiver(pre_save, sender=User)
+def check_user_fields(sender, instance, update_fields=None, **kwargs):
+    """
+    Изменились ли поля пользователя, которые попадают в ответы API:
+    вход (last_login), смена пароля и прочие сохранения не меняют
+    версию пользователей и не сбрасывают кэш ответов.
+    """
+    fields = USER_API_FIELDS if update_fields is None else (
+        USER_API_FIELDS & update_fields)
+    instance.api_fields_changed = False
+    if instance._state.adding or not fields:
+        return
+    saved = User._base_manager.filter(pk=instance.pk).values(*fields).first()
+    instance.api_fields_changed = saved is None or any(
+        saved[field] != getattr(instance, field) for field in fields)
+
+
+def bump_model_version(sender, instance, created=False, **kwargs):
+    """ Новая версия данных после фиксации транзакции. """
+    if sender is User and (
+            created or not getattr(instance, 'api_fields_changed', True)):
+        return
+    transaction.on_commit(partial(bump_version, sender))
+
+
+def bump_personal_version(sender, instance, **kwargs):
+    """ Новая версия данных пользователя после фиксации транзакции. """
+    transaction.on_commit(partial(bump_version, sender, instance.user_id))
+
+
+@receiver((links_added, links_removed))
+def bump_links_version(sender, user_id, **kwargs):
+    """ Пакетное изменение избранного, корзины или подписок. """
+    transaction.on_commit(partial(bump_version, sender, user_id))
+    if sender is FavoriteRecipe:
+        transaction.on_commit(partial(bump_version, RecipeList, 'popular'))
+
+
+def bump_recipe_dependencies(recipe):
+    """ Сброс кэша ответов, в которые может попасть рецепт. """
+    transaction.on_commit(partial(
+        bump_version, RecipeList, *recipe_dependencies(recipe)))
+
+
+def bump_recipe_tags_version(sender, instance, action, reverse, **kwargs):
+    """ Изменение тэгов рецепта меняет версию рецептов. """
+    transaction.on_commit(partial(bump_version, RecipeList))
+    if reverse:
+        transaction.on_commit(partial(bump_version, Tag))
+    elif action in ('pre_clear', 'pre_remove', 'post_add'):
+        bump_recipe_dependencies(instance)
+
+
+@receiver((post_save, post_delete), sender=FavoriteRecipe)
+def bump_popular_version(sender, **kwargs):
+    """ Избранное меняет порядок ?ordering=popular. """
+    transaction.on_commit(partial(bump_version, RecipeList, 'popular'))
+
+
+def bump_followers_feed(author_id):
+    """ Новая версия лент подписчиков автора. """
+    scopes = [feed_scope(user_id) for user_id in Subscribe.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)]
+    if scopes:
+        bump_version(RecipeList, *scopes)
+
+
+@receiver(post_save, sender=RecipeList)
+def recipe_saved(sender, instance, created=False, update_fields=None,
+                 **kwargs):
+    bump_recipe_dependencies(instance)
+    if created:
+        transaction.on_commit(partial(bump_followers_feed, instance.author_id))
+    if update_fields is None or not update_fields.isdisjoint(
+            ('name', 'text')):
+        schedule_search_update(instance.pk)
+
+
+@receiver(pre_delete, sender=RecipeList)
+def recipe_deleted(sender, instance, **kwargs):
+    bump_recipe_dependencies(instance)
+    transaction.on_commit(partial(bump_followers_feed, instance.author_id))
+    schedule_search_update(instance.pk)
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_model_version, sender=model)
+    post_delete.connect(bump_model_version, sender=model)
+for model in PERSONAL_MODELS:
+    post_save.connect(bump_personal_version, sender=model)
+    post_delete.connect(bump_personal_version, sender=model)
+m2m_changed.connect(bump_recipe_tags_version, sender=RecipeList.tags.through)
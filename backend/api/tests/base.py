@@ -0,0 +1,68 @@
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from recipes.models import (
+    Ingredient,
+    IngredientInRecipe,
+    RecipeList,
+    Tag
+)
+from users.models import User
+
+
+class FoodgramTestCase(APITestCase):
+    """ Общие данные тестов: пользователи, тэги, ингредиенты, рецепты. """
+    recipes_count: int = 6
+    users_count: int = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        # Данные фиксируются, как в работающем приложении: обработчики
+        # on_commit (индексы, версии кэша) выполняются сразу.
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.create_data()
+
+    @classmethod
+    def create_data(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{index}@foodgram.ru', username=f'user{index}',
+                first_name='Имя', last_name='Фамилия',
+                password='Pass-word-123')
+            for index in range(cls.users_count)]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тэг {index}', color=f'#00000{index}',
+                slug=f'tag{index}')
+            for index in range(3)]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(5)]
+        cls.recipes = [
+            cls.create_recipe(cls.users[index % cls.users_count], index)
+            for index in range(cls.recipes_count)]
+
+    @classmethod
+    def create_recipe(cls, author, index=0):
+        recipe = RecipeList.objects.create(
+            author=author, name=f'Рецепт {index}', text='Описание',
+            cooking_time=index + 1)
+        recipe.tags.set(cls.tags[:index % len(cls.tags) + 1])
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, ingredient=ingredient,
+                               amount=amount)
+            for amount, ingredient in enumerate(cls.ingredients[:3], 1))
+        return recipe
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def client_for(user):
+        """ Клиент API с токеном пользователя. """
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
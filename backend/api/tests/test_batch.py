@@ -0,0 +1,102 @@
+from unittest import mock
+
+from .base import FoodgramTestCase
+from recipes.management.commands.rebuild_counters import drift
+from recipes.models import (
+    FavoriteRecipe,
+    RecipeList,
+    ShoppingCart,
+    ShoppingListItem
+)
+from users.models import Subscribe, User, links_removed
+
+
+class BatchLinksTest(FoodgramTestCase):
+    """ Пакетное добавление и удаление избранного, корзины, подписок. """
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.users[0]
+        self.client = self.client_for(self.user)
+
+    def change(self, method, url, ids):
+        response = getattr(self.client, method)(
+            url, {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [(item['id'], item['status'])
+                for item in response.data['results']]
+
+    def test_favorites(self):
+        first, second, third = (recipe.id for recipe in self.recipes[:3])
+        FavoriteRecipe.objects.create(user=self.user, recipe_id=first)
+        self.assertEqual(
+            self.change('post', '/api/recipes/favorite/',
+                        [first, second, third, 999999, second]),
+            [(first, 'exists'), (second, 'added'), (third, 'added'),
+             (999999, 'not_found')])
+        self.assertEqual(
+            self.change('delete', '/api/recipes/favorite/', [second, 999999]),
+            [(second, 'removed'), (999999, 'missing')])
+        self.assertEqual(
+            sorted(FavoriteRecipe.objects.filter(
+                user=self.user).values_list('recipe_id', flat=True)),
+            [first, third])
+        self.assertEqual(RecipeList.objects.get(pk=second).favorites_count, 0)
+        self.assertEqual(set(drift().values()), {0})
+
+    def test_shopping_cart(self):
+        ids = [recipe.id for recipe in self.recipes[:2]]
+        self.change('post', '/api/recipes/shopping_cart/', ids)
+        self.assertEqual(
+            sorted(ShoppingListItem.objects.filter(
+                user=self.user).values_list('ingredient_id', 'amount')),
+            [(ingredient.id, amount * 2) for amount, ingredient
+             in enumerate(self.ingredients[:3], 1)])
+        self.change('delete', '/api/recipes/shopping_cart/', ids[:1])
+        self.assertEqual(
+            sorted(ShoppingListItem.objects.filter(
+                user=self.user).values_list('ingredient_id', 'amount')),
+            [(ingredient.id, amount) for amount, ingredient
+             in enumerate(self.ingredients[:3], 1)])
+        self.assertFalse(ShoppingCart.objects.filter(
+            user=self.user, recipe_id=ids[0]).exists())
+        self.assertEqual(set(drift().values()), {0})
+
+    def test_subscriptions(self):
+        author = self.users[1]
+        self.assertEqual(
+            self.change('post', '/api/users/subscribe/',
+                        [self.user.id, author.id]),
+            [(self.user.id, 'forbidden'), (author.id, 'added')])
+        self.assertEqual(User.objects.get(pk=author.pk).subscribers_count, 1)
+        self.assertEqual(
+            self.change('delete', '/api/users/subscribe/', [author.id]),
+            [(author.id, 'removed')])
+        self.assertFalse(Subscribe.objects.exists())
+        self.assertEqual(User.objects.get(pk=author.pk).subscribers_count, 0)
+
+    def test_validation(self):
+        for body in ({}, {'ids': []}, {'ids': ['x']}):
+            response = self.client.post(
+                '/api/recipes/favorite/', body, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_links_removed_once(self):
+        """ Удаление пакета - один сигнал links_removed и ни одного
+        сигнала удаления строки. """
+        ids = [recipe.id for recipe in self.recipes[:3]]
+        self.change('post', '/api/recipes/shopping_cart/', ids)
+        receiver = mock.Mock()
+        links_removed.connect(receiver, sender=ShoppingCart)
+        self.addCleanup(links_removed.disconnect, receiver,
+                        sender=ShoppingCart)
+        with mock.patch(
+                'recipes.signals.ShoppingListItem.objects.remove_recipe'
+        ) as remove_recipe:
+            self.change('delete', '/api/recipes/shopping_cart/',
+                        ids[:2] + [999999])
+        receiver.assert_called_once_with(
+            signal=links_removed, sender=ShoppingCart,
+            user_id=self.user.pk, target_ids=ids[:2])
+        remove_recipe.assert_not_called()
+        self.assertEqual(set(drift().values()), {0})
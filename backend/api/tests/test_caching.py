@@ -0,0 +1,69 @@
+from .base import FoodgramTestCase
+from users.models import User
+
+
+class RecipeListCacheTest(FoodgramTestCase):
+    """
+    Условные GET и кэш ответов для анонимных пользователей:
+    изменение рецепта или автора сбрасывает их, вход пользователя -
+    нет.
+    """
+    url = '/api/recipes/'
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(self.url, **headers)
+
+    def assert_not_modified(self, etag):
+        self.assertEqual(self.get(etag).status_code, 304)
+
+    def assert_modified(self, etag):
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def test_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            self.assert_not_modified(response['ETag'])
+
+    def test_recipe_edited(self):
+        etag = self.get()['ETag']
+        recipe = self.recipes[-1]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(recipe.author).patch(
+                f'{self.url}{recipe.id}/', {
+                    'name': 'Новое название',
+                    'cooking_time': recipe.cooking_time,
+                    'tags': [tag.id for tag in recipe.tags.all()],
+                    'ingredients': [{'id': self.ingredients[0].id,
+                                     'amount': 1}]},
+                format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.assert_modified(etag)
+        self.assertEqual(response.data['results'][0]['name'],
+                         'Новое название')
+
+    def test_author_renamed(self):
+        etag = self.get()['ETag']
+        author = User.objects.get(pk=self.recipes[-1].author_id)
+        author.first_name = 'Другое'
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save()
+        response = self.assert_modified(etag)
+        self.assertEqual(
+            response.data['results'][0]['author']['first_name'], 'Другое')
+
+    def test_login_and_password(self):
+        etag = self.get()['ETag']
+        user = User.objects.get(pk=self.users[0].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/login/', {
+                'email': user.email, 'password': 'Pass-word-123'})
+            user.set_password('Other-pass-456')
+            user.save()
+        self.assertEqual(response.status_code, 200)
+        self.assert_not_modified(etag)
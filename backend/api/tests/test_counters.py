@@ -0,0 +1,52 @@
+from .base import FoodgramTestCase
+from recipes.management.commands.rebuild_counters import drift
+from recipes.models import FavoriteRecipe, RecipeList
+from users.models import User
+
+
+class CountersTest(FoodgramTestCase):
+    """ Счетчики, которые сигналы меняют выражениями F(). """
+
+    def assert_no_drift(self):
+        self.assertEqual(set(drift().values()), {0})
+
+    def test_favorites(self):
+        recipe = self.recipes[0]
+        for user in self.users:
+            response = self.client_for(user).post(
+                f'/api/recipes/{recipe.id}/favorite/')
+            self.assertEqual(response.status_code, 201)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, len(self.users))
+        self.client_for(self.users[0]).delete(
+            f'/api/recipes/{recipe.id}/favorite/')
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, len(self.users) - 1)
+        self.assert_no_drift()
+
+    def test_stale_save(self):
+        """ Сохранение объекта со старыми значениями не затирает
+        счетчики и вычисляемые поля. """
+        stale = RecipeList.objects.get(pk=self.recipes[0].pk)
+        FavoriteRecipe.objects.create(user=self.users[1], recipe=stale)
+        RecipeList.objects.filter(pk=stale.pk).update(trending_score=5)
+        stale.name = 'Новое название'
+        stale.save()
+        recipe = RecipeList.objects.get(pk=stale.pk)
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.trending_score, 5)
+
+    def test_authors(self):
+        author, reader = self.users[:2]
+        self.client_for(reader).post(f'/api/users/{author.id}/subscribe/')
+        self.create_recipe(author)
+        author.refresh_from_db()
+        self.assertEqual(author.subscribers_count, 1)
+        self.assertEqual(author.recipes_count, RecipeList.objects.filter(
+            author=author).count())
+        RecipeList.objects.filter(author=author).first().delete()
+        self.assertEqual(
+            User.objects.get(pk=author.pk).recipes_count,
+            RecipeList.objects.filter(author=author).count())
+        self.assert_no_drift()
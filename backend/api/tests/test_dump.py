@@ -0,0 +1,67 @@
+import datetime
+import io
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from .base import FoodgramTestCase
+from recipes.management.commands.export_dump import exported_models
+from recipes.management.commands.load_dump import (
+    BATCH_SIZE,
+    EXCLUDE,
+    load_dump
+)
+from recipes.models import (
+    FavoriteRecipe,
+    RecipeList,
+    ShoppingCart,
+    ShoppingListItem
+)
+
+
+class DumpRoundTripTest(FoodgramTestCase):
+    """ Дамп export_dump загружается load_dump в те же строки. """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        FavoriteRecipe.objects.create(user=cls.users[0], recipe=cls.recipes[1])
+        ShoppingCart.objects.create(user=cls.users[1], recipe=cls.recipes[2])
+        cls.pub_date = timezone.now() - datetime.timedelta(days=30)
+        RecipeList.objects.filter(pk=cls.recipes[0].pk).update(
+            pub_date=cls.pub_date)
+
+    def rows(self):
+        """ Строки выгружаемых моделей; сводные списки покупок load_dump
+        пересчитывает заново, поэтому у них сравниваются значения. """
+        rows = {
+            model._meta.label: list(
+                model._base_manager.order_by('pk').values())
+            for model in exported_models(EXCLUDE)}
+        rows['recipes.ShoppingListItem'] = list(
+            ShoppingListItem.objects.order_by(
+                'user_id', 'ingredient_id').values_list(
+                'user_id', 'ingredient_id', 'amount'))
+        return rows
+
+    def round_trip(self, name):
+        expected = self.rows()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, name)
+            call_command('export_dump', path, stderr=io.StringIO())
+            call_command('flush', interactive=False, verbosity=0,
+                         inhibit_post_migrate=True)
+            self.assertFalse(RecipeList.objects.exists())
+            load_dump(path, BATCH_SIZE, set(EXCLUDE))
+        self.assertEqual(self.rows(), expected)
+        self.assertEqual(
+            RecipeList.objects.get(pk=self.recipes[0].pk).pub_date,
+            self.pub_date)
+
+    def test_json(self):
+        self.round_trip('dump.json')
+
+    def test_ndjson(self):
+        self.round_trip('dump.ndjson')
@@ -0,0 +1,60 @@
+import gzip
+import json
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .base import FoodgramTestCase
+from api.metrics import QueryBudgetExceededError
+from recipes.models import ShoppingCart
+
+DOWNLOAD_URL = '/api/recipes/download_shopping_cart/'
+
+
+class ShoppingListExportTest(FoodgramTestCase):
+    """ Выгрузка списка покупок и сжатие по Accept-Encoding. """
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.users[0])
+        ShoppingCart.objects.create(user=self.users[0], recipe=self.recipes[0])
+
+    def download(self, **extra):
+        response = self.client.get(DOWNLOAD_URL, {'format': 'json'}, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_json(self):
+        _, content = self.download()
+        self.assertEqual(
+            json.loads(content),
+            [{'name': ingredient.name, 'measurement_unit': 'г',
+              'amount': amount}
+             for amount, ingredient in enumerate(self.ingredients[:3], 1)])
+
+    def test_gzip(self):
+        response, content = self.download(HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(content))), 3)
+
+    def test_gzip_refused(self):
+        for accept_encoding in ('gzip;q=0, br', 'br, *;q=0', 'identity'):
+            response, content = self.download(
+                HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(len(json.loads(content)), 3)
+
+    def test_queries_counted(self):
+        """ Запрос строк списка учтен в Server-Timing и бюджете. """
+        with CaptureQueriesContext(connection) as queries:
+            response, _ = self.download()
+        self.assertIn(f'desc="{len(queries)} queries"',
+                      response['Server-Timing'])
+        budgets = dict(settings.QUERY_BUDGETS)
+        budgets['RecipesViewSet.download_shopping_cart'] = len(queries) - 1
+        with override_settings(QUERY_BUDGETS=budgets,
+                               QUERY_BUDGET_STRICT=True):
+            with self.assertRaises(QueryBudgetExceededError):
+                self.client.get(DOWNLOAD_URL, {'format': 'json'})
@@ -0,0 +1,42 @@
+from .base import FoodgramTestCase
+
+
+class TagsFilterTest(FoodgramTestCase):
+    """
+    Фильтр по тэгам: у рецепта с номером index тэги tags[:index % 3 + 1].
+    """
+
+    def filtered(self, *slugs, mode=None):
+        params = {'tags': list(slugs), 'limit': self.recipes_count}
+        if mode:
+            params['tags_mode'] = mode
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(item['id'] for item in response.data['results'])
+
+    def recipe_ids(self, *indexes):
+        return sorted(self.recipes[index].id for index in indexes)
+
+    def test_any(self):
+        self.assertEqual(self.filtered('tag1', 'tag2'),
+                         self.recipe_ids(1, 2, 4, 5))
+        self.assertEqual(self.filtered('tag2', 'tag2'),
+                         self.recipe_ids(2, 5))
+
+    def test_all(self):
+        self.assertEqual(self.filtered('tag1', 'tag2', mode='all'),
+                         self.recipe_ids(2, 5))
+        self.assertEqual(self.filtered('tag0', 'tag1', mode='all'),
+                         self.recipe_ids(1, 2, 4, 5))
+
+    def test_unknown_slug(self):
+        self.assertEqual(self.filtered('tag2', 'missing'),
+                         self.recipe_ids(2, 5))
+        self.assertEqual(self.filtered('tag2', 'missing', mode='all'), [])
+        self.assertEqual(self.filtered('missing'), [])
+
+    def test_duplicate_slugs(self):
+        self.assertEqual(self.filtered('tag2', 'tag2', mode='all'),
+                         self.recipe_ids(2, 5))
+        self.assertEqual(
+            self.filtered('tag2', 'tag2', 'missing', mode='all'), [])
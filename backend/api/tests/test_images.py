@@ -0,0 +1,112 @@
+import base64
+import datetime
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.test import override_settings
+from django.utils import timezone
+from PIL import Image
+
+from .base import FoodgramTestCase
+from recipes.images import thumbnail_names
+from recipes.management.commands.gc_media import collect
+from recipes.models import MediaFile, RecipeList
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def encode_image(color='red', size=(800, 600)):
+    """ PNG-изображение в формате data URI, как его отправляет фронтенд. """
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImageTestCase(FoodgramTestCase):
+    """ Рецепты с изображениями во временном каталоге MEDIA_ROOT. """
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def create(self, image, author=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client_for(author or self.users[0]).post(
+                '/api/recipes/', {
+                    'name': 'С изображением', 'text': 'Описание',
+                    'cooking_time': 10, 'image': image,
+                    'tags': [self.tags[0].id],
+                    'ingredients': [{'id': self.ingredients[0].id,
+                                     'amount': 5}]},
+                format='json')
+
+
+class ImagePipelineTest(ImageTestCase):
+    """ Загрузка изображения: проверка размера и миниатюры. """
+
+    def test_thumbnails(self):
+        response = self.create(encode_image())
+        self.assertEqual(response.status_code, 201)
+        storage = self.recipes[0]._meta.get_field('image').storage
+        name = response.data['image'].split('/media/', 1)[1]
+        for width, names in thumbnail_names(name).items():
+            for extension, path in names.items():
+                self.assertTrue(storage.exists(path))
+                self.assertTrue(response.data['thumbnails'][str(width)][
+                    extension].endswith(path))
+                with storage.open(path) as file:
+                    self.assertEqual(Image.open(file).width, width)
+
+    @override_settings(MAX_IMAGE_SIZE=1024)
+    def test_too_large(self):
+        response = self.create('data:image/png;base64,' + 'A' * 2048)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+
+    def test_invalid(self):
+        response = self.create('data:image/png;base64,AAA=')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+
+
+class MediaStorageTest(ImageTestCase):
+    """ Одинаковые изображения - один файл; файлы без ссылок
+    удаляет gc_media вместе с миниатюрами. """
+
+    def test_deduplicated_and_collected(self):
+        image = encode_image('green')
+        names = {
+            self.create(image, author).data['image'].split('/media/', 1)[1]
+            for author in self.users[:2]}
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        digest = name.rsplit('/', 1)[1].split('.')[0]
+        self.assertEqual(
+            name, f'static/recipe/{digest[:2]}/{digest[2:4]}/{digest}.png')
+        self.assertEqual(MediaFile.objects.get(name=name).references, 2)
+        later = timezone.now() + datetime.timedelta(seconds=1)
+        recipes = RecipeList.objects.filter(image=name)
+        recipes.first().delete()
+        self.assertEqual(collect(later), [])
+        self.assertEqual(MediaFile.objects.get(name=name).references, 1)
+        recipes.get().delete()
+        self.assertEqual(collect(later), [name])
+        storage = RecipeList._meta.get_field('image').storage
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(any(
+            storage.exists(path) for paths in thumbnail_names(name).values()
+            for path in paths.values()))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_grace_period(self):
+        name = self.create(encode_image('blue')).data['image'].split(
+            '/media/', 1)[1]
+        RecipeList.objects.get(image=name).delete()
+        self.assertEqual(
+            collect(timezone.now() - datetime.timedelta(hours=1)), [])
+        self.assertTrue(RecipeList._meta.get_field('image').storage.exists(
+            name))
@@ -0,0 +1,64 @@
+from django.test import override_settings
+
+from .base import FoodgramTestCase
+from api.autocomplete import ingredient_index
+from recipes.models import Ingredient
+
+
+class IngredientSearchTest(FoodgramTestCase):
+    """
+    Автодополнение ингредиентов: сначала совпадения по началу названия,
+    затем внутри названия, не больше INGREDIENT_SEARCH_LIMIT; индекс
+    в памяти и запрос к базе дают одинаковый результат.
+    """
+    url = '/api/ingredients/'
+
+    @classmethod
+    def create_data(cls):
+        super().create_data()
+        for name in ('Sea salt', 'Salt', 'Basalt', 'Salami', 'Pepper'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        super().setUp()
+        ingredient_index.invalidate()
+
+    def search(self, name):
+        response = self.client.get(self.url, {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data]
+
+    def assert_search(self):
+        self.assertEqual(self.search('sal'),
+                         ['Salami', 'Salt', 'Basalt', 'Sea salt'])
+        self.assertEqual(self.search(' SALT '),
+                         ['Salt', 'Basalt', 'Sea salt'])
+        self.assertEqual(self.search('missing'), [])
+        with override_settings(INGREDIENT_SEARCH_LIMIT=3):
+            self.assertEqual(self.search('sal'),
+                             ['Salami', 'Salt', 'Basalt'])
+
+    def test_in_memory(self):
+        self.search('pep')
+        with self.assertNumQueries(0):
+            self.assert_search()
+
+    @override_settings(INGREDIENT_SEARCH_IN_MEMORY=False)
+    def test_database(self):
+        self.assert_search()
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url, {'name': 'sal'})
+        self.assertIn('public', response['Cache-Control'])
+        etag = response['ETag']
+        response = self.client.get(
+            self.url, {'name': 'sal'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(
+            self.client.get(self.url, {'name': 'pep'})['ETag'], etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Salsa', measurement_unit='г')
+        response = self.client.get(
+            self.url, {'name': 'sal'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Salsa', [item['name'] for item in response.data])
@@ -0,0 +1,71 @@
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import CommandError
+
+from .base import FoodgramTestCase
+from recipes.management.commands.load_data import (
+    import_data,
+    iter_json_array
+)
+from recipes.models import Ingredient
+
+ROWS = [
+    {'name': 'Мука', 'measurement_unit': 'г'},
+    {'name': 'Молоко', 'measurement_unit': 'мл'},
+    {'name': 'Мука', 'measurement_unit': 'г'},
+]
+
+
+class LoadDataTest(FoodgramTestCase):
+    """ Импорт ингредиентов из json и csv: пакетами, без дубликатов. """
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def imported(self):
+        return set(Ingredient.objects.filter(
+            name__in=('Мука', 'Молоко')).values_list(
+            'name', 'measurement_unit'))
+
+    def test_json_array_chunks(self):
+        content = json.dumps(ROWS, ensure_ascii=False, indent=1)
+        self.assertEqual(
+            list(iter_json_array(io.StringIO(content), chunk_size=7)), ROWS)
+
+    def test_json_idempotent(self):
+        path = self.write('ingredients.json', json.dumps(ROWS))
+        self.assertEqual(import_data(path, batch_size=2), (3, 2))
+        self.assertEqual(import_data(path, batch_size=2), (3, 0))
+        self.assertEqual(self.imported(), {('Мука', 'г'), ('Молоко', 'мл')})
+
+    def test_csv(self):
+        path = self.write(
+            'ingredients.csv', 'name,measurement_unit\nМука,г\n'
+            '" Молоко ",мл\n')
+        self.assertEqual(import_data(path, batch_size=1), (2, 2))
+        self.assertEqual(self.imported(), {('Мука', 'г'), ('Молоко', 'мл')})
+
+    def test_dry_run(self):
+        path = self.write('ingredients.json', json.dumps(ROWS))
+        self.assertEqual(import_data(path, 10, dry_run=True), (3, 2))
+        self.assertEqual(self.imported(), set())
+
+    def test_invalid(self):
+        path = self.write('ingredients.csv', 'Мука,г\nМолоко\n')
+        with self.assertRaisesMessage(CommandError, '№2'):
+            import_data(path, batch_size=1)
+        self.assertEqual(self.imported(), set())
+        with self.assertRaises(CommandError):
+            import_data(self.write('ingredients.txt', ''), 10)
@@ -0,0 +1,56 @@
+import datetime
+
+from django.utils import timezone
+
+from .base import FoodgramTestCase
+from recipes.management.commands.update_trending import update_trending
+from recipes.models import FavoriteRecipe, ShoppingCart
+
+
+class RecipeOrderingTest(FoodgramTestCase):
+    """
+    Сортировки popular и trending: по счетчику избранного и по рейтингу,
+    который пересчитывает update_trending.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        now = timezone.now()
+        old, recent, fresh, stale = cls.recipes[:4]
+        for user in cls.users[:2]:
+            cls.add(FavoriteRecipe, user, old, now - datetime.timedelta(
+                days=10))
+        cls.add(FavoriteRecipe, cls.users[0], recent, now)
+        cls.add(ShoppingCart, cls.users[0], fresh, now)
+        cls.add(FavoriteRecipe, cls.users[0], stale, now - datetime.timedelta(
+            days=20))
+
+    @staticmethod
+    def add(model, user, recipe, created):
+        link = model.objects.create(user=user, recipe=recipe)
+        model.objects.filter(pk=link.pk).update(created=created)
+
+    def ordered(self, ordering):
+        response = self.client.get(
+            '/api/recipes/', {'ordering': ordering,
+                              'limit': self.recipes_count})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def ids(self, *indexes):
+        return [self.recipes[index].id for index in indexes]
+
+    def test_popular(self):
+        self.assertEqual(self.ordered('popular'), self.ids(0, 3, 1, 5, 4, 2))
+
+    def test_trending(self):
+        self.assertEqual(self.ordered('trending'), self.ids(5, 4, 3, 2, 1, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(update_trending(), 3)
+        self.assertEqual(self.ordered('trending'), self.ids(1, 2, 0, 5, 4, 3))
+        self.assertEqual(update_trending(), 0)
+        FavoriteRecipe.objects.filter(recipe=self.recipes[1]).delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(update_trending(), 1)
+        self.assertEqual(self.ordered('trending'), self.ids(2, 0, 5, 4, 3, 1))
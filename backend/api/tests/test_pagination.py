@@ -0,0 +1,114 @@
+from base64 import b64decode, b64encode
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from django.conf import settings
+from django.utils import timezone
+
+from .base import FoodgramTestCase
+from recipes.models import RecipeList
+from users.models import Subscribe
+
+
+class KeysetPaginationTest(FoodgramTestCase):
+    """ Пагинация по курсору при равных значениях ключа сортировки. """
+    recipes_count = 11
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for index, recipe in enumerate(cls.recipes):
+            RecipeList.objects.filter(pk=recipe.pk).update(
+                favorites_count=index % 2)
+
+    def walk(self, url, link):
+        """ id рецептов всех страниц по ссылкам link (next/previous). """
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([item['id'] for item in response.data['results']])
+            url = response.data[link]
+            if url:
+                url = '{0.path}?{0.query}'.format(urlsplit(url))
+                cursor = parse_qs(urlsplit(url).query)['cursor'][0]
+                self.assertNotIn('o', parse_qs(b64decode(cursor).decode()))
+        return pages
+
+    def test_ties(self):
+        expected = list(RecipeList.objects.order_by(
+            '-favorites_count', '-id').values_list('id', flat=True))
+        pages = self.walk(
+            '/api/recipes/?ordering=popular&cursor=&limit=3', 'next')
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_previous(self):
+        pages = self.walk('/api/recipes/?ordering=popular&cursor=&limit=3',
+                          'next')
+        response = self.client.get(
+            '/api/recipes/?ordering=popular&cursor=&limit=3')
+        url = response.data['next']
+        response = self.client.get(
+            '{0.path}?{0.query}'.format(urlsplit(url)))
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], pages[1])
+        previous = self.walk(
+            '{0.path}?{0.query}'.format(urlsplit(response.data['previous'])),
+            'previous')
+        self.assertEqual(previous, [pages[0]])
+
+    def test_invalid_cursor(self):
+        for position in ('bad', '["1"]', '["x", "1"]'):
+            cursor = b64encode(urlencode({'p': position}).encode()).decode()
+            response = self.client.get(
+                '/api/recipes/', {'ordering': 'popular', 'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+class FeedPaginationTest(FoodgramTestCase):
+    """
+    Лента подписок: страницы из начала ленты в кэше и за его пределами,
+    в том числе среди рецептов с одинаковой датой публикации.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        reader, *authors = cls.users
+        Subscribe.objects.bulk_create(
+            Subscribe(user=reader, author=author) for author in authors)
+        RecipeList.objects.bulk_create(
+            RecipeList(author=authors[index % len(authors)],
+                       name=f'Рецепт ленты {index}', text='Описание',
+                       cooking_time=1)
+            for index in range(settings.FEED_HEAD_SIZE + 20))
+        RecipeList.objects.filter(id__in=RecipeList.objects.order_by(
+            'id').values('id')[:50]).update(pub_date=timezone.now())
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.users[0])
+
+    def test_pages(self):
+        expected = list(RecipeList.objects.filter(
+            author__in=self.users[1:]
+        ).order_by('-pub_date', '-id').values_list('id', flat=True))
+        self.assertGreater(len(expected), settings.FEED_HEAD_SIZE)
+        ids, url = [], '/api/recipes/feed/?limit=7'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+            if url:
+                url = '{0.path}?{0.query}'.format(urlsplit(url))
+        self.assertEqual(ids, expected)
+
+    def test_new_recipe(self):
+        """ Новый рецепт автора сразу попадает в начало ленты. """
+        first = self.client.get('/api/recipes/feed/').data['results'][0]
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = self.create_recipe(self.users[1])
+        results = self.client.get('/api/recipes/feed/').data['results']
+        self.assertEqual(
+            [item['id'] for item in results[:2]], [recipe.id, first['id']])
@@ -0,0 +1,68 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .base import FoodgramTestCase
+from recipes.models import FavoriteRecipe, ShoppingCart
+
+
+class RecipeListQueriesTest(FoodgramTestCase):
+    """ Число запросов списка рецептов не зависит от размера страницы. """
+    recipes_count = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        reader = cls.users[0]
+        FavoriteRecipe.objects.bulk_create(
+            FavoriteRecipe(user=reader, recipe=recipe)
+            for recipe in cls.recipes[::2])
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=reader, recipe=recipe)
+            for recipe in cls.recipes[::3])
+
+    def count_queries(self, client, limit):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/recipes/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(queries)
+
+    def assert_constant(self, client):
+        expected = self.count_queries(client, 1)
+        for limit in (2, 6, 12):
+            with self.assertNumQueries(expected):
+                response = client.get('/api/recipes/', {'limit': limit})
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        self.assert_constant(self.client)
+
+    def test_authenticated(self):
+        self.assert_constant(self.client_for(self.users[0]))
+
+    def test_flags(self):
+        """ Флаги избранного и корзины - из тех же запросов. """
+        response = self.client_for(self.users[0]).get(
+            '/api/recipes/', {'limit': self.recipes_count})
+        flags = {
+            item['id']: (item['is_favorited'], item['is_in_shopping_cart'])
+            for item in response.data['results']}
+        for index, recipe in enumerate(self.recipes):
+            self.assertEqual(
+                flags[recipe.id], (index % 2 == 0, index % 3 == 0))
+        self.assertEqual(
+            len(response.data['results'][0]['ingredients']), 3)
+
+
+class SimilarRecipesTest(FoodgramTestCase):
+    """ Похожие рецепты укладываются в бюджет запросов с токеном. """
+
+    def test_without_neighbours(self):
+        client = self.client_for(self.users[0])
+        recipe = self.recipes[0]
+        with self.settings(QUERY_BUDGET_STRICT=True):
+            response = client.get(f'/api/recipes/{recipe.id}/similar/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, [])
+            response = client.get('/api/recipes/999999/similar/')
+            self.assertEqual(response.status_code, 404)
@@ -0,0 +1,74 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.test import override_settings
+
+from .base import FoodgramTestCase
+from recipes.management.commands.update_recommendations import update_related
+from recipes.models import FavoriteRecipe, ShoppingCart
+
+RELATED_TIMEOUT: int = 60
+
+
+class RecommendationsTest(FoodgramTestCase):
+    """
+    Рекомендации после update_recommendations: рецепты, которые
+    добавляют в избранное вместе с избранным пользователя.
+    """
+    users_count = 5
+
+    @classmethod
+    def create_data(cls):
+        super().create_data()
+        first, second, third = cls.recipes[:3]
+        # first и second вместе у трех пользователей, first и third -
+        # у двух, second и third - у одного (меньше RELATED_MIN_SUPPORT).
+        for user in cls.users[1:4]:
+            FavoriteRecipe.objects.create(user=user, recipe=first)
+            FavoriteRecipe.objects.create(user=user, recipe=second)
+        for user in cls.users[3:]:
+            FavoriteRecipe.objects.create(user=user, recipe=third)
+        FavoriteRecipe.objects.create(user=cls.users[4], recipe=first)
+        FavoriteRecipe.objects.create(user=cls.users[0], recipe=first)
+
+    def setUp(self):
+        super().setUp()
+        self.user_client = self.client_for(self.users[0])
+
+    def recommended(self):
+        response = self.user_client.get('/api/recipes/recommended/')
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def ids(self, *indexes):
+        return [self.recipes[index].id for index in indexes]
+
+    def test_recommended(self):
+        self.assertEqual(self.recommended(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(update_related()[1:], (3, 4))
+        self.assertEqual(self.recommended(), self.ids(1, 2))
+        with self.captureOnCommitCallbacks(execute=True):
+            ShoppingCart.objects.create(
+                user=self.users[0], recipe=self.recipes[2])
+        self.assertEqual(self.recommended(), self.ids(1))
+
+    @override_settings(VERSION_TIMEOUTS={
+        'recipes.relatedrecipe': RELATED_TIMEOUT})
+    def test_version_expires(self):
+        """
+        Расчет в другом процессе не меняет версию в LocMemCache
+        веб-процесса: новые связи видны после истечения версии,
+        хотя сам список в кэше еще действителен.
+        """
+        self.assertEqual(self.recommended(), [])
+        # Без captureOnCommitCallbacks версия не обновляется.
+        update_related()
+        self.assertEqual(self.recommended(), [])
+        now = time.time()
+        self.assertLess(RELATED_TIMEOUT, settings.RESPONSE_CACHE_TIMEOUT)
+        with mock.patch('time.time', return_value=now + RELATED_TIMEOUT - 1):
+            self.assertEqual(self.recommended(), [])
+        with mock.patch('time.time', return_value=now + RELATED_TIMEOUT + 1):
+            self.assertEqual(self.recommended(), self.ids(1, 2))
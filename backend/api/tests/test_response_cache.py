@@ -0,0 +1,57 @@
+from .base import FoodgramTestCase
+from recipes.models import RecipeList
+
+
+class ResponseCacheTest(FoodgramTestCase):
+    """
+    Кэш ответов для анонимных пользователей: повторный запрос - без
+    обращений к базе, изменение рецепта сбрасывает только ответы,
+    в которые он может попасть.
+    """
+
+    def names(self, params=None):
+        return {item['id']: item['name']
+                for item in self.get('/api/recipes/', params)['results']}
+
+    def get(self, url, params=None, client=None):
+        response = (client or self.client).get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def rename(self, recipe, name):
+        recipe = RecipeList.objects.get(pk=recipe.pk)
+        recipe.name = name
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+
+    def test_cached(self):
+        data = self.get('/api/recipes/', {'limit': 2, 'page': 1})
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.get('/api/recipes/', {'page': 1, 'limit': 2}), data)
+
+    def test_authenticated_not_cached(self):
+        self.get('/api/recipes/')
+        with self.assertNumQueries(0):
+            self.get('/api/recipes/')
+        client = self.client_for(self.users[0])
+        self.get('/api/recipes/', client=client)
+        with self.assertRaises(AssertionError):
+            with self.assertNumQueries(0):
+                self.get('/api/recipes/', client=client)
+
+    def test_targeted_invalidation(self):
+        first, second = self.recipes[0], self.recipes[1]
+        self.assertNotEqual(first.author_id, second.author_id)
+        detail = f'/api/recipes/{first.id}/'
+        self.get(detail)
+        self.get('/api/recipes/', {'author': first.author_id})
+        self.rename(second, 'Другой рецепт')
+        with self.assertNumQueries(0):
+            self.get(detail)
+            self.get('/api/recipes/', {'author': first.author_id})
+        self.assertEqual(self.names()[second.id], 'Другой рецепт')
+        self.rename(first, 'Новое название')
+        self.assertEqual(self.get(detail)['name'], 'Новое название')
+        self.assertEqual(self.names({'author': first.author_id})[first.id],
+                         'Новое название')
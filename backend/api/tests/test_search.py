@@ -0,0 +1,62 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+
+from .base import FoodgramTestCase
+from recipes.management.commands.rebuild_search_index import rebuild_search
+from recipes.models import Ingredient, IngredientInRecipe, RecipeList
+from recipes.search import search_engine
+
+
+class RecipeSearchTest(FoodgramTestCase):
+    """
+    Поиск ?search=: все слова запроса, последнее - по началу, совпадения
+    в названии выше совпадений в описании; индекс следует за рецептами.
+    """
+
+    @classmethod
+    def create_data(cls):
+        super().create_data()
+        author = cls.users[0]
+        cls.borscht, cls.salad, cls.vinaigrette = (
+            RecipeList.objects.create(
+                author=author, name=name, text=text, cooking_time=10)
+            for name, text in (('Борщ', 'Описание'),
+                               ('Салат', 'Подается к борщу'),
+                               ('Винегрет', 'Описание')))
+        IngredientInRecipe.objects.create(
+            recipe=cls.vinaigrette, amount=1,
+            ingredient=Ingredient.objects.create(
+                name='Свекла', measurement_unit='г'))
+
+    def setUp(self):
+        super().setUp()
+        search_engine().invalidate()
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_ranking(self):
+        self.assertEqual(self.search('борщ'),
+                         [self.borscht.id, self.salad.id])
+        self.assertEqual(self.search('борщ салат'), [self.salad.id])
+        self.assertEqual(self.search('свекл'), [self.vinaigrette.id])
+        self.assertEqual(self.search('щавель'), [])
+
+    def test_updated(self):
+        self.search('борщ')
+        recipe = RecipeList.objects.get(pk=self.borscht.pk)
+        recipe.name = 'Щи'
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        self.assertEqual(self.search('борщ'), [self.salad.id])
+        self.assertEqual(self.search('щи'), [self.borscht.id])
+
+    def test_rebuild_postgres_only(self):
+        """ Индекс в памяти (SQLite) команда не перестраивает. """
+        self.assertEqual(rebuild_search(), 0)
+        with self.assertRaisesMessage(CommandError, 'SEARCH_INDEX_TTL'):
+            call_command('rebuild_search_index', stdout=StringIO(),
+                         stderr=StringIO())
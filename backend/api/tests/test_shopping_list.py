@@ -0,0 +1,79 @@
+from .base import FoodgramTestCase
+from recipes.models import (
+    IngredientInRecipe,
+    ShoppingCart,
+    ShoppingListItem
+)
+
+
+class ShoppingListTest(FoodgramTestCase):
+    """ Сводный список покупок совпадает с пересчетом по корзинам. """
+
+    def shopping_list(self):
+        return sorted(ShoppingListItem.objects.values_list(
+            'user_id', 'ingredient_id', 'amount'))
+
+    def assert_consistent(self):
+        self.assertEqual(self.shopping_list(), sorted(
+            (item['recipe__shopping_cart__user'], item['ingredient'],
+             item['total'])
+            for item in ShoppingListItem.objects.aggregate_from_carts()))
+
+    def cart_url(self, recipe):
+        return f'/api/recipes/{recipe.id}/shopping_cart/'
+
+    def test_add_and_remove(self):
+        user = self.users[0]
+        client = self.client_for(user)
+        for recipe in self.recipes[:2]:
+            response = client.post(self.cart_url(recipe))
+            self.assertEqual(response.status_code, 201)
+        self.assert_consistent()
+        self.assertEqual(self.shopping_list(), [
+            (user.id, ingredient.id, amount * 2)
+            for amount, ingredient in enumerate(self.ingredients[:3], 1)])
+        self.assertEqual(
+            client.delete(self.cart_url(self.recipes[0])).status_code, 204)
+        self.assert_consistent()
+        self.assertEqual(
+            client.delete(self.cart_url(self.recipes[1])).status_code, 204)
+        self.assertEqual(self.shopping_list(), [])
+
+    def test_recipe_deleted(self):
+        recipe = self.recipes[0]
+        for user in self.users:
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+        ShoppingCart.objects.create(user=self.users[1], recipe=self.recipes[1])
+        self.assert_consistent()
+        recipe.delete()
+        self.assert_consistent()
+        self.assertEqual(
+            ShoppingListItem.objects.filter(user=self.users[1]).count(), 3)
+
+    def test_recipe_ingredients_changed(self):
+        recipe = self.recipes[0]
+        for user in self.users[:2]:
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+        ShoppingCart.objects.create(user=self.users[1], recipe=self.recipes[1])
+        first, second, _ = self.ingredients[:3]
+        kept = IngredientInRecipe.objects.get(recipe=recipe, ingredient=first)
+        response = self.client_for(recipe.author).patch(
+            f'/api/recipes/{recipe.id}/', {
+                'cooking_time': recipe.cooking_time,
+                'tags': [tag.id for tag in self.tags[1:]],
+                'ingredients': [
+                    {'id': first.id, 'amount': 1},
+                    {'id': second.id, 'amount': 5},
+                    {'id': self.ingredients[3].id, 'amount': 4}]},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_consistent()
+        self.assertEqual(
+            IngredientInRecipe.objects.get(pk=kept.pk).amount, 1)
+        self.assertEqual(sorted(IngredientInRecipe.objects.filter(
+            recipe=recipe).values_list('ingredient_id', 'amount')), [
+            (first.id, 1), (second.id, 5), (self.ingredients[3].id, 4)])
+        self.assertEqual(sorted(recipe.tags.values_list('id', flat=True)),
+                         [tag.id for tag in self.tags[1:]])
+        self.assertFalse(ShoppingListItem.objects.filter(
+            user=self.users[2]).exists())
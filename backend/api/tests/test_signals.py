@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.db import IntegrityError, transaction
+
+from .base import FoodgramTestCase
+from api.signals import cookable_updates, search_updates
+from recipes.models import IngredientInRecipe
+from recipes.signals import similarity_marks
+
+
+class CommitBatchTest(FoodgramTestCase):
+    """ Обновления индексов - один вызов на рецепт за транзакцию. """
+
+    def patched(self):
+        return (mock.patch.object(batch, 'func')
+                for batch in (search_updates, cookable_updates,
+                              similarity_marks))
+
+    def test_recipe_deleted(self):
+        recipe = self.recipes[0]
+        recipe_id = recipe.id
+        search, cookable, marks = self.patched()
+        with search as search, cookable as cookable, marks as marks:
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe.delete()
+        search.assert_called_once_with([recipe_id])
+        cookable.assert_called_once_with([recipe_id])
+        marks.assert_called_once_with([recipe_id])
+
+    def test_ingredient_rows(self):
+        """ Строки ингредиентов двух рецептов, измененные по одной
+        в одной транзакции. """
+        first, second = self.recipes[:2]
+        search, cookable, marks = self.patched()
+        with search as search, cookable as cookable, marks as marks:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for row in IngredientInRecipe.objects.filter(
+                            recipe__in=(first, second)):
+                        row.amount += 1
+                        row.save()
+                    IngredientInRecipe.objects.create(
+                        recipe=first, ingredient=self.ingredients[4],
+                        amount=1)
+                    IngredientInRecipe.objects.filter(
+                        recipe=second).first().delete()
+        for batch in (search, cookable, marks):
+            batch.assert_called_once_with(sorted([first.id, second.id]))
+
+    def test_rolled_back(self):
+        """ Откат точки сохранения убирает вызов, следующий id
+        планирует новый. """
+        _, cookable, _ = self.patched()
+        with cookable as cookable:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        cookable_updates.add([1])
+                        raise IntegrityError
+                except IntegrityError:
+                    pass
+                cookable_updates.add([2])
+                cookable_updates.add([3, 2])
+        cookable.assert_called_once_with([2, 3])
@@ -0,0 +1,56 @@
+from .base import FoodgramTestCase
+from recipes.management.commands.update_similar_recipes import update_similar
+from recipes.models import IngredientInRecipe, RecipeList
+
+# Номера ингредиентов рецептов: у каждого ингредиента не больше
+# половины рецептов, иначе он не различает рецепты и отбрасывается;
+# ингредиент 2 чаще 0, поэтому его вес (idf) меньше.
+COMPOSITION: tuple = ((0, 1), (0, 1, 2), (1, 2), (3, 4), (3,), (4,), (2,))
+
+
+class SimilarRecipesTest(FoodgramTestCase):
+    """ Похожие рецепты после update_similar_recipes. """
+    recipes_count = 0
+
+    @classmethod
+    def create_data(cls):
+        super().create_data()
+        cls.recipes = [
+            RecipeList.objects.create(
+                author=cls.users[0], name=f'Рецепт {index}', text='Описание',
+                cooking_time=1)
+            for index in range(len(COMPOSITION))]
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, ingredient=cls.ingredients[i],
+                               amount=1)
+            for recipe, indexes in zip(cls.recipes, COMPOSITION)
+            for i in indexes)
+
+    def similar(self, index):
+        response = self.client.get(
+            f'/api/recipes/{self.recipes[index].id}/similar/')
+        self.assertEqual(response.status_code, 200)
+        return [self.recipe_index(item['id']) for item in response.data]
+
+    def recipe_index(self, pk):
+        return [recipe.id for recipe in self.recipes].index(pk)
+
+    def test_full(self):
+        self.assertEqual(self.similar(0), [])
+        update_similar(full=True)
+        self.assertEqual(self.similar(0), [1, 2])
+        self.assertEqual(self.similar(1), [0, 2, 6])
+        self.assertCountEqual(self.similar(3), [4, 5])
+        self.assertEqual(self.similar(4), [3])
+
+    def test_incremental(self):
+        update_similar(full=True)
+        self.assertEqual(update_similar(), (0, 0))
+        row = IngredientInRecipe.objects.get(recipe=self.recipes[5])
+        row.ingredient = self.ingredients[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            row.save()
+        recipes, _ = update_similar()
+        self.assertGreater(recipes, 0)
+        self.assertIn(5, self.similar(0))
+        self.assertEqual(self.similar(3), [4])
@@ -0,0 +1,55 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .base import FoodgramTestCase
+from users.models import Subscribe
+
+
+class SubscriptionsTest(FoodgramTestCase):
+    """
+    Подписки: последние recipes_limit рецептов каждого автора,
+    число запросов не зависит от числа подписок.
+    """
+    users_count = 5
+    recipes_count = 15
+    url = '/api/users/subscriptions/'
+
+    def setUp(self):
+        super().setUp()
+        self.reader = self.users[0]
+        self.client = self.client_for(self.reader)
+
+    def subscribe(self, authors):
+        Subscribe.objects.bulk_create(
+            Subscribe(user=self.reader, author=author) for author in authors)
+
+    def get(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'], len(queries)
+
+    def test_recipes_limit(self):
+        self.subscribe(self.users[1:])
+        results, _ = self.get(recipes_limit=2)
+        self.assertEqual([item['id'] for item in results],
+                         [user.id for user in reversed(self.users[1:])])
+        for item in results:
+            expected = sorted(
+                (recipe.id for recipe in self.recipes
+                 if recipe.author_id == item['id']), reverse=True)
+            self.assertEqual([recipe['id'] for recipe in item['recipes']],
+                             expected[:2])
+            self.assertEqual(item['recipes_count'], len(expected))
+            self.assertTrue(item['is_subscribed'])
+
+    def test_queries(self):
+        self.subscribe(self.users[1:2])
+        _, expected = self.get(recipes_limit=2)
+        self.subscribe(self.users[2:])
+        results, queries = self.get(recipes_limit=2)
+        self.assertEqual(len(results), self.users_count - 1)
+        self.assertEqual(queries, expected)
+        results, queries = self.get()
+        self.assertEqual(queries, expected)
+        self.assertEqual(len(results[0]['recipes']), 3)
@@ -3,6 +3,7 @@ from rest_framework.routers import DefaultRouter
 
 from .views import (
     IngredientsViewSet,
+    metrics,
     RecipesViewSet,
     set_password,
     TagsViewSet,
@@ -35,6 +36,7 @@ router_v1.register(
 )
 
 urlpatterns = [
+    path('_metrics', metrics, name='metrics'),
     path('', include(router_v1.urls)),
     path('', include('djoser.urls')),
     path('users/set_password/',
@@ -1,24 +1,67 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import (
+    BooleanField,
+    Exists,
+    OuterRef,
+    Prefetch,
+    prefetch_related_objects,
+    Value
+)
+from django.http import HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import filters, status, viewsets
-from rest_framework.decorators import action, api_view
+from rest_framework.decorators import (
+    action,
+    api_view,
+    permission_classes
+)
 from rest_framework.generics import get_object_or_404
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import (
+    AllowAny,
+    IsAdminUser,
+    IsAuthenticated
+)
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
-from .filters import IngredientFilter, RecipeFilter
-from .pagination import LimitPageNumberPagination
+from .autocomplete import ingredient_index
+from .caching import (
+    ConditionalGetMixin,
+    ResponseCacheMixin,
+    get_scoped_versions
+)
+from .exporters import ExportContentNegotiation
+from .filters import (
+    IngredientFilter,
+    RecipeFilter,
+    RecipeOrderingFilter,
+    RecipeSearchFilter
+)
+from .metrics import MetricsMixin, registry
+from .feed import feed_head
+from .pagination import (
+    FeedPagination,
+    LimitPageNumberPagination,
+    SequencePagination
+)
 from .permissions import IsAdminOrReadOnly, IsOwnerOrReadOnly
+from .recommendations import recommended_ids
+from recipes.cookable import cookable_index
 from recipes.models import (
     FavoriteRecipe,
     Ingredient,
+    IngredientInRecipe,
     RecipeList,
     ShoppingCart,
+    SimilarRecipe,
     Tag
 )
 from .serializers import (
+    BulkIdsSerializer,
+    CookableQuerySerializer,
+    CookableRecipeSerializer,
     IngredientSerializer,
     FavoriteOrSubscribeSerializer,
     RecipeSerializer,
@@ -28,7 +71,12 @@ from .serializers import (
     UserPasswordSerializer
 )
 from .services import collect_shopping_cart
-from users.models import Subscribe
+from users.models import (
+    EXISTS,
+    FORBIDDEN,
+    REMOVED,
+    Subscribe
+)
 
 
 User = get_user_model()
@@ -50,7 +98,35 @@ def set_password(request):
         status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserViewSet(DjoserUserViewSet):
+@api_view(['get'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """Показатели запросов к API в формате Prometheus."""
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def change_links(model, request, forbidden=()):
+    """
+    Пакетное добавление (POST) или удаление (DELETE) связей
+    пользователя по списку id с результатом для каждого id.
+    forbidden - id, которые добавлять нельзя.
+    """
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data['ids']))
+    allowed = [pk for pk in ids if pk not in forbidden]
+    if request.method == 'POST':
+        results = model.objects.bulk_add(request.user, allowed)
+    else:
+        results = model.objects.bulk_remove(request.user, allowed)
+    return Response({'results': [
+        {'id': pk, 'status': results.get(pk, FORBIDDEN)} for pk in ids
+    ]})
+
+
+class UserViewSet(MetricsMixin, DjoserUserViewSet):
     """
     Пользователи и подписки.
     """
@@ -59,6 +135,16 @@ class UserViewSet(DjoserUserViewSet):
     filter_backends = (DjangoFilterBackend, filters.SearchFilter,)
     search_fields = ('username', 'email')
     permission_classes = (AllowAny,)
+    cursor_ordering = None
+
+    def get_queryset(self):
+        """ Пользователи с признаком подписки одним запросом. """
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset
+        return queryset.annotate(is_subscribed=Exists(
+            Subscribe.objects.filter(user=user, author=OuterRef('pk'))))
 
     @action(methods=['POST', 'DELETE'], detail=True,)
     def subscribe(self, request, id):
@@ -68,20 +154,23 @@ class UserViewSet(DjoserUserViewSet):
         author = get_object_or_404(User, id=id)
         if request.method == 'POST':
             if request.user.id == author.id:
-                raise ValueError('Нельзя подписаться на себя самого')
+                return Response(
+                    {'errors': 'Нельзя подписаться на себя самого!'},
+                    status=status.HTTP_400_BAD_REQUEST)
+            results = Subscribe.objects.bulk_add(request.user, [author.id])
+            if results[author.id] == EXISTS:
+                return Response(
+                    {'errors': 'Вы уже подписаны на этого автора!'},
+                    status=status.HTTP_400_BAD_REQUEST)
+            subscribe = Subscribe(user=request.user, author=author)
+            subscribe.is_subscribed = True
             serializer = SubscribeSerializer(
-                Subscribe.objects.create(user=request.user,
-                                         author=author),
-                context={'request': request})
+                subscribe, context={'request': request})
             return Response(serializer.data,
                             status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            if Subscribe.objects.filter(user=request.user,
-                                        author=author
-                                        ).exists():
-                Subscribe.objects.filter(user=request.user,
-                                         author=author
-                                         ).delete()
+            results = Subscribe.objects.bulk_remove(request.user, [author.id])
+            if results[author.id] == REMOVED:
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response(
                 {'errors': 'Нельзя отписаться от автора, '
@@ -89,65 +178,238 @@ class UserViewSet(DjoserUserViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+    @action(methods=['POST', 'DELETE'], detail=False,
+            permission_classes=(IsAuthenticated,),
+            url_path='subscribe', url_name='subscribe-batch')
+    def subscribe_batch(self, request):
+        """
+        Подписаться на нескольких авторов или отписаться от них:
+        {"ids": [1, 2, 3]}.
+        """
+        return change_links(Subscribe, request, forbidden={request.user.id})
+
     @action(methods=['GET'],
             detail=False,
-            permission_classes=(IsAuthenticated, )
+            permission_classes=(IsAuthenticated, ),
+            cursor_ordering=('-id',)
             )
     def subscriptions(self, request):
         """ Получить на кого пользователь подписан. """
+        subscriptions = Subscribe.objects.filter(
+            user=request.user
+        ).select_related('author').annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('-id')
+        page = self.paginate_queryset(subscriptions)
+        recipes = RecipeList.objects.all()
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes.latest_per_author(
+                [subscribe.author_id for subscribe in page],
+                int(recipes_limit))
+        prefetch_related_objects(page, Prefetch(
+            'author__recipes', queryset=recipes, to_attr='limited_recipes'))
         serializer = SubscribeSerializer(
-            self.paginate_queryset(Subscribe.objects.filter(
-                                   user=request.user)),
-            many=True, context={'request': request})
+            page, many=True, context={'request': request})
         return self.get_paginated_response(serializer.data)
 
 
-class TagsViewSet(ReadOnlyModelViewSet):
+class TagsViewSet(MetricsMixin, ConditionalGetMixin, ReadOnlyModelViewSet):
     """
     Список тэгов.
     """
+    version_models = (Tag,)
+    cache_max_age = settings.REFERENCE_CACHE_MAX_AGE
     queryset = Tag.objects.all()
     permission_classes = (IsAdminOrReadOnly,)
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientsViewSet(ReadOnlyModelViewSet):
+class IngredientsViewSet(MetricsMixin, ConditionalGetMixin,
+                         ReadOnlyModelViewSet):
     """
     Список ингридиентов.
     """
+    version_models = (Ingredient,)
+    cache_max_age = settings.REFERENCE_CACHE_MAX_AGE
     queryset = Ingredient.objects.all()
     permission_classes = (IsAdminOrReadOnly,)
     serializer_class = IngredientSerializer
     filter_backends = (IngredientFilter,)
-    search_fields = ('^name',)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """ Автодополнение - по индексу в памяти, без запроса к базе;
+        ETag и 304 - как у остальных ответов. """
+        name = request.query_params.get(IngredientFilter.search_param)
+        if name and name.strip() and settings.INGREDIENT_SEARCH_IN_MEMORY:
+            return self.conditional_response(
+                self.autocomplete, request, *args, **kwargs)
+        return super().list(request, *args, **kwargs)
+
+    def autocomplete(self, request, *args, **kwargs):
+        return Response(ingredient_index.search(
+            request.query_params[IngredientFilter.search_param]))
+
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(MetricsMixin, ConditionalGetMixin, ResponseCacheMixin,
+                     viewsets.ModelViewSet):
     """
     Список рецептов.
     """
+    version_models = (Tag, Ingredient, RecipeList, IngredientInRecipe, User)
+    personal_models = (FavoriteRecipe, ShoppingCart, Subscribe)
+    response_cache_model = RecipeList
+    response_cache_models = (Tag, Ingredient, User)
+    response_cache_ignored_params = ('is_favorited', 'is_in_shopping_cart')
     queryset = RecipeList.objects.all()
     serializer_class = RecipeSerializer
     pagination_class = LimitPageNumberPagination
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, RecipeSearchFilter,
+                       RecipeOrderingFilter)
     filterset_class = RecipeFilter
     permission_classes = (IsOwnerOrReadOnly, )
+    lookup_value_regex = r'\d+'
+    # Сортировки по рейтингам, которые меняются без изменения рецептов;
+    # у каждой своя версия в кэше.
+    ranked_orderings = ('popular', 'trending')
+    # Версия поискового индекса: он обновляется после фиксации изменений.
+    search_scope = 'search'
+    cursor_ordering = ('-pub_date', '-id')
+
+    def get_queryset(self):
+        """
+        Рецепты с флагами пользователя и подгруженными связями:
+        число запросов на страницу не зависит от её размера.
+        """
+        return RecipeList.objects.for_user(self.request.user)
+
+    def get_list_scopes(self, request):
+        """ Версии рейтинга, если список им отсортирован,
+        и поискового индекса для ?search=. """
+        scopes = ()
+        ordering = RecipeOrderingFilter.get_ordering_name(request)
+        if ordering in self.ranked_orderings:
+            scopes += (ordering,)
+        if RecipeSearchFilter.get_search_query(request):
+            scopes += (self.search_scope,)
+        return scopes
+
+    def get_extra_versions(self, request, pk=None):
+        if pk is not None:
+            return []
+        return get_scoped_versions(
+            RecipeList, self.get_list_scopes(request))
+
+    def get_response_dependencies(self, request, pk=None):
+        """ Рецепт, автор или тэги, от которых зависит ответ. """
+        if pk is not None:
+            return (f'recipe:{pk}',)
+        scopes = self.get_list_scopes(request)
+        author = request.query_params.get('author')
+        if author:
+            return (f'author:{author}', *scopes)
+        tags = request.query_params.getlist('tags')
+        if tags:
+            return (*(f'tag:{slug}' for slug in tags), *scopes)
+        return ('all', *scopes)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user,)
 
+    def get_feed_head(self):
+        return feed_head(self.request.user)
+
+    @action(detail=False, methods=['GET'],
+            permission_classes=(IsAuthenticated,),
+            pagination_class=FeedPagination,
+            filter_backends=())
+    def feed(self, request):
+        """
+        Лента: новые рецепты авторов, на которых подписан пользователь.
+        Пагинация по курсору (?cursor=), размер страницы - ?limit=.
+        """
+        recipes = self.get_queryset().filter(
+            author_id__in=Subscribe.objects.filter(
+                user=request.user).values('author_id'))
+        page = self.paginate_queryset(recipes)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['GET'],
+            pagination_class=SequencePagination,
+            serializer_class=CookableRecipeSerializer,
+            filter_backends=())
+    def cookable(self, request):
+        """
+        Что приготовить из имеющихся ингредиентов:
+        ?ingredients=1&ingredients=2 - id ингредиентов,
+        ?max_missing=N - не больше N недостающих. Сначала рецепты,
+        где не хватает меньше ингредиентов; подсчет - по индексу в памяти.
+        """
+        params = CookableQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        page = self.paginate_queryset(cookable_index.search(
+            params.validated_data['ingredients'],
+            params.validated_data.get('max_missing')))
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page])
+        items = []
+        for recipe_id, matched, missing in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.matched, recipe.missing = matched, missing
+                items.append(recipe)
+        serializer = self.get_serializer(items, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['GET'],
+            permission_classes=(IsAuthenticated,),
+            pagination_class=SequencePagination,
+            filter_backends=())
+    def recommended(self, request):
+        """
+        Рекомендации: рецепты, которые добавляют в избранное и корзину
+        вместе с рецептами из избранного пользователя.
+        """
+        page = self.paginate_queryset(recommended_ids(request.user))
+        recipes = self.get_queryset().in_bulk(page)
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id in page
+             if recipe_id in recipes], many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['GET'], pagination_class=None,
+            filter_backends=())
+    def similar(self, request, pk=None):
+        """
+        Похожие по ингредиентам и тэгам рецепты: список рассчитан
+        заранее командой update_similar_recipes и читается одним
+        запросом по индексу (recipe, -score).
+        """
+        similar = list(SimilarRecipe.objects.filter(
+            recipe_id=pk).select_related('similar').defer(
+            'similar__text', 'similar__search_vector').order_by(
+            '-score')[:settings.SIMILAR_RECIPES_LIMIT])
+        if not similar:
+            get_object_or_404(RecipeList, id=pk)
+        serializer = FavoriteOrSubscribeSerializer(
+            [item.similar for item in similar], many=True,
+            context=self.get_serializer_context())
+        return Response(serializer.data)
+
     def new_favorite_or_cart(self, model, user, pk):
         recipe = get_object_or_404(RecipeList, id=pk)
-        model.objects.create(user=user, recipe=recipe)
+        if model.objects.bulk_add(user, [recipe.id])[recipe.id] == EXISTS:
+            return Response({'errors': 'Рецепт уже добавлен!'},
+                            status=status.HTTP_400_BAD_REQUEST)
         serializer = FavoriteOrSubscribeSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def remove_favorite_or_cart(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
+        pk = int(pk)
+        if model.objects.bulk_remove(user, [pk])[pk] == REMOVED:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'errors': 'Рецепт уже удален!'},
                         status=status.HTTP_400_BAD_REQUEST)
@@ -174,11 +436,33 @@ class RecipesViewSet(viewsets.ModelViewSet):
             return self.new_favorite_or_cart(ShoppingCart, request.user, pk)
         return self.remove_favorite_or_cart(ShoppingCart, request.user, pk)
 
+    @action(detail=False, methods=['POST', 'DELETE'],
+            permission_classes=[IsAuthenticated],
+            url_path='favorite', url_name='favorite-batch')
+    def favorite_batch(self, request):
+        """
+        Добавить в избранное или удалить из него несколько рецептов:
+        {"ids": [1, 2, 3]}.
+        """
+        return change_links(FavoriteRecipe, request)
+
+    @action(detail=False, methods=['POST', 'DELETE'],
+            permission_classes=[IsAuthenticated],
+            url_path='shopping_cart', url_name='shopping-cart-batch')
+    def shopping_cart_batch(self, request):
+        """
+        Добавить в список покупок или удалить из него несколько
+        рецептов: {"ids": [1, 2, 3]}.
+        """
+        return change_links(ShoppingCart, request)
+
     @action(detail=False, methods=['GET'],
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            content_negotiation_class=ExportContentNegotiation)
     def download_shopping_cart(self, request):
         """
         Скачать корзину (список) покупок.
+        Формат: ?format=txt|csv|json.
         """
         user = request.user
         if not user.shopping_cart.exists():
@@ -13,6 +13,65 @@ load_dotenv()
 env = environ.Env()
 
 DEFAULT_PAGE_SIZE: int = 6
+FEED_HEAD_SIZE: int = 100
+BULK_MAX_IDS: int = 100
+
+INGREDIENT_SEARCH_LIMIT: int = 30
+INGREDIENT_INDEX_TTL: int = 300
+REFERENCE_CACHE_MAX_AGE: int = 60
+RESPONSE_CACHE_TIMEOUT: int = 60 * 60
+
+MAX_IMAGE_SIZE: int = 5 * 1024 * 1024
+THUMBNAIL_WIDTHS: tuple = (320, 640)
+THUMBNAIL_QUALITY: int = 80
+MEDIA_GC_GRACE_PERIOD: int = 24 * 60 * 60
+TRENDING_HALF_LIFE: int = 3 * 24 * 60 * 60
+TRENDING_WINDOW: int = 14 * 24 * 60 * 60
+# Версии данных, которые меняют периодические команды, живут не дольше
+# периода запуска команды: с кэшем в памяти процесса (LocMemCache) версию,
+# записанную командой, веб-процессы не видят.
+VERSION_TIMEOUTS: dict = {
+    'recipes.recipelist:trending': 10 * 60,
+    'recipes.recipelist:search': 5 * 60,
+    'recipes.relatedrecipe': 60 * 60,
+}
+SEARCH_CONFIG: str = 'russian'
+SEARCH_QUERY_MAX_LENGTH: int = 200
+SEARCH_RESULTS_LIMIT: int = 500
+SEARCH_INDEX_TTL: int = 300
+COOKABLE_MAX_INGREDIENTS: int = 50
+COOKABLE_INDEX_TTL: int = 300
+SIMILAR_RECIPES_LIMIT: int = 10
+SIMILAR_MIN_SCORE: float = 0.1
+SIMILAR_TAG_WEIGHT: float = 0.5
+SIMILAR_MAX_DF: float = 0.5
+SIMILAR_CANDIDATE_DF: float = 0.01
+RELATED_RECIPES_LIMIT: int = 20
+RELATED_CART_WEIGHT: float = 0.5
+RELATED_MIN_SUPPORT: float = 2.0
+RELATED_MAX_USER_RECIPES: int = 1000
+RECOMMENDED_SEED_LIMIT: int = 200
+RECOMMENDED_LIMIT: int = 100
+
+# Допустимое число SQL-запросов для действий представлений.
+QUERY_BUDGETS: dict = {
+    'RecipesViewSet.list': 8,
+    'RecipesViewSet.retrieve': 6,
+    'RecipesViewSet.favorite': 8,
+    'RecipesViewSet.favorite_batch': 7,
+    'RecipesViewSet.shopping_cart_batch': 11,
+    'RecipesViewSet.feed': 7,
+    'RecipesViewSet.cookable': 6,
+    'RecipesViewSet.similar': 3,
+    'RecipesViewSet.recommended': 7,
+    'RecipesViewSet.download_shopping_cart': 3,
+    'UserViewSet.list': 4,
+    'UserViewSet.retrieve': 3,
+    'UserViewSet.subscriptions': 5,
+    'UserViewSet.subscribe_batch': 7,
+    'TagsViewSet.list': 2,
+    'IngredientsViewSet.list': 2,
+}
 
 BASE_DIR = os.path.dirname(
     os.path.dirname(os.path.abspath(__file__)))
@@ -24,6 +83,14 @@ SECRET_KEY = os.getenv(
 
 DEBUG = env.bool('DEBUG', default=False)
 
+INGREDIENT_SEARCH_IN_MEMORY = env.bool(
+    'INGREDIENT_SEARCH_IN_MEMORY', default=True)
+
+THUMBNAIL_WORKERS = env.int('THUMBNAIL_WORKERS', default=2)
+
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=True)
+QUERY_BUDGET_STRICT = env.bool('QUERY_BUDGET_STRICT', default=False)
+
 ALLOWED_HOSTS = os.environ.get(
     'ALLOWED_HOSTS', default='127.0.0.1').split()
 
@@ -47,6 +114,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -80,6 +148,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+CACHES = {
+    'default': env.cache(
+        'CACHE_URL', default='locmemcache://?MAX_ENTRIES=10000'),
+}
+
 
 if DEBUG:
     DATABASES = {
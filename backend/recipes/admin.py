@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import Q
 
 from .models import (
     Ingredient,
@@ -8,6 +9,7 @@ from .models import (
     ShoppingCart,
     Tag
 )
+from .search import search_engine
 
 EMPTY_STRING: str = '-пусто-'
 
@@ -20,16 +22,29 @@ class RecipeIngredientsAdmin(admin.StackedInline):
 @admin.register(RecipeList)
 class RecipeListAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientsAdmin,)
-    list_display = ('author', 'name', 'text', 'get_favorite_count')
-    search_fields = (
-        'name', 'cooking_time',
-        'author__username', 'ingredients__name'
-    )
+    list_display = ('author', 'name', 'text', 'get_favorite_count',
+                    'in_carts_count')
+    list_select_related = ('author',)
+    search_fields = ('name', 'cooking_time', 'author__username')
     list_filter = (
         'pub_date', 'tags',
     )
     empty_value_display = EMPTY_STRING
 
+    def get_search_results(self, request, queryset, search_term):
+        """ Поиск по названию, ингредиентам и описанию через поисковый
+        индекс вместо ILIKE по соединению с ингредиентами,
+        а также по логину автора и времени приготовления. """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        found = search_engine().search(RecipeList.objects.all(), search_term)
+        condition = (Q(pk__in=found.values('pk'))
+                     | Q(author__username__icontains=search_term))
+        if search_term.isdigit():
+            condition |= Q(cooking_time=int(search_term))
+        return queryset.filter(condition), False
+
     @admin.display(
         description='Электронная почта автора'
     )
@@ -49,9 +64,9 @@ class RecipeListAdmin(admin.ModelAdmin):
                 'ingredient__name',
                 'amount', 'ingredient__measurement_unit')])
 
-    @admin.display(description='В избранном')
+    @admin.display(description='В избранном', ordering='favorites_count')
     def get_favorite_count(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 @admin.register(Tag)
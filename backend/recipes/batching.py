@@ -0,0 +1,42 @@
+import threading
+from functools import partial
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+class CommitBatch:
+    """
+    Вызов func(ids) после фиксации транзакции - один на транзакцию:
+    id, накопленные за неё (например, по строкам ингредиентов удаляемого
+    рецепта), передаются одним списком без повторов. Вне транзакции
+    func вызывается сразу. Накопленные id хранятся отдельно для каждого
+    потока, как и соединение с базой данных.
+    """
+
+    def __init__(self, func, using=DEFAULT_DB_ALIAS):
+        self.func = func
+        self.using = using
+        self._local = threading.local()
+
+    def add(self, ids):
+        pending = getattr(self._local, 'pending', None)
+        if pending is not None and self._scheduled():
+            pending.update(ids)
+            return
+        pending = self._local.pending = set(ids)
+        self._local.callback = partial(self._run, pending)
+        transaction.on_commit(self._local.callback, using=self.using)
+
+    def _scheduled(self):
+        """ Вызов этой транзакции еще ждет фиксации: после отката
+        Django удаляет его из очереди соединения. """
+        connection = connections[self.using]
+        return connection.in_atomic_block and any(
+            entry[1] is self._local.callback
+            for entry in connection.run_on_commit)
+
+    def _run(self, pending):
+        if self._local.pending is pending:
+            self._local.pending = None
+        if pending:
+            self.func(sorted(pending))
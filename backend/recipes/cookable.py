@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from .models import IngredientInRecipe
+
+logger = logging.getLogger(__name__)
+
+EMPTY = np.zeros(0, dtype=np.int32)
+# Ключ сортировки: недостающие (старшие биты), совпавшие, id рецепта.
+MATCHED_SHIFT: int = 40
+MISSING_SHIFT: int = 51
+MAX_MATCHED: int = (1 << (MISSING_SHIFT - MATCHED_SHIFT)) - 1
+MAX_ID: int = (1 << MATCHED_SHIFT) - 1
+
+
+class CookableResult:
+    """
+    Рецепты, отсортированные по числу недостающих ингредиентов, затем
+    по числу совпавших и от новых к старым: последовательность
+    (id, совпало, не хватает) для пагинатора. Порядок задан одним
+    целым ключом; для страницы упорядочиваются только первые
+    offset + limit рецептов (argpartition), а не все найденные.
+    """
+
+    def __init__(self, ids, matched, missing):
+        self.ids = ids
+        self.matched = matched
+        self.missing = missing
+        self.keys = (
+            (missing.astype(np.int64) << MISSING_SHIFT)
+            | ((MAX_MATCHED - matched.astype(np.int64)) << MATCHED_SHIFT)
+            | (MAX_ID - ids.astype(np.int64)))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _order(self, stop):
+        if stop < len(self.keys):
+            head = np.argpartition(self.keys, stop - 1)[:stop]
+        else:
+            head = np.arange(len(self.keys))
+        return head[np.argsort(self.keys[head])]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            index = slice(index, index + 1)
+        start, stop, _ = index.indices(len(self))
+        if start >= stop:
+            return []
+        order = self._order(stop)[start:]
+        return list(zip(self.ids[order].tolist(),
+                        self.matched[order].tolist(),
+                        self.missing[order].tolist()))
+
+
+class CookableIndex:
+    """
+    Индекс «что приготовить» в памяти процесса: ингредиент ->
+    отсортированный массив позиций рецептов. Число совпавших
+    ингредиентов всех рецептов считается одним bincount по массивам
+    запрошенных ингредиентов, без GROUP BY по IngredientInRecipe.
+    Индекс строится при первом обращении, изменения состава рецептов
+    вносятся сигналами, а полностью он перестраивается в фоне не реже
+    чем раз в COOKABLE_INDEX_TTL секунд, чтобы изменения, сделанные
+    в других процессах, не терялись.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        self._ids = None
+        self._sizes = None
+        self._positions = None
+        self._ingredients = None
+        self._built_at = 0
+        self._refreshing = False
+
+    @staticmethod
+    def _read(recipe_ids=None):
+        """ Пары (рецепт, ингредиент) массивом n x 2. """
+        links = IngredientInRecipe.objects.filter(
+            ingredient__isnull=False).order_by()
+        if recipe_ids is not None:
+            links = links.filter(recipe_id__in=recipe_ids)
+        rows = np.array(
+            list(links.values_list('recipe_id', 'ingredient_id').iterator()),
+            dtype=np.int64)
+        return rows.reshape(-1, 2)
+
+    def _collect(self):
+        """ Новый индекс: позиции рецептов, размеры и списки. """
+        rows = self._read()
+        ids, positions = np.unique(rows[:, 0], return_inverse=True)
+        positions = positions.astype(np.int32)
+        order = np.lexsort((positions, rows[:, 1]))
+        ingredients, starts = np.unique(
+            rows[order, 1], return_index=True)
+        postings = dict(zip(
+            ingredients.tolist(), np.split(positions[order], starts[1:])))
+        order = np.argsort(positions, kind='stable')
+        members = np.split(
+            rows[order, 1], np.flatnonzero(np.diff(positions[order])) + 1)
+        return {
+            'postings': postings,
+            'ids': ids,
+            'sizes': np.bincount(positions, minlength=len(ids)).astype(
+                np.int32),
+            'positions': dict(zip(ids.tolist(), range(len(ids)))),
+            'ingredients': dict(zip(
+                ids.tolist(),
+                (tuple(member.tolist()) for member in members)
+                if len(rows) else ())),
+        }
+
+    def _install(self, collected):
+        self._postings = collected['postings']
+        self._ids = collected['ids']
+        self._sizes = collected['sizes']
+        self._positions = collected['positions']
+        self._ingredients = collected['ingredients']
+        self._built_at = time.monotonic()
+
+    def _refresh(self):
+        """ Перестроение в фоновом потоке: до его окончания запросы
+        идут по прежнему индексу. """
+        try:
+            collected = self._collect()
+            with self._lock:
+                self._install(collected)
+        except Exception:
+            logger.exception('Не удалось перестроить индекс ингредиентов')
+        finally:
+            self._refreshing = False
+            connection.close()
+
+    def _ensure_built(self):
+        if self._postings is None:
+            self._install(self._collect())
+        elif (not self._refreshing and time.monotonic() - self._built_at
+              > settings.COOKABLE_INDEX_TTL):
+            self._refreshing = True
+            threading.Thread(target=self._refresh, daemon=True,
+                             name='cookable-index').start()
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+
+    def rebuild(self):
+        with self._lock:
+            self._install(self._collect())
+            return len(self._positions)
+
+    def _remove(self, recipe_id):
+        position = self._positions.get(recipe_id)
+        if position is None:
+            return
+        for ingredient_id in self._ingredients.pop(recipe_id, ()):
+            postings = self._postings[ingredient_id]
+            postings = np.delete(
+                postings, np.searchsorted(postings, position))
+            if len(postings):
+                self._postings[ingredient_id] = postings
+            else:
+                del self._postings[ingredient_id]
+        self._sizes[position] = 0
+
+    def _add(self, recipe_id, ingredient_ids):
+        position = self._positions.get(recipe_id)
+        if position is None:
+            position = self._positions[recipe_id] = len(self._ids)
+            self._ids = np.append(self._ids, recipe_id)
+            self._sizes = np.append(self._sizes, 0).astype(np.int32)
+        for ingredient_id in ingredient_ids:
+            postings = self._postings.get(ingredient_id, EMPTY)
+            self._postings[ingredient_id] = np.insert(
+                postings, np.searchsorted(postings, position), position)
+        self._ingredients[recipe_id] = tuple(ingredient_ids)
+        self._sizes[position] = len(ingredient_ids)
+
+    def update(self, recipe_ids):
+        """ Новый состав рецептов; удаленные рецепты выпадают из индекса. """
+        recipe_ids = list(recipe_ids)
+        if self._postings is None:
+            return
+        rows = self._read(recipe_ids)
+        members = {recipe_id: [] for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in rows.tolist():
+            members[recipe_id].append(ingredient_id)
+        with self._lock:
+            if self._postings is None:
+                return
+            for recipe_id, ingredient_ids in members.items():
+                self._remove(recipe_id)
+                if ingredient_ids:
+                    self._add(recipe_id, sorted(set(ingredient_ids)))
+
+    def search(self, ingredient_ids, max_missing=None):
+        """ Рецепты хотя бы с одним из ingredient_ids и не более
+        max_missing недостающими ингредиентами. """
+        with self._lock:
+            self._ensure_built()
+            arrays = [self._postings[ingredient_id]
+                      for ingredient_id in set(ingredient_ids)
+                      if ingredient_id in self._postings]
+            if not arrays:
+                return CookableResult(EMPTY, EMPTY, EMPTY)
+            ids, sizes = self._ids, self._sizes
+            counts = np.bincount(np.concatenate(arrays), minlength=len(ids))
+        candidates = np.flatnonzero(counts)
+        matched = counts[candidates]
+        missing = sizes[candidates] - matched
+        if max_missing is not None:
+            keep = missing <= max_missing
+            candidates, matched, missing = (
+                candidates[keep], matched[keep], missing[keep])
+        return CookableResult(ids[candidates], matched, missing)
+
+
+cookable_index = CookableIndex()
@@ -0,0 +1,71 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR: str = 'thumbnails'
+THUMBNAIL_FORMATS: dict = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+executor = ThreadPoolExecutor(
+    max_workers=max(settings.THUMBNAIL_WORKERS, 1),
+    thread_name_prefix='thumbnails')
+
+
+def thumbnail_name(name, width, extension):
+    """ Путь миниатюры изображения заданной ширины. """
+    stem = os.path.splitext(name)[0]
+    return f'{THUMBNAIL_DIR}/{stem}_{width}.{extension}'
+
+
+def thumbnail_names(name):
+    """ Пути всех миниатюр изображения: {ширина: {формат: путь}}. """
+    return {
+        width: {
+            extension: thumbnail_name(name, width, extension)
+            for extension in THUMBNAIL_FORMATS
+        }
+        for width in settings.THUMBNAIL_WIDTHS
+    }
+
+
+def make_thumbnails(name, storage=default_storage):
+    """ Создание отсутствующих миниатюр изображения. """
+    try:
+        with storage.open(name, 'rb') as file:
+            image = Image.open(file)
+            image.load()
+        for width, names in thumbnail_names(name).items():
+            resized = image.copy()
+            resized.thumbnail((width, image.height))
+            for extension, path in names.items():
+                if storage.exists(path):
+                    continue
+                buffer = BytesIO()
+                if extension == 'jpeg' and resized.mode != 'RGB':
+                    converted = resized.convert('RGB')
+                else:
+                    converted = resized
+                converted.save(
+                    buffer, THUMBNAIL_FORMATS[extension],
+                    quality=settings.THUMBNAIL_QUALITY)
+                storage.save(path, ContentFile(buffer.getvalue()))
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+
+
+def schedule_thumbnails(name):
+    """
+    Миниатюры создаются в фоновом пуле потоков, чтобы не задерживать
+    ответ; при THUMBNAIL_WORKERS = 0 - сразу, в текущем потоке.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        make_thumbnails(name)
+        return
+    executor.submit(make_thumbnails, name)
@@ -0,0 +1,369 @@
+import datetime
+import json
+import math
+import platform
+import re
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+import api.urls
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    IngredientInRecipe,
+    RecipeList,
+    ShoppingCart,
+    Tag
+)
+from users.models import Subscribe
+
+User = get_user_model()
+
+ITERATIONS: int = 20
+WARMUP: int = 2
+CART_USER = re.compile(r'_cart(\d+)$')
+FOLLOW_USER = re.compile(r'_follow(\d+)$')
+# Модели для подстановки pk/id в маршруты по первому сегменту пути.
+DETAIL_MODELS: dict = {
+    'users': User,
+    'recipes': RecipeList,
+    'tags': Tag,
+    'ingredients': Ingredient,
+}
+# Дополнительные параметры запросов для списков.
+VARIANTS: dict = {
+    'recipes-list': (
+        '', '?limit=50', '?tags={tag}', '?author={author}',
+        '?is_favorited=1', '?is_in_shopping_cart=1',
+        '?count=none', '?count=estimate', '?cursor=',
+    ),
+    'ingredients-list': ('', '?name={ingredient}'),
+    'users-subscriptions': ('', '?recipes_limit=3'),
+    'recipes-download-shopping-cart': ('', '?format=csv', '?format=json'),
+    'recipes-feed': ('', '?limit=50'),
+    'recipes-cookable': (
+        '?ingredients={ingredient_id}',
+        '?ingredients={ingredient_id}&max_missing=2',
+    ),
+}
+
+
+def percentile(values, percent):
+    """ Процентиль по ближайшему рангу. """
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def iter_routes(patterns, namespace='api'):
+    """ Именованные маршруты API без вариантов с суффиксом формата. """
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_routes(pattern.url_patterns, namespace)
+        elif pattern.name and 'format' not in pattern.pattern.regex.groupindex:
+            yield f'{namespace}:{pattern.name}', pattern
+
+
+def route_methods(pattern):
+    """ HTTP-методы маршрута: действия ViewSet или методы APIView. """
+    actions = getattr(pattern.callback, 'actions', None)
+    if actions:
+        return set(actions)
+    view = getattr(pattern.callback, 'cls', None)
+    return {method for method in ('get', 'post', 'put', 'patch', 'delete')
+            if view is not None and hasattr(view, method)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Benchmark:
+    """
+    Замер маршрутов API тестовым клиентом Django, без сети: пропускная
+    способность, процентили времени ответа и количество SQL-запросов.
+    """
+
+    def __init__(self, user, iterations=ITERATIONS, warmup=WARMUP,
+                 cold=False, writes=True, only=None):
+        self.user = user
+        self.iterations = iterations
+        self.warmup = warmup
+        self.cold = cold
+        self.writes = writes and user is not None
+        self.only = re.compile(only) if only else None
+        self.results = []
+        self.skipped = []
+        self.client = self.make_client(user)
+
+    @staticmethod
+    def make_client(user):
+        client = APIClient(raise_request_exception=False)
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def placeholders(self):
+        tag = Tag.objects.order_by('id').first()
+        author = User.objects.annotate(
+            count=Count('recipes')).order_by('-count', 'id').first()
+        ingredient = Ingredient.objects.annotate(
+            count=Count('ingredient')).order_by('-count', 'id').first()
+        return {
+            'tag': tag.slug if tag else '',
+            'author': author.id if author else 0,
+            'ingredient': ingredient.name[:3] if ingredient else '',
+            'ingredient_id': ingredient.id if ingredient else 0,
+        }
+
+    def request(self, client, method, path):
+        """ Один запрос: время с чтением потокового ответа и SQL. """
+        if self.cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, method)(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        return response.status_code, elapsed, len(queries)
+
+    def measure(self, name, steps, client=None):
+        """
+        Замер сценария: steps - последовательность (метод, путь),
+        повторяемая iterations раз после warmup прогревочных.
+        """
+        if self.only and not self.only.search(name):
+            return
+        client = client or self.client
+        for _ in range(self.warmup):
+            for method, path in steps:
+                self.request(client, method, path)
+        for method, path in steps:
+            timings, query_counts, statuses = [], [], set()
+            self.results.append({
+                'name': name if len(steps) == 1 else f'{name} {method}',
+                'method': method.upper(),
+                'path': path,
+                'timings': timings,
+                'queries': query_counts,
+                'statuses': statuses,
+            })
+        started = time.perf_counter()
+        for _ in range(self.iterations):
+            for index, (method, path) in enumerate(steps):
+                result = self.results[index - len(steps)]
+                status, elapsed, queries = self.request(client, method, path)
+                result['timings'].append(elapsed)
+                result['queries'].append(queries)
+                result['statuses'].add(status)
+        total = time.perf_counter() - started
+        for result in self.results[-len(steps):]:
+            self.summarize(result, total / len(steps))
+
+    def summarize(self, result, total):
+        timings = result.pop('timings')
+        queries = result.pop('queries')
+        result.update({
+            'status': sorted(result.pop('statuses')),
+            'iterations': len(timings),
+            'throughput_rps': round(len(timings) / total, 2) if total else 0,
+            'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p90_ms': round(percentile(timings, 90) * 1000, 3),
+            'p99_ms': round(percentile(timings, 99) * 1000, 3),
+            'max_ms': round(max(timings) * 1000, 3),
+            'queries': max(queries),
+        })
+
+    def toggle_target(self, name, kwarg, model):
+        """
+        Объект, который можно добавить и сразу удалить: POST вернул 201.
+        Состояние базы после замера не меняется.
+        """
+        candidates = model.objects.order_by('-pk')
+        if model is User and self.user is not None:
+            candidates = candidates.exclude(pk=self.user.pk)
+        for pk in candidates.values_list('pk', flat=True)[:10]:
+            path = reverse(name, kwargs={kwarg: pk})
+            if self.client.post(path).status_code == 201:
+                self.client.delete(path)
+                return path
+        return None
+
+    def run(self):
+        values = self.placeholders()
+        seen = set()
+        for name, pattern in iter_routes(api.urls.urlpatterns):
+            short_name = name.split(':')[-1]
+            model = DETAIL_MODELS.get(
+                str(pattern.pattern).lstrip('^').split('/')[0])
+            kwargs = {}
+            for kwarg in pattern.pattern.regex.groupindex:
+                obj = model.objects.order_by('pk').first() if model else None
+                if obj is None:
+                    break
+                kwargs[kwarg] = obj.pk
+            else:
+                path = reverse(name, kwargs=kwargs)
+                if path not in seen:
+                    seen.add(path)
+                    self.run_route(name, short_name, path, kwargs, model,
+                                   route_methods(pattern), values)
+                continue
+            self.skipped.append({'name': short_name, 'reason': 'нет объектов'})
+        self.sized_users(CART_USER, 'recipes-download-shopping-cart', 'cart')
+        self.sized_users(FOLLOW_USER, 'recipes-feed', 'follow')
+        return self.results
+
+    def run_route(self, name, short_name, path, kwargs, model, methods,
+                  values):
+        """ Чтение - с вариантами параметров, добавление - с удалением. """
+        if 'get' in methods:
+            for query in VARIANTS.get(short_name, ('',)):
+                query = query.format(**values)
+                self.measure(short_name + query, [('get', path + query)])
+            methods = methods - {'get'}
+        if {'post', 'delete'} <= methods and kwargs and self.writes:
+            target = self.toggle_target(name, next(iter(kwargs)), model)
+            if target:
+                self.measure(short_name,
+                             [('post', target), ('delete', target)])
+                methods = methods - {'post', 'delete'}
+        if methods:
+            self.skipped.append(
+                {'name': short_name, 'methods': sorted(methods)})
+
+    def sized_users(self, pattern, name, label):
+        """
+        Маршрут от имени пользователей fakeN_<label>M: выгрузка корзины
+        из M рецептов, лента при подписке на M авторов.
+        """
+        users = {}
+        for user in User.objects.filter(username__contains=f'_{label}'):
+            match = pattern.search(user.username)
+            if match:
+                users[int(match.group(1))] = user
+        path = reverse(f'api:{name}')
+        for size, user in sorted(users.items()):
+            self.measure(f'{name}[{label}={size}]',
+                         [('get', path)], self.make_client(user))
+
+
+def data_counts():
+    return {
+        model._meta.label: model.objects.count()
+        for model in (User, Tag, Ingredient, RecipeList, IngredientInRecipe,
+                      FavoriteRecipe, ShoppingCart, Subscribe)
+    }
+
+
+class Command(BaseCommand):
+    """ Нагрузочный замер API. """
+    help = ('Замер времени ответа и количества SQL-запросов для всех '
+            'маршрутов API с выводом в JSON. '
+            'Запуск: python manage.py benchmark [--iterations N] '
+            '[--output результат.json] [--only регулярное_выражение].')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=ITERATIONS,
+            help='Количество замеряемых запросов на сценарий.')
+        parser.add_argument(
+            '--warmup', type=int, default=WARMUP,
+            help='Количество прогревочных запросов.')
+        parser.add_argument(
+            '--user',
+            help='Email пользователя; по умолчанию - с наибольшим '
+                 'числом подписок.')
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='Запросы без авторизации.')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.')
+        parser.add_argument(
+            '--read-only', action='store_true',
+            help='Не замерять добавление и удаление (избранное, корзина, '
+                 'подписки).')
+        parser.add_argument(
+            '--only',
+            help='Только сценарии, имя которых подходит под выражение.')
+        parser.add_argument(
+            '--label', default='',
+            help='Метка запуска для сравнения результатов.')
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл результатов; по умолчанию stdout.')
+
+    def get_user(self, options):
+        if options['anonymous']:
+            return None
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+        else:
+            user = User.objects.annotate(
+                count=Count('subscriber')).order_by('-count', 'id').first()
+        if user is None:
+            raise CommandError(
+                'Пользователь не найден, выполните generate_fake_data.')
+        return user
+
+    def handle(self, *args, **options) -> None:
+        user = self.get_user(options)
+        benchmark = Benchmark(
+            user, options['iterations'], options['warmup'],
+            options['cold'], not options['read_only'], options['only'])
+        start_time = datetime.datetime.now()
+        with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                QUERY_BUDGET_STRICT=False):
+            results = benchmark.run()
+        report = {
+            'label': options['label'],
+            'commit': git_commit(),
+            'created': start_time.isoformat(timespec='seconds'),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'cache': settings.CACHES['default']['BACKEND'],
+            },
+            'options': {
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'user': user.email if user else None,
+                'cold': options['cold'],
+            },
+            'data': data_counts(),
+            'results': results,
+            'skipped': benchmark.skipped,
+        }
+        content = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(content)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(content + '\n')
+        self.stderr.write(self.style.SUCCESS(
+            f'Сценариев: {len(results)} за '
+            f'{(datetime.datetime.now() - start_time).total_seconds()} '
+            f'сек.'))
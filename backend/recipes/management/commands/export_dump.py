@@ -0,0 +1,112 @@
+import datetime
+import json
+import sys
+from itertools import islice
+
+from django.apps import apps
+from django.core import serializers
+from django.core.management import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .load_dump import (
+    BATCH_SIZE,
+    EXCLUDE,
+    NDJSON_EXTENSIONS,
+    dependency_order,
+    is_excluded
+)
+
+FORMATS: tuple = ('json', 'ndjson')
+
+
+class DumpEncoder(DjangoJSONEncoder):
+    """ Время с микросекундами: DjangoJSONEncoder округляет его до
+    миллисекунд, и после загрузки дампа значения бы изменились. """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def exported_models(exclude):
+    """ Модели для выгрузки; автоматические таблицы M2M выгружаются
+    вместе с моделями, которым принадлежат. """
+    return dependency_order(
+        model for model in apps.get_models()
+        if model._meta.managed
+        and not model._meta.proxy
+        and not model._meta.auto_created
+        and not is_excluded(model, exclude)
+    )
+
+
+def iter_dump(models, batch_size):
+    """ Сериализация объектов пакетами, без загрузки таблиц в память. """
+    serializer = serializers.get_serializer('python')()
+    for model in models:
+        objects = model._base_manager.order_by(
+            model._meta.pk.name).iterator(chunk_size=batch_size)
+        while True:
+            batch = list(islice(objects, batch_size))
+            if not batch:
+                break
+            yield from serializer.serialize(batch)
+
+
+def write_dump(stream, objects, format):
+    """ Запись массива JSON или NDJSON (один объект в строке). """
+    count = 0
+    if format == 'json':
+        stream.write('[')
+    for obj in objects:
+        data = json.dumps(obj, cls=DumpEncoder, ensure_ascii=False)
+        if format == 'json':
+            stream.write(',\n' if count else '\n')
+            stream.write(data)
+        else:
+            stream.write(data + '\n')
+        count += 1
+    if format == 'json':
+        stream.write('\n]\n')
+    return count
+
+
+class Command(BaseCommand):
+    """ Выгрузка дампа базы данных для load_dump. """
+    help = ('Выгрузка дампа в json или компактный ndjson '
+            'в порядке зависимостей моделей. '
+            'Запуск: python manage.py export_dump dump.ndjson '
+            '[--format ndjson] [-e app_label[.model]].')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file', nargs='?', default='-',
+            help='Файл дампа; по умолчанию stdout.')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат; по умолчанию определяется по расширению файла.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество объектов, читаемых за один запрос.')
+        parser.add_argument(
+            '-e', '--exclude', action='append', default=[],
+            help='Пропустить приложение или модель (app_label.model).')
+
+    def handle(self, *args, **options) -> None:
+        start_time = datetime.datetime.now()
+        path = options['file']
+        format = options['format'] or (
+            'ndjson' if path.endswith(NDJSON_EXTENSIONS) else 'json')
+        exclude = {label.lower() for label in (
+            *EXCLUDE, *options['exclude'])}
+        objects = iter_dump(exported_models(exclude), options['batch_size'])
+        if path == '-':
+            count = write_dump(sys.stdout, objects, format)
+        else:
+            with open(path, 'w', encoding='utf-8') as stream:
+                count = write_dump(stream, objects, format)
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено объектов: {count} за '
+            f'{(datetime.datetime.now() - start_time).total_seconds()} '
+            f'сек.'))
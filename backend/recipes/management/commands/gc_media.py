@@ -0,0 +1,165 @@
+import datetime
+import posixpath
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+
+from recipes.images import thumbnail_names
+from recipes.models import MediaFile, RecipeList
+
+BATCH_SIZE: int = 500
+
+IMAGE_FIELD = RecipeList._meta.get_field('image')
+
+
+def recount() -> int:
+    """ Пересчет ссылок на файлы по таблице рецептов. """
+    references = dict(
+        RecipeList.objects.exclude(image__isnull=True).exclude(image='')
+        .values('image').annotate(total=Count('id'))
+        .values_list('image', 'total').order_by().iterator())
+    with transaction.atomic():
+        MediaFile.objects.filter(references__gt=0).exclude(
+            Exists(RecipeList.objects.filter(image=OuterRef('name')))
+        ).update(references=0, updated=timezone.now())
+        MediaFile.objects.bulk_create(
+            [MediaFile(name=name) for name in references],
+            batch_size=BATCH_SIZE, ignore_conflicts=True)
+        changed = [
+            media_file
+            for media_file in MediaFile.objects.filter(
+                name__in=references).iterator()
+            if media_file.references != references[media_file.name]
+        ]
+        for media_file in changed:
+            media_file.references = references[media_file.name]
+        MediaFile.objects.bulk_update(
+            changed, ['references'], batch_size=BATCH_SIZE)
+    return len(changed)
+
+
+def walk(storage, directory):
+    """ Пути всех файлов каталога хранилища. """
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in directories:
+        yield from walk(storage, posixpath.join(directory, name))
+
+
+def scan(storage=IMAGE_FIELD.storage, directory=IMAGE_FIELD.upload_to,
+         batch_size=BATCH_SIZE) -> int:
+    """
+    Регистрация файлов, которых нет в таблице: остатки откаченных
+    транзакций и файлы, загруженные до подсчета ссылок.
+    Время изменения берется из файла, чтобы не сдвигать срок удаления.
+    """
+    directory = directory.rstrip('/')
+    if not storage.exists(directory):
+        return 0
+    found = 0
+    names = walk(storage, directory)
+    while True:
+        batch = {name for _, name in zip(range(batch_size), names)}
+        if not batch:
+            return found
+        batch -= set(MediaFile.objects.filter(
+            name__in=batch).values_list('name', flat=True))
+        MediaFile.objects.bulk_create(
+            [MediaFile(name=name, updated=storage.get_modified_time(name))
+             for name in batch],
+            ignore_conflicts=True)
+        found += len(batch)
+
+
+def delete_files(storage, names):
+    """
+    Удаление файлов вместе с миниатюрами. Файлы, которые снова стали
+    использоваться после удаления записи, остаются на месте.
+    """
+    names = set(names) - set(MediaFile.objects.filter(
+        name__in=names).values_list('name', flat=True))
+    for name in names:
+        storage.delete(name)
+        for paths in thumbnail_names(name).values():
+            for path in paths.values():
+                storage.delete(path)
+
+
+def collect(before, batch_size=BATCH_SIZE, limit=None, dry_run=False,
+            storage=IMAGE_FIELD.storage):
+    """
+    Удаление файлов без ссылок пакетами по batch_size, не более limit.
+    Запись удаляется в транзакции, файл - после ее фиксации: если
+    файл не удалось удалить, его найдет следующий scan.
+    """
+    last_pk = 0
+    names = []
+    while limit is None or len(names) < limit:
+        size = batch_size if limit is None else min(
+            batch_size, limit - len(names))
+        with transaction.atomic():
+            batch = list(MediaFile.objects.orphans(before).filter(
+                pk__gt=last_pk).select_for_update(skip_locked=True)
+                .order_by('pk').values_list('pk', 'name')[:size])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            batch_names = [name for _, name in batch]
+            names.extend(batch_names)
+            if dry_run:
+                continue
+            MediaFile.objects.filter(
+                pk__in=[pk for pk, _ in batch], references=0).delete()
+        delete_files(storage, batch_names)
+    return names
+
+
+class Command(BaseCommand):
+    """ Удаление неиспользуемых файлов изображений. """
+    help = ('Удаление файлов изображений, на которые не ссылаются рецепты. '
+            'Запуск: python manage.py gc_media [--scan] [--recount] '
+            '[--batch-size N] [--limit N] [--grace-period сек] [--dry-run].')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scan', action='store_true',
+            help='Найти в хранилище файлы, которых нет в таблице.')
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Пересчитать ссылки по таблице рецептов.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество файлов, удаляемых в одной транзакции.')
+        parser.add_argument(
+            '--limit', type=int,
+            help='Не удалять больше указанного количества файлов.')
+        parser.add_argument(
+            '--grace-period', type=int,
+            default=settings.MEDIA_GC_GRACE_PERIOD,
+            help='Удалять только файлы без ссылок старше N секунд.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать файлы, которые будут удалены.')
+
+    def handle(self, *args, **options) -> None:
+        start_time = datetime.datetime.now()
+        if options['recount']:
+            self.stdout.write(f'Исправлено счетчиков: {recount()}.')
+        if options['scan']:
+            self.stdout.write(f'Найдено новых файлов: {scan()}.')
+        names = collect(
+            timezone.now() - datetime.timedelta(
+                seconds=options['grace_period']),
+            options['batch_size'], options['limit'], options['dry_run'])
+        if options['dry_run'] or options['verbosity'] > 1:
+            for name in names:
+                self.stdout.write(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Будет удалено" if options["dry_run"] else "Удалено"} '
+            f'файлов: {len(names)} за '
+            f'{(datetime.datetime.now() - start_time).total_seconds()} '
+            f'сек.'))
@@ -0,0 +1,293 @@
+import datetime
+import random
+from bisect import bisect
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .load_data import import_data
+from .load_tags import TAGS
+from .rebuild_counters import reconcile
+from .rebuild_shopping_list import rebuild
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    IngredientInRecipe,
+    RecipeList,
+    ShoppingCart,
+    Tag,
+    TagInRecipe
+)
+from recipes.search import search_engine
+from users.models import Subscribe
+
+User = get_user_model()
+
+FILE: str = f'{settings.BASE_DIR}/data/ingredients.csv'
+BATCH_SIZE: int = 1000
+PASSWORD: str = 'fake-password'
+CART_SIZES: tuple = (10, 100, 1000)
+FOLLOW_SIZES: tuple = (10, 100, 1000)
+WORDS: tuple = (
+    'нарезать', 'смешать', 'добавить', 'обжарить', 'посолить', 'поперчить',
+    'запечь', 'отварить', 'остудить', 'подавать', 'сковорода', 'кастрюля',
+    'духовка', 'минут', 'огонь', 'соус', 'тесто', 'зелень', 'горячим',
+)
+
+
+class Sampler:
+    """
+    Выбор элементов с весами по закону Ципфа: немногие популярные
+    элементы (ингредиенты, авторы, рецепты) встречаются часто,
+    остальные - редко.
+    """
+
+    def __init__(self, items, rng, exponent=1.0):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(accumulate(
+            1 / (rank + 1) ** exponent for rank in range(len(self.items))))
+        self.rng = rng
+
+    def choice(self):
+        return self.items[bisect(
+            self.cum_weights, self.rng.random() * self.cum_weights[-1])]
+
+    def sample(self, count, exclude=None):
+        """ До count различных элементов. """
+        count = min(count, len(self.items) - (exclude is not None))
+        chosen = set()
+        for _ in range(count * 10):
+            if len(chosen) >= count:
+                break
+            item = self.choice()
+            if item != exclude:
+                chosen.add(item)
+        if len(chosen) < count:
+            rest = [item for item in self.items
+                    if item not in chosen and item != exclude]
+            chosen.update(self.rng.sample(rest, count - len(chosen)))
+        return chosen
+
+
+def batched(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def max_pk(model):
+    return model.objects.aggregate(value=Max('pk'))['value'] or 0
+
+
+def new_pks(model, after):
+    """ Ключи созданных объектов: bulk_create на SQLite их не возвращает. """
+    return list(model.objects.filter(pk__gt=after).order_by(
+        'pk').values_list('pk', flat=True))
+
+
+def ensure_reference_data(path, batch_size):
+    """ Ингредиенты и теги, если база пуста. """
+    if not Ingredient.objects.exists():
+        import_data(path, batch_size)
+    if not Tag.objects.exists():
+        Tag.objects.bulk_create(
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in TAGS)
+
+
+def create_users(count, rng, offset, batch_size, cart_sizes=(),
+                 follow_sizes=()):
+    """ Пользователи с одним хэшем пароля на всех. """
+    password = make_password(PASSWORD)
+    names = [f'fake{offset + number}' for number in range(count)]
+    names += [f'fake{offset}_cart{size}' for size in cart_sizes]
+    names += [f'fake{offset}_follow{size}' for size in follow_sizes]
+    after = max_pk(User)
+    User.objects.bulk_create(
+        [User(username=name,
+              email=f'{name}@example.com',
+              first_name=rng.choice(('Анна', 'Иван', 'Олег', 'Мария')),
+              last_name=rng.choice(('Иванова', 'Петров', 'Смирнова')),
+              password=password)
+         for name in names],
+        batch_size=batch_size)
+    return new_pks(User, after)
+
+
+def iter_recipes(count, authors, rng, ingredient_names):
+    now = timezone.now()
+    for _ in range(count):
+        first, second = rng.sample(ingredient_names, 2)
+        yield RecipeList(
+            author_id=authors.choice(),
+            name=f'{first.capitalize()} с {second}'[:255],
+            text=' '.join(rng.choices(WORDS, k=rng.randint(20, 80))),
+            cooking_time=max(1, int(rng.lognormvariate(3.3, 0.6))),
+            pub_date=now - datetime.timedelta(
+                seconds=rng.randint(0, 365 * 24 * 60 * 60)),
+        )
+
+
+def insert_recipes(recipes):
+    """
+    Вставка рецептов с заданной датой публикации: raw=True, как в
+    loaddata, чтобы auto_now_add не заменил ее текущим временем.
+    """
+    fields = [field for field in RecipeList._meta.local_concrete_fields
+              if not field.primary_key]
+    after = max_pk(RecipeList)
+    step = max(connection.ops.bulk_batch_size(fields, recipes), 1)
+    for start in range(0, len(recipes), step):
+        RecipeList._base_manager._insert(
+            recipes[start:start + step], fields=fields, raw=True)
+    return new_pks(RecipeList, after)
+
+
+def generate(users, recipes, favorites, cart, subscriptions, cart_sizes,
+             seed, batch_size, path=FILE, follow_sizes=()) -> dict:
+    """ Наполнение базы синтетическими данными в одной транзакции. """
+    if users < 1:
+        raise CommandError('Нужен хотя бы один пользователь.')
+    rng = random.Random(seed)
+    counts = dict.fromkeys((
+        'users', 'recipes', 'ingredients_in_recipes', 'tags_in_recipes',
+        'favorites', 'shopping_cart', 'subscriptions'), 0)
+    with transaction.atomic():
+        ensure_reference_data(path, batch_size)
+        ingredients = Sampler(Ingredient.objects.values_list(
+            'pk', flat=True).order_by('pk'), rng)
+        ingredient_names = list(Ingredient.objects.values_list(
+            'name', flat=True).order_by('pk'))
+        tags = Sampler(Tag.objects.values_list(
+            'pk', flat=True).order_by('pk'), rng)
+        user_ids = create_users(users, rng, max_pk(User) + 1, batch_size,
+                                cart_sizes, follow_sizes)
+        counts['users'] = len(user_ids)
+        cart_users = dict(zip(user_ids[users:], cart_sizes))
+        follow_users = dict(zip(user_ids[users + len(cart_sizes):],
+                                follow_sizes))
+        user_ids = user_ids[:users]
+        authors = Sampler(user_ids, rng, exponent=1.2)
+        recipe_ids = []
+        for batch in batched(
+                iter_recipes(recipes, authors, rng, ingredient_names),
+                batch_size):
+            batch_ids = insert_recipes(batch)
+            recipe_ids.extend(batch_ids)
+            links = [
+                IngredientInRecipe(recipe_id=recipe_id,
+                                   ingredient_id=ingredient_id,
+                                   amount=rng.randint(1, 500))
+                for recipe_id in batch_ids
+                for ingredient_id in ingredients.sample(rng.randint(3, 12))
+            ]
+            IngredientInRecipe.objects.bulk_create(links, batch_size)
+            counts['ingredients_in_recipes'] += len(links)
+            links = [
+                TagInRecipe(recipelist_id=recipe_id, tag_id=tag_id)
+                for recipe_id in batch_ids
+                for tag_id in tags.sample(rng.randint(1, 3))
+            ]
+            TagInRecipe.objects.bulk_create(links, batch_size)
+            counts['tags_in_recipes'] += len(links)
+        counts['recipes'] = len(recipe_ids)
+        if recipe_ids:
+            popular = Sampler(recipe_ids, rng)
+            for model, key, mean in (
+                (FavoriteRecipe, 'favorites', favorites),
+                (ShoppingCart, 'shopping_cart', cart),
+            ):
+                sizes = {user_id: rng.randint(0, 2 * mean)
+                         for user_id in user_ids}
+                if model is ShoppingCart:
+                    sizes.update(cart_users)
+                for batch in batched(
+                        (model(user_id=user_id, recipe_id=recipe_id)
+                         for user_id, size in sizes.items()
+                         for recipe_id in popular.sample(size)),
+                        batch_size):
+                    model.objects.bulk_create(batch, ignore_conflicts=True)
+                    counts[key] += len(batch)
+        sizes = {user_id: rng.randint(0, 2 * subscriptions)
+                 for user_id in user_ids}
+        sizes.update(follow_users)
+        for batch in batched(
+                (Subscribe(user_id=user_id, author_id=author_id)
+                 for user_id, size in sizes.items()
+                 for author_id in authors.sample(size, exclude=user_id)),
+                batch_size):
+            Subscribe.objects.bulk_create(batch, ignore_conflicts=True)
+            counts['subscriptions'] += len(batch)
+        rebuild()
+        reconcile()
+        search_engine().update(recipe_ids)
+    cache.clear()
+    return counts
+
+
+class Command(BaseCommand):
+    """ Синтетические данные для нагрузочного тестирования. """
+    help = ('Создание пользователей, рецептов, избранного, корзин '
+            'и подписок пакетными вставками. '
+            'Запуск: python manage.py generate_fake_data '
+            '[--users N] [--recipes N] [--seed N].')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=100,
+            help='Количество пользователей.')
+        parser.add_argument(
+            '--recipes', type=int, default=1000,
+            help='Количество рецептов.')
+        parser.add_argument(
+            '--favorites', type=int, default=10,
+            help='Среднее количество избранных рецептов у пользователя.')
+        parser.add_argument(
+            '--cart', type=int, default=5,
+            help='Среднее количество рецептов в корзине.')
+        parser.add_argument(
+            '--subscriptions', type=int, default=5,
+            help='Среднее количество подписок.')
+        parser.add_argument(
+            '--cart-sizes', type=int, nargs='*', default=list(CART_SIZES),
+            help='Дополнительные пользователи fakeN_cartM с корзиной '
+                 'ровно из M рецептов.')
+        parser.add_argument(
+            '--follow-sizes', type=int, nargs='*',
+            default=list(FOLLOW_SIZES),
+            help='Дополнительные пользователи fakeN_followM, подписанные '
+                 'на M авторов (не больше --users).')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора случайных чисел.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество записей в одном INSERT.')
+        parser.add_argument(
+            '--file', default=FILE,
+            help='Файл ингредиентов, если таблица пуста.')
+
+    def handle(self, *args, **options) -> None:
+        start_time = datetime.datetime.now()
+        counts = generate(
+            options['users'], options['recipes'], options['favorites'],
+            options['cart'], options['subscriptions'], options['cart_sizes'],
+            options['seed'], options['batch_size'], options['file'],
+            options['follow_sizes'])
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за '
+            f'{(datetime.datetime.now() - start_time).total_seconds()} '
+            f'сек.'))
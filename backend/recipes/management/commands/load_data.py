@@ -1,39 +1,145 @@
+import csv
 import datetime
 import json
+import os
+import re
+from itertools import islice
 
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
+from api.caching import bump_version
 from recipes.models import Ingredient
 
 
 FILE: str = f'{settings.BASE_DIR}/data/ingredients.json'
+BATCH_SIZE: int = 1000
+CHUNK_SIZE: int = 64 * 1024
+WHITESPACE = re.compile(r'[ \t\n\r]*')
 
+NAME_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
 
-def import_json_data() -> None:
-    """ Обработка файла json. """
-    with open(FILE, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-        for note in data:
-            Ingredient.objects.get_or_create(**note)
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    """
+    Потоковый разбор JSON-массива: элементы читаются по одному,
+    файл целиком в память не загружается.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size)
+    position = WHITESPACE.match(buffer).end()
+    if buffer[position:position + 1] != '[':
+        raise ValueError('Ожидается массив JSON.')
+    position += 1
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+        if buffer.startswith(',', position):
+            position = WHITESPACE.match(buffer, position + 1).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+
+
+def iter_json_rows(file):
+    for note in iter_json_array(file):
+        if not isinstance(note, dict):
+            note = {}
+        yield note.get('name'), note.get('measurement_unit')
+
+
+def iter_csv_rows(file):
+    for row in csv.reader(file):
+        if row == ['name', 'measurement_unit']:
+            continue
+        yield tuple(row) if len(row) == 2 else (None, None)
+
+
+READERS = {
+    '.json': iter_json_rows,
+    '.csv': iter_csv_rows,
+}
+
+
+def iter_ingredients(rows):
+    """ Проверка строк файла и построение объектов Ингредиент. """
+    for number, (name, measurement_unit) in enumerate(rows, start=1):
+        name = (name or '').strip()
+        measurement_unit = (measurement_unit or '').strip()
+        if (not name or not measurement_unit
+                or len(name) > NAME_LENGTH
+                or len(measurement_unit) > UNIT_LENGTH):
+            raise CommandError(
+                f'Некорректная запись №{number}: '
+                f'{name!r}, {measurement_unit!r}.')
+        yield Ingredient(name=name, measurement_unit=measurement_unit)
+
+
+def import_data(path, batch_size, dry_run=False) -> tuple:
+    """
+    Загрузка ингредиентов пакетами в одной транзакции.
+    Повторяющиеся (name, measurement_unit) пропускаются ограничением
+    уникальности, поэтому повторный запуск ничего не меняет.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in READERS:
+        raise CommandError(
+            'Поддерживаются файлы: {0}.'.format(', '.join(READERS)))
+    total = 0
+    with open(path, 'r', encoding='utf-8') as file, transaction.atomic():
+        count_before = Ingredient.objects.count()
+        ingredients = iter_ingredients(READERS[extension](file))
+        while True:
+            batch = list(islice(ingredients, batch_size))
+            if not batch:
+                break
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+        created = Ingredient.objects.count() - count_before
+        if dry_run:
+            transaction.set_rollback(True)
+        elif created:
+            transaction.on_commit(lambda: bump_version(Ingredient))
+    return total, created
 
 
 class Command(BaseCommand):
-    """ Загрузка данных из json файла. """
-    help = ('Загрузка данных из /data/ingredients.json.'
-            'Запуск: python manage.py load_data.')
+    """ Загрузка ингредиентов из json или csv файла. """
+    help = ('Загрузка данных из /data/ingredients.json или .csv. '
+            'Запуск: python manage.py load_data '
+            '[--file путь] [--batch-size N] [--dry-run].')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', default=FILE,
+            help='Файл с ингредиентами (.json или .csv).')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество записей в одном INSERT.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Проверить файл и откатить изменения.')
 
     def handle(self, *args, **options) -> None:
         start_time = datetime.datetime.now()
         try:
-            import_json_data()
-        except Exception as error:
-            self.stdout.write(
-                self.style.WARNING(f'Сбой в работе импорта: {error}.')
-            )
-        else:
-            self.stdout.write(self.style.SUCCESS(
-                f'Загрузка данных завершена за '
-                f' {(datetime.datetime.now() - start_time).total_seconds()} '
-                f'сек.')
-            )
+            total, created = import_data(
+                options['file'], options['batch_size'], options['dry_run'])
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Сбой в работе импорта: {error}.')
+        seconds = (datetime.datetime.now() - start_time).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Проверка" if options["dry_run"] else "Загрузка"} данных '
+            f'завершена за {seconds} сек.: прочитано {total}, '
+            f'новых {created}, {int(total / (seconds or 1e-9))} строк/с.')
+        )
@@ -0,0 +1,215 @@
+import datetime
+import json
+import os
+import sys
+import tempfile
+from itertools import islice
+
+from django.apps import apps
+from django.core import serializers
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .gc_media import recount
+from .load_data import iter_json_array
+from .rebuild_counters import reconcile
+from .rebuild_search_index import rebuild_search
+from .rebuild_shopping_list import rebuild
+
+FILE: str = 'dump.json'
+BATCH_SIZE: int = 1000
+EXCLUDE: tuple = ('contenttypes', 'auth.permission')
+NDJSON_EXTENSIONS: tuple = ('.ndjson', '.jsonl')
+
+
+def is_excluded(model, exclude):
+    """ Модель исключена по метке приложения или app_label.model. """
+    return (model._meta.app_label in exclude
+            or model._meta.label_lower in exclude)
+
+
+def dependencies(model):
+    """ Модели, на которые ссылаются внешние ключи и связи M2M. """
+    for field in model._meta.get_fields():
+        if field.concrete and (field.many_to_one or field.one_to_one
+                               or field.many_to_many):
+            if field.related_model is not model:
+                yield field.related_model
+
+
+def visit(model, models, ordered, visiting=frozenset()):
+    """ Обход в глубину: модель - после моделей из models, на которые
+    она ссылается; циклические ссылки пропускаются. """
+    if model in ordered or model in visiting:
+        return
+    for dependency in dependencies(model):
+        if dependency in models:
+            visit(dependency, models, ordered, visiting | {model})
+    ordered.append(model)
+
+
+def dependency_order(models):
+    """
+    Топологическая сортировка моделей: каждая модель идет после тех,
+    на которые ссылается (пользователи - тэги и ингредиенты - рецепты -
+    таблицы связей - избранное, корзины, подписки).
+    """
+    models = set(models)
+    ordered = []
+    for model in sorted(models, key=lambda model: model._meta.label):
+        visit(model, models, ordered)
+    return ordered
+
+
+def iter_objects(file, ndjson):
+    """ Объекты дампа по одному: массив JSON или NDJSON. """
+    if ndjson:
+        return (json.loads(line) for line in file if line.strip())
+    return iter_json_array(file)
+
+
+def spill(objects, directory, exclude):
+    """
+    Раскладка объектов по временным файлам моделей: порядок в дампе
+    произвольный, а вставлять нужно в порядке зависимостей.
+    """
+    files = {}
+    counts = {}
+    try:
+        for obj in objects:
+            model = apps.get_model(obj['model'])
+            if is_excluded(model, exclude):
+                continue
+            if model not in files:
+                files[model] = open(
+                    os.path.join(directory, model._meta.label_lower),
+                    'w', encoding='utf-8')
+                counts[model] = 0
+            files[model].write(json.dumps(obj, ensure_ascii=False) + '\n')
+            counts[model] += 1
+    finally:
+        for file in files.values():
+            file.close()
+    return counts
+
+
+def insert_m2m(deserialized, using):
+    """ Строки таблиц связей M2M для пакета объектов. """
+    rows = {}
+    for item in deserialized:
+        for name, pks in (item.m2m_data or {}).items():
+            field = item.object._meta.get_field(name)
+            through = field.remote_field.through
+            source = through._meta.get_field(field.m2m_field_name()).attname
+            target = through._meta.get_field(
+                field.m2m_reverse_field_name()).attname
+            rows.setdefault(through, []).extend(
+                through(**{source: item.object.pk, target: pk})
+                for pk in pks)
+    for through, objects in rows.items():
+        through._base_manager.using(using).bulk_create(
+            objects, ignore_conflicts=True)
+
+
+def insert_raw(model, objects, fields, using):
+    """
+    INSERT объектов как есть, как в loaddata: значения auto_now_add
+    и других полей с pre_save берутся из дампа, а не вычисляются заново.
+    Публичный bulk_create всегда вызывает pre_save, поэтому здесь -
+    внутренний QuerySet._insert с raw=True; его использование собрано
+    в этой функции и проверено тестом выгрузки и загрузки дампа.
+    """
+    model._base_manager.using(using)._insert(
+        objects, fields=fields, raw=True, using=using)
+
+
+def load_model(model, path, batch_size, using):
+    """ Пакетная вставка объектов одной модели. """
+    fields = model._meta.local_concrete_fields
+    with open(path, 'r', encoding='utf-8') as file:
+        lines = (json.loads(line) for line in file)
+        while True:
+            batch = list(islice(lines, batch_size))
+            if not batch:
+                break
+            deserialized = list(serializers.deserialize(
+                'python', batch, using=using, ignorenonexistent=True))
+            objects = [item.object for item in deserialized]
+            step = max(connections[using].ops.bulk_batch_size(
+                fields, objects), 1)
+            for start in range(0, len(objects), step):
+                insert_raw(model, objects[start:start + step], fields, using)
+            insert_m2m(deserialized, using)
+
+
+def load_dump(path, batch_size, exclude, using=DEFAULT_DB_ALIAS) -> dict:
+    """ Загрузка дампа в одной транзакции со сбросом последовательностей. """
+    ndjson = path.endswith(NDJSON_EXTENSIONS)
+    connection = connections[using]
+    with tempfile.TemporaryDirectory() as directory:
+        if path == '-':
+            counts = spill(iter_objects(sys.stdin, ndjson), directory,
+                           exclude)
+        else:
+            with open(path, 'r', encoding='utf-8') as file:
+                counts = spill(iter_objects(file, ndjson), directory,
+                               exclude)
+        models = dependency_order(counts)
+        with transaction.atomic(using=using):
+            with connection.constraint_checks_disabled():
+                for model in models:
+                    load_model(
+                        model,
+                        os.path.join(directory, model._meta.label_lower),
+                        batch_size, using)
+            connection.check_constraints(
+                table_names=[model._meta.db_table for model in models])
+            sequence_sql = connection.ops.sequence_reset_sql(
+                no_style(), models)
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+            rebuild()
+            recount()
+            reconcile()
+            rebuild_search()
+    cache.clear()
+    return {model._meta.label: counts[model] for model in models}
+
+
+class Command(BaseCommand):
+    """ Быстрая загрузка дампа базы данных. """
+    help = ('Загрузка дампа (json или ndjson) пакетными вставками '
+            'в порядке зависимостей моделей. '
+            'Запуск: python manage.py load_dump dump.json '
+            '[--batch-size N] [-e app_label[.model]].')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file', nargs='?', default=FILE,
+            help='Файл дампа; "-" - чтение из stdin '
+                 '(формат json, для ndjson - файл .ndjson).')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество объектов в одном INSERT.')
+        parser.add_argument(
+            '-e', '--exclude', action='append', default=[],
+            help='Пропустить приложение или модель (app_label.model).')
+
+    def handle(self, *args, **options) -> None:
+        start_time = datetime.datetime.now()
+        exclude = {label.lower() for label in (
+            *EXCLUDE, *options['exclude'])}
+        try:
+            counts = load_dump(options['file'], options['batch_size'],
+                               exclude)
+        except (OSError, ValueError, LookupError) as error:
+            raise CommandError(f'Сбой загрузки дампа: {error}.')
+        for label, count in counts.items():
+            self.stdout.write(f'{label}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено объектов: {sum(counts.values())} за '
+            f'{(datetime.datetime.now() - start_time).total_seconds()} '
+            f'сек.'))
@@ -2,18 +2,19 @@ from django.core.management import BaseCommand
 
 from recipes.models import Tag
 
+TAGS: tuple = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#008000', 'dinner'),
+    ('Ужин', '#7366BD', 'supper'),
+)
+
 
 class Command(BaseCommand):
     help = ('Создание тегов. Запуск: python '
             'manage.py load_tags.py.')
 
     def handle(self, *args, **kwargs):
-        tags = (
-            ('Завтрак', '#E26C2D', 'breakfast'),
-            ('Обед', '#008000', 'dinner'),
-            ('Ужин', '#7366BD', 'supper'),
-        )
-        for tag in tags:
+        for tag in TAGS:
             name, color, slug = tag
             Tag.objects.get_or_create(
                 name=name,
@@ -0,0 +1,68 @@
+import datetime
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import COUNTERS
+
+
+def actual_count(source, foreign_key):
+    """ Подзапрос: количество объектов связи для строки счетчика. """
+    return Coalesce(Subquery(
+        source.objects.filter(
+            **{foreign_key: OuterRef('pk')}
+        ).order_by().values(foreign_key).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def drift() -> dict:
+    """ Количество строк, в которых счетчик разошелся с данными. """
+    return {
+        f'{model._meta.label}.{field}': model._base_manager.annotate(
+            actual=actual_count(source, foreign_key)
+        ).exclude(**{field: F('actual')}).count()
+        for model, field, source, foreign_key in COUNTERS
+    }
+
+
+def reconcile() -> dict:
+    """ Пересчет счетчиков, в которых найдены расхождения. """
+    found = drift()
+    with transaction.atomic():
+        for model, field, source, foreign_key in COUNTERS:
+            if found[f'{model._meta.label}.{field}']:
+                model._base_manager.update(
+                    **{field: actual_count(source, foreign_key)})
+    return found
+
+
+class Command(BaseCommand):
+    """ Сверка и пересчет счетчиков. """
+    help = ('Сверка счетчиков избранного, корзин, рецептов и подписчиков '
+            'с данными и исправление расхождений. '
+            'Запуск: python manage.py rebuild_counters [--verify].')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить счетчики, не изменяя их.')
+
+    def handle(self, *args, **options) -> None:
+        start_time = datetime.datetime.now()
+        found = drift() if options['verify'] else reconcile()
+        for name, count in found.items():
+            if count:
+                self.stdout.write(self.style.WARNING(
+                    f'{name}: расхождений {count}.'))
+        if options['verify'] and any(found.values()):
+            raise CommandError(
+                f'Расхождений в счетчиках: {sum(found.values())}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики согласованы за '
+            f'{(datetime.datetime.now() - start_time).total_seconds()} '
+            f'сек.'))
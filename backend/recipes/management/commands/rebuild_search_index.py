@@ -0,0 +1,60 @@
+import datetime
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from api.caching import (
+    LOCAL_CACHE_WARNING,
+    bump_version,
+    is_process_local_cache
+)
+from recipes.models import RecipeList
+from recipes.search import BATCH_SIZE, postgres_engine, search_engine
+
+
+def rebuild_search(batch_size=BATCH_SIZE) -> int:
+    """
+    Переиндексация всех рецептов в PostgreSQL: после загрузки данных
+    пакетными вставками, которые не вызывают сигналов. Возвращает
+    количество рецептов в индексе. Индекс в памяти (другие базы данных)
+    принадлежит веб-процессам и перестраивается ими самими, поэтому
+    здесь он не пересчитывается.
+    """
+    if search_engine() is not postgres_engine:
+        return 0
+    try:
+        return postgres_engine.rebuild(batch_size)
+    finally:
+        # Пакеты, записанные до ошибки, тоже меняют результаты поиска.
+        bump_version(RecipeList, 'search')
+
+
+class Command(BaseCommand):
+    """ Переиндексация рецептов для полнотекстового поиска. """
+    help = ('Пересчет поисковых векторов рецептов (только PostgreSQL: '
+            'индекс в памяти для других баз данных строится в каждом '
+            'веб-процессе и перестраивается им не реже чем раз '
+            'в SEARCH_INDEX_TTL секунд). '
+            'Запуск: python manage.py rebuild_search_index '
+            '[--batch-size N].')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество рецептов в одном UPDATE.')
+
+    def handle(self, *args, **options) -> None:
+        if search_engine() is not postgres_engine:
+            raise CommandError(
+                'Поисковый индекс этой базы данных хранится в памяти '
+                'веб-процессов: команда его не обновит, процессы '
+                'перестроят его сами за SEARCH_INDEX_TTL = '
+                f'{settings.SEARCH_INDEX_TTL} сек.')
+        if is_process_local_cache():
+            self.stderr.write(self.style.WARNING(LOCAL_CACHE_WARNING))
+        start_time = datetime.datetime.now()
+        indexed = rebuild_search(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {indexed} за '
+            f'{(datetime.datetime.now() - start_time).total_seconds()} '
+            f'сек.'))
@@ -0,0 +1,81 @@
+import datetime
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+BATCH_SIZE: int = 1000
+
+
+def live_totals() -> dict:
+    """ Список покупок, рассчитанный по корзинам пользователей. """
+    return {
+        (row['recipe__shopping_cart__user'], row['ingredient']): row['total']
+        for row in ShoppingListItem.objects.aggregate_from_carts().iterator()
+    }
+
+
+def stored_totals() -> dict:
+    """ Содержимое сводной таблицы. """
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount
+        in ShoppingListItem.objects.filter(amount__gt=0).values_list(
+            'user_id', 'ingredient_id', 'amount').iterator()
+    }
+
+
+def rebuild() -> int:
+    """ Пересоздание сводной таблицы. """
+    with transaction.atomic():
+        ShoppingListItem.objects.all().delete()
+        batch = []
+        created = 0
+        for row in ShoppingListItem.objects.aggregate_from_carts().iterator():
+            batch.append(ShoppingListItem(
+                user_id=row['recipe__shopping_cart__user'],
+                ingredient_id=row['ingredient'],
+                amount=row['total']))
+            if len(batch) >= BATCH_SIZE:
+                ShoppingListItem.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        ShoppingListItem.objects.bulk_create(batch)
+        return created + len(batch)
+
+
+class Command(BaseCommand):
+    """ Пересчет сводного списка покупок. """
+    help = ('Пересоздание и проверка сводного списка покупок. '
+            'Запуск: python manage.py rebuild_shopping_list [--verify].')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить таблицу с корзинами, не изменяя её.')
+
+    def handle(self, *args, **options) -> None:
+        start_time = datetime.datetime.now()
+        if not options['verify']:
+            created = rebuild()
+            self.stdout.write(f'Записано позиций: {created}.')
+        expected = live_totals()
+        actual = stored_totals()
+        mismatches = [
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        ]
+        for user_id, ingredient_id in mismatches[:20]:
+            self.stdout.write(self.style.WARNING(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'ожидалось {expected.get((user_id, ingredient_id))}, '
+                f'в таблице {actual.get((user_id, ingredient_id))}.'))
+        if mismatches:
+            raise CommandError(
+                f'Расхождений со списком покупок: {len(mismatches)}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Список покупок согласован за '
+            f'{(datetime.datetime.now() - start_time).total_seconds()} '
+            f'сек.'))
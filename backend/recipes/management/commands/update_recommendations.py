@@ -0,0 +1,155 @@
+import datetime
+from functools import partial
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+from scipy import sparse
+
+from .update_similar_recipes import top_neighbours
+from api.caching import (
+    LOCAL_CACHE_WARNING,
+    bump_version,
+    is_process_local_cache
+)
+from recipes.models import (
+    FavoriteRecipe,
+    RecipeList,
+    RelatedRecipe,
+    ShoppingCart
+)
+
+BATCH_SIZE: int = 1000
+CHUNK_SIZE: int = 200
+STREAM_CHUNK_SIZE: int = 10000
+
+
+def read_links(model, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Пары (пользователь, рецепт) массивом n x 2: строки читаются
+    потоком и накапливаются в массивах по chunk_size, без списка
+    объектов на всю таблицу.
+    """
+    rows = model.objects.order_by().values_list(
+        'user_id', 'recipe_id').iterator(chunk_size=chunk_size)
+    parts = [np.zeros((0, 2), dtype=np.int64)]
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            break
+        parts.append(np.array(batch, dtype=np.int64))
+    return np.concatenate(parts)
+
+
+def interaction_matrix(cart_weight=settings.RELATED_CART_WEIGHT,
+                       max_user_recipes=settings.RELATED_MAX_USER_RECIPES):
+    """
+    Матрица пользователь x рецепт: 1 - рецепт в избранном,
+    cart_weight - только в корзине. Пользователи, у которых больше
+    max_user_recipes рецептов, не учитываются: время расчета растет
+    как квадрат длины списка, а связи в таких списках случайны.
+    Возвращает (матрица CSR, id рецептов по столбцам).
+    """
+    ids = np.array(RecipeList._base_manager.order_by('pk').values_list(
+        'pk', flat=True), dtype=np.int64)
+    links = [read_links(FavoriteRecipe), read_links(ShoppingCart)]
+    # Рецепты, созданные после чтения id, попадут в следующий расчет.
+    links = [part[np.isin(part[:, 1], ids)] for part in links]
+    users = np.unique(np.concatenate([part[:, 0] for part in links]))
+    favorites, cart = (
+        sparse.csr_matrix(
+            (np.full(len(part), weight, dtype=np.float32),
+             (np.searchsorted(users, part[:, 0]),
+              np.searchsorted(ids, part[:, 1]))),
+            shape=(len(users), len(ids)))
+        for part, weight in zip(links, (1, cart_weight)))
+    matrix = favorites.maximum(cart).tocsr()
+    heavy = np.diff(matrix.indptr) > max_user_recipes
+    if heavy.any():
+        matrix = (sparse.diags((~heavy).astype(np.float32)) @ matrix).tocsr()
+        matrix.eliminate_zeros()
+    return matrix, ids
+
+
+def iter_related(matrix, limit=settings.RELATED_RECIPES_LIMIT,
+                 min_support=settings.RELATED_MIN_SUPPORT,
+                 chunk_size=CHUNK_SIZE):
+    """
+    Для каждого рецепта с отметками - (столбцы соседей, связь)
+    по убыванию. Совместные отметки - произведение матриц рецепт x
+    пользователь и пользователь x рецепт блоками по chunk_size
+    рецептов; связь - косинус столбцов, пары с суммой совместных
+    отметок меньше min_support отбрасываются как случайные.
+    """
+    transposed = matrix.T.tocsr()
+    norms = np.sqrt(np.asarray(
+        transposed.multiply(transposed).sum(axis=1)).ravel())
+    rows = np.flatnonzero(norms)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        block = (transposed[chunk] @ matrix).tocsr()
+        block_rows = np.repeat(chunk, np.diff(block.indptr))
+        block.data = np.where(
+            block.data >= min_support,
+            block.data / (norms[block_rows] * norms[block.indices]), 0)
+        block.eliminate_zeros()
+        yield from top_neighbours(chunk, block, limit, 0)
+
+
+def update_related(batch_size=BATCH_SIZE, chunk_size=CHUNK_SIZE) -> tuple:
+    """
+    Пересчет связанных рецептов по избранному и корзинам.
+    Возвращает (число отметок, число рецептов со списками, записей).
+    """
+    matrix, ids = interaction_matrix()
+    recipes, written, batch = 0, 0, []
+    with transaction.atomic():
+        RelatedRecipe.objects.all().delete()
+        for row, columns, scores in iter_related(
+                matrix, chunk_size=chunk_size):
+            if not len(columns):
+                continue
+            recipe_id = int(ids[row])
+            recipes += 1
+            batch.extend(
+                RelatedRecipe(recipe_id=recipe_id, related_id=related_id,
+                              score=round(score, 6))
+                for related_id, score in zip(ids[columns].tolist(),
+                                             scores.tolist()))
+            if len(batch) >= batch_size:
+                RelatedRecipe.objects.bulk_create(batch, batch_size)
+                written, batch = written + len(batch), []
+        RelatedRecipe.objects.bulk_create(batch, batch_size)
+        transaction.on_commit(partial(bump_version, RelatedRecipe))
+    return matrix.nnz, recipes, written + len(batch)
+
+
+class Command(BaseCommand):
+    """ Расчет рекомендаций по избранному и корзинам. """
+    help = ('Пересчет рецептов, которые добавляют вместе, для '
+            '/api/recipes/recommended/; запускается периодически, '
+            'например из cron раз в час. '
+            'Запуск: python manage.py update_recommendations '
+            '[--chunk-size N] [--batch-size N].')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Количество рецептов в одном блоке умножения матриц.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество строк в одной вставке.')
+
+    def handle(self, *args, **options) -> None:
+        if is_process_local_cache():
+            self.stderr.write(self.style.WARNING(LOCAL_CACHE_WARNING))
+        start_time = datetime.datetime.now()
+        links, recipes, written = update_related(
+            options['batch_size'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Отметок: {links}, рецептов со связями: {recipes}, '
+            f'записей: {written} за '
+            f'{(datetime.datetime.now() - start_time).total_seconds()} '
+            f'сек.'))
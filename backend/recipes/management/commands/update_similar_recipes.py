@@ -0,0 +1,242 @@
+import datetime
+
+import numpy as np
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from scipy import sparse
+
+from recipes.models import (
+    IngredientInRecipe,
+    RecipeList,
+    SimilarRecipe,
+    TagInRecipe
+)
+
+BATCH_SIZE: int = 1000
+CHUNK_SIZE: int = 500
+# Ингредиент не считается частым, пока он есть не больше чем у стольких
+# рецептов: на небольшом сайте кандидаты - все пары с общим ингредиентом.
+MIN_FREQUENT_COUNT: int = 1000
+
+
+def read_pairs(queryset, fields):
+    """ Пары (рецепт, признак) массивом n x 2. """
+    return np.array(
+        list(queryset.order_by().values_list(*fields).iterator()),
+        dtype=np.int64).reshape(-1, 2)
+
+
+def feature_matrix(tag_weight=settings.SIMILAR_TAG_WEIGHT,
+                   max_df=settings.SIMILAR_MAX_DF,
+                   candidate_df=settings.SIMILAR_CANDIDATE_DF):
+    """
+    Векторы рецептов: строка - рецепт, столбцы - ингредиенты и тэги
+    с весом idf (у тэгов - с множителем tag_weight). Признаки, которые
+    есть больше чем у доли max_df рецептов, рецепты не различают
+    и отбрасываются. Строки нормированы: скалярное произведение
+    строк - косинусное сходство рецептов.
+    Матрица делится по столбцам на редкие ингредиенты и частые
+    признаки (тэги и ингредиенты больше чем у доли candidate_df
+    рецептов): пары рецептов с общими частыми признаками - почти
+    все пары, поэтому кандидатами в похожие считаются только рецепты
+    с общим редким ингредиентом. Возвращает (редкие, частые, id).
+    """
+    ids = np.array(RecipeList._base_manager.order_by('pk').values_list(
+        'pk', flat=True), dtype=np.int64)
+    matrices, weights, frequent = [], [], []
+    for queryset, fields, weight in (
+            (IngredientInRecipe.objects.filter(ingredient__isnull=False),
+             ('recipe_id', 'ingredient_id'), 1),
+            (TagInRecipe.objects, ('recipelist_id', 'tag_id'), tag_weight)):
+        pairs = read_pairs(queryset, fields)
+        _, columns = np.unique(pairs[:, 1], return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.float32),
+             (np.searchsorted(ids, pairs[:, 0]), columns)),
+            shape=(len(ids), columns.max(initial=-1) + 1))
+        matrix.data[:] = 1
+        frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+        idf = (np.log((1 + len(ids)) / (1 + frequency)) + 1) * weight
+        idf[frequency > max_df * len(ids)] = 0
+        matrices.append(matrix)
+        weights.append(idf)
+        frequent.append(
+            frequency > max(candidate_df * len(ids), MIN_FREQUENT_COUNT)
+            if weight == 1
+            else np.ones(len(frequency), dtype=bool))
+    matrix = sparse.hstack(matrices, format='csr') @ sparse.diags(
+        np.concatenate(weights).astype(np.float32))
+    matrix.eliminate_zeros()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    matrix = (sparse.diags(1 / norms).astype(np.float32) @ matrix).tocsc()
+    frequent = np.concatenate(frequent)
+    return (matrix[:, np.flatnonzero(~frequent)].tocsr(),
+            matrix[:, np.flatnonzero(frequent)].tocsr(), ids)
+
+
+def iter_blocks(features, rows, chunk_size=CHUNK_SIZE):
+    """
+    Сходство строк rows с рецептами, у которых есть общий с ними
+    редкий ингредиент: произведение матриц блоками по chunk_size
+    строк, чтобы память не зависела от числа рецептов в квадрате;
+    вклад частых признаков досчитывается только для найденных пар.
+    Выдает (строки блока, блок CSR).
+    """
+    rare, frequent, _ = features
+    transposed = rare.T.tocsr()
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        block = (rare[chunk] @ transposed).tocsr()
+        block_rows = np.repeat(chunk, np.diff(block.indptr))
+        block.data += np.asarray(frequent[block_rows].multiply(
+            frequent[block.indices]).sum(axis=1), dtype=np.float32).ravel()
+        yield chunk, block
+
+
+def top_neighbours(chunk, block, limit, min_score):
+    """
+    Для каждой строки блока - (строка, столбцы соседей, сходство)
+    по убыванию. Лучшие limit соседей отбираются сразу для всего
+    блока: одна сортировка пар по ключу (строка, -сходство); при равном
+    сходстве порядок - по возрастанию столбца соседа.
+    """
+    positions = np.repeat(np.arange(len(chunk)), np.diff(block.indptr))
+    columns, scores = block.indices, block.data
+    keep = (columns != chunk[positions]) & (scores >= min_score)
+    positions, columns, scores = (
+        positions[keep], columns[keep], scores[keep])
+    order = np.argsort(
+        positions * 2.0 - np.minimum(scores, 1), kind='stable')
+    positions, columns, scores = (
+        positions[order], columns[order], scores[order])
+    starts = np.searchsorted(positions, np.arange(len(chunk) + 1))
+    for position, row in enumerate(chunk):
+        start = starts[position]
+        end = min(starts[position + 1], start + limit)
+        yield row, columns[start:end], scores[start:end]
+
+
+def iter_neighbours(features, rows, limit=settings.SIMILAR_RECIPES_LIMIT,
+                    min_score=settings.SIMILAR_MIN_SCORE,
+                    chunk_size=CHUNK_SIZE):
+    """ Для каждой строки rows - (строки соседей, сходство) по убыванию. """
+    for chunk, block in iter_blocks(features, rows, chunk_size):
+        yield from top_neighbours(chunk, block, limit, min_score)
+
+
+def affected_rows(features, changed, limit=settings.SIMILAR_RECIPES_LIMIT,
+                  min_score=settings.SIMILAR_MIN_SCORE,
+                  chunk_size=CHUNK_SIZE):
+    """
+    Строки, списки которых нужно пересчитать после изменения рецептов
+    changed: сами рецепты, рецепты, у которых они в списке,
+    и рецепты, в список которых они теперь попадают - сходство выше
+    последнего в списке (или список короче limit).
+    """
+    ids = features[2]
+    thresholds = np.full(len(ids), min_score, dtype=np.float32)
+    lists = SimilarRecipe.objects.order_by().values('recipe_id').annotate(
+        lowest=Min('score'), count=Count('id')).filter(count__gte=limit)
+    for recipe_id, lowest in lists.values_list(
+            'recipe_id', 'lowest').iterator():
+        thresholds[np.searchsorted(ids, recipe_id)] = max(lowest, min_score)
+    changed_ids = ids[changed].tolist()
+    listing = np.array(list(SimilarRecipe.objects.filter(
+        similar_id__in=changed_ids).values_list('recipe_id', flat=True)),
+        dtype=np.int64)
+    affected = [changed, np.searchsorted(ids, listing)]
+    for _, block in iter_blocks(features, changed, chunk_size):
+        affected.append(
+            block.indices[block.data > thresholds[block.indices]])
+    return np.unique(np.concatenate(affected))
+
+
+def write_neighbours(features, rows, full, batch_size=BATCH_SIZE,
+                     chunk_size=CHUNK_SIZE):
+    """ Замена списков рецептов rows; возвращает число записей. """
+    ids = features[2]
+    if full:
+        SimilarRecipe.objects.all().delete()
+    else:
+        row_ids = ids[rows].tolist()
+        for start in range(0, len(row_ids), batch_size):
+            SimilarRecipe.objects.filter(
+                recipe_id__in=row_ids[start:start + batch_size]).delete()
+    written, batch = 0, []
+    for row, columns, scores in iter_neighbours(
+            features, rows, chunk_size=chunk_size):
+        recipe_id = int(ids[row])
+        batch.extend(
+            SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                          score=round(score, 6))
+            for similar_id, score in zip(ids[columns].tolist(),
+                                         scores.tolist()))
+        if len(batch) >= batch_size:
+            SimilarRecipe.objects.bulk_create(batch, batch_size)
+            written, batch = written + len(batch), []
+    SimilarRecipe.objects.bulk_create(batch, batch_size)
+    return written + len(batch)
+
+
+def update_similar(full=False, batch_size=BATCH_SIZE,
+                   chunk_size=CHUNK_SIZE) -> tuple:
+    """
+    Пересчет похожих рецептов: всех (full или при пустой таблице)
+    или только затронутых изменениями с прошлого запуска. Веса idf
+    при этом берутся текущие, а списки остальных рецептов сохраняют
+    прежние; накопившийся сдвиг весов убирает периодический --full.
+    Возвращает (число пересчитанных рецептов, число записей).
+    """
+    started = timezone.now()
+    features = feature_matrix()
+    ids = features[2]
+    stale = RecipeList._base_manager.filter(
+        similarity_changed__lte=started)
+    full = full or not SimilarRecipe.objects.exists()
+    if full:
+        rows = np.arange(len(ids))
+    else:
+        changed = np.array(list(stale.values_list('pk', flat=True)),
+                           dtype=np.int64)
+        changed = np.searchsorted(ids, changed[np.isin(changed, ids)])
+        if not len(changed):
+            return 0, 0
+        rows = affected_rows(features, changed, chunk_size=chunk_size)
+    with transaction.atomic():
+        written = write_neighbours(
+            features, rows, full, batch_size, chunk_size)
+        stale.update(similarity_changed=None)
+    return len(rows), written
+
+
+class Command(BaseCommand):
+    """ Расчет похожих рецептов по ингредиентам и тэгам. """
+    help = ('Пересчет похожих рецептов (/api/recipes/{id}/similar/): '
+            'по умолчанию - только затронутых изменениями с прошлого '
+            'запуска, например из cron каждые 10 минут. '
+            'Запуск: python manage.py update_similar_recipes [--full] '
+            '[--chunk-size N].')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать списки всех рецептов.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Количество рецептов в одном блоке умножения матриц.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество строк в одной вставке.')
+
+    def handle(self, *args, **options) -> None:
+        start_time = datetime.datetime.now()
+        recipes, written = update_similar(
+            options['full'], options['batch_size'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, записей: {written} за '
+            f'{(datetime.datetime.now() - start_time).total_seconds()} '
+            f'сек.'))
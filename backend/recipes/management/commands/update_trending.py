@@ -0,0 +1,113 @@
+import datetime
+import math
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.caching import (
+    LOCAL_CACHE_WARNING,
+    bump_version,
+    is_process_local_cache
+)
+from recipes.models import FavoriteRecipe, RecipeList, ShoppingCart
+
+BATCH_SIZE: int = 1000
+EPOCH = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+# Вес события: добавление в избранное важнее добавления в корзину.
+EVENT_WEIGHTS: tuple = ((FavoriteRecipe, 1.0), (ShoppingCart, 0.5))
+
+
+def decayed_sums(now, half_life, window) -> dict:
+    """
+    Сумма весов событий за окно window для каждого рецепта; вес события
+    уменьшается вдвое за каждые half_life секунд его возраста.
+    """
+    sums = defaultdict(float)
+    for model, weight in EVENT_WEIGHTS:
+        events = model.objects.filter(
+            created__gt=now - datetime.timedelta(seconds=window),
+            created__lte=now,
+        ).values_list('recipe_id', 'created').order_by()
+        for recipe_id, created in events.iterator():
+            age = (now - created).total_seconds()
+            sums[recipe_id] += weight * 0.5 ** (age / half_life)
+    return sums
+
+
+def trending_scores(now, half_life=settings.TRENDING_HALF_LIFE,
+                    window=settings.TRENDING_WINDOW) -> dict:
+    """
+    Рейтинг рецептов с событиями за окно: логарифм затухающей суммы,
+    приведенный к эпохе EPOCH. Порядок рецептов тот же, что по сумме
+    на момент now, но значение не уменьшается со временем само по себе:
+    оно меняется только при появлении, удалении или устаревании событий.
+    """
+    shift = (now - EPOCH).total_seconds() / half_life
+    return {
+        recipe_id: round(shift + math.log2(value), 6)
+        for recipe_id, value in decayed_sums(now, half_life, window).items()
+    }
+
+
+def update_trending(now=None, half_life=settings.TRENDING_HALF_LIFE,
+                    window=settings.TRENDING_WINDOW,
+                    batch_size=BATCH_SIZE) -> int:
+    """
+    Запись рейтинга только в изменившиеся строки; рецепты без событий
+    за окно получают 0. Возвращает количество обновленных рецептов.
+    """
+    now = now or timezone.now()
+    scores = trending_scores(now, half_life, window)
+    with transaction.atomic():
+        current = dict(RecipeList._base_manager.filter(
+            trending_score__gt=0).values_list('pk', 'trending_score'))
+        changed = {
+            pk: score for pk, score in scores.items()
+            if current.get(pk, 0) != score
+        }
+        changed.update(
+            (pk, 0) for pk in current.keys() - scores.keys())
+        RecipeList._base_manager.bulk_update(
+            [RecipeList(pk=pk, trending_score=score)
+             for pk, score in changed.items()],
+            ['trending_score'], batch_size=batch_size)
+        if changed:
+            transaction.on_commit(
+                partial(bump_version, RecipeList, 'trending'))
+    return len(changed)
+
+
+class Command(BaseCommand):
+    """ Пересчет рейтинга популярных за последние дни рецептов. """
+    help = ('Пересчет рейтинга ?ordering=trending по событиям избранного '
+            'и корзины за последние дни. Запускается периодически, '
+            'например из cron каждые 10 минут. '
+            'Запуск: python manage.py update_trending '
+            '[--half-life сек] [--window сек].')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--half-life', type=int, default=settings.TRENDING_HALF_LIFE,
+            help='Период, за который вес события уменьшается вдвое, сек.')
+        parser.add_argument(
+            '--window', type=int, default=settings.TRENDING_WINDOW,
+            help='Учитываются события не старше N секунд.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество строк в одном UPDATE.')
+
+    def handle(self, *args, **options) -> None:
+        if is_process_local_cache():
+            self.stderr.write(self.style.WARNING(LOCAL_CACHE_WARNING))
+        start_time = datetime.datetime.now()
+        updated = update_trending(
+            half_life=options['half_life'], window=options['window'],
+            batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рецептов: {updated} за '
+            f'{(datetime.datetime.now() - start_time).total_seconds()} '
+            f'сек.'))
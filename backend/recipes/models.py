@@ -1,9 +1,33 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (
+    Case,
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Sum,
+    Value,
+    When,
+    Window
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Greatest, RowNumber, Upper
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .storage import ContentAddressedStorage
+from users.models import CountersMixin, Subscribe, UserLinkQuerySet
 
 User = get_user_model()
 
+# Состав рецептов изменен пакетно (bulk_create), без сигналов
+# IngredientInRecipe: sender - RecipeList, аргумент recipe_ids.
+ingredients_changed = Signal()
+
 
 class Tag(models.Model):
     """
@@ -34,6 +58,27 @@ class Tag(models.Model):
         return self.name
 
 
+class TrigramIndex(GinIndex):
+    """
+    GIN-индекс триграмм для поиска по подстроке (LIKE '%...%'). Создается
+    только в PostgreSQL, вместе с расширением pg_trgm: миграции
+    генерируются при развертывании, и отдельной миграции для расширения
+    нет. Выражение индекса совпадает с тем, что Django строит для
+    icontains и istartswith: UPPER(name::text).
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        return super().create_sql(model, schema_editor, using, **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().remove_sql(model, schema_editor, **kwargs)
+
+
 class Ingredient(models.Model):
     """
     Модель Ингредиент.
@@ -51,15 +96,109 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient')
+        ]
+        indexes = [
+            TrigramIndex(
+                OpClass(Upper(Cast('name', models.TextField())),
+                        name='gin_trgm_ops'),
+                name='ingredient_name_trgm_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}.'
 
 
-class RecipeList(models.Model):
+class SearchVectorIndex(GinIndex):
+    """
+    GIN-индекс поискового вектора. Создается только в PostgreSQL:
+    с другими базами данных поиск идет по индексу в памяти.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().create_sql(model, schema_editor, using, **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().remove_sql(model, schema_editor, **kwargs)
+
+
+class RecipeQuerySet(models.QuerySet):
+    """
+    Запросы к рецептам с подгрузкой связанных данных.
+    """
+
+    def with_related(self):
+        """ Подгрузка тэгов и ингредиентов фиксированным числом запросов. """
+        return self.prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient')
+            ),
+        )
+
+    def with_user_annotations(self, user):
+        """ Флаги избранного, корзины и подписки на автора
+        для пользователя. """
+        if user is None or user.is_anonymous:
+            false = Value(False, output_field=models.BooleanField())
+            return self.select_related('author').annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+            )
+        authors = User.objects.annotate(
+            is_subscribed=Exists(Subscribe.objects.filter(
+                user=user, author=OuterRef('pk'))))
+        return self.prefetch_related(
+            Prefetch('author', queryset=authors)
+        ).annotate(
+            is_favorited=Exists(FavoriteRecipe.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def for_user(self, user):
+        """ Полный набор данных для сериализации рецептов
+        без поискового вектора. """
+        return self.with_related().with_user_annotations(user).defer(
+            'search_vector')
+
+    def latest_per_author(self, author_ids, limit):
+        """ Не более limit последних рецептов каждого автора.
+        Нумерация ROW_NUMBER() по автору выполняется в базе данных. """
+        ranked = self.model.objects.filter(
+            author_id__in=author_ids
+        ).annotate(
+            author_rank=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=[F('pub_date').desc(), F('id').desc()],
+            )
+        ).order_by().values('id', 'author_rank')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.author_rank <= %s',
+            (*params, limit)
+        ))
+
+
+class RecipeList(CountersMixin, models.Model):
     """
     Модель Рецепт.
     """
+    counter_fields = ('favorites_count', 'in_carts_count')
+    computed_fields = ('trending_score', 'search_vector', 'similarity_changed')
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -73,6 +212,7 @@ class RecipeList(models.Model):
     image = models.ImageField(
         'Ссылка на картинку на сайте',
         upload_to='static/recipe/',
+        storage=ContentAddressedStorage(),
         blank=True,
         null=True
     )
@@ -86,6 +226,7 @@ class RecipeList(models.Model):
     )
     tags = models.ManyToManyField(
         Tag,
+        through='TagInRecipe',
         verbose_name='Ярлык'
     )
     cooking_time = models.PositiveIntegerField(
@@ -97,11 +238,60 @@ class RecipeList(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В корзинах',
+        default=0,
+        editable=False
+    )
+    trending_score = models.FloatField(
+        'Рейтинг популярности за последние дни',
+        default=0,
+        editable=False
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
+    similarity_changed = models.DateTimeField(
+        'Состав изменен после расчета похожих рецептов',
+        null=True,
+        default=timezone.now,
+        editable=False,
+        db_index=True
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_favorites_id_idx'),
+            models.Index(
+                fields=['-trending_score', '-id'],
+                name='recipe_trending_id_idx'),
+            models.Index(
+                fields=['cooking_time', 'id'],
+                name='recipe_cooking_time_id_idx'),
+            SearchVectorIndex(
+                fields=['search_vector'],
+                name='recipe_search_vector_idx'),
+        ]
 
     def __str__(self):
         return f'{self.author.email}, {self.name}'
@@ -144,12 +334,49 @@ class IngredientInRecipe(models.Model):
         ]
 
 
+class TagInRecipe(models.Model):
+    """
+    Модель связи рецепта и тэга.
+    Индекс (tag, recipelist) обслуживает фильтрацию рецептов по тэгам.
+    """
+    recipelist = models.ForeignKey(
+        RecipeList,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        verbose_name='Тэг'
+    )
+
+    class Meta:
+        db_table = 'recipes_recipelist_tags'
+        verbose_name = 'Тэг рецепта'
+        verbose_name_plural = 'Тэги рецептов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipelist', 'tag'],
+                name='unique_recipe_and_tag')
+        ]
+        indexes = [
+            models.Index(
+                fields=['tag', 'recipelist'],
+                name='tag_recipe_idx')
+        ]
+
+
 class RecipeUserList(models.Model):
     """Общий класс-предок для Избранное и Покупка."""
     recipe = models.ForeignKey(RecipeList, on_delete=models.CASCADE,
                                verbose_name='Рецепт')
     user = models.ForeignKey(User, on_delete=models.CASCADE,
                              verbose_name='Пользователь')
+    created = models.DateTimeField('Дата добавления', default=timezone.now,
+                                   db_index=True)
+
+    target_field = 'recipe'
+    objects = UserLinkQuerySet.as_manager()
 
     class Meta:
         abstract = True
@@ -195,3 +422,291 @@ class ShoppingCart(RecipeUserList):
     def __str__(self):
         return (f'Пользователь {self.user} '
                 f'добавил {self.recipe.name} в покупки.')
+
+
+class SimilarRecipe(models.Model):
+    """
+    Модель Похожий рецепт.
+    Ближайшие по ингредиентам и тэгам рецепты, рассчитанные командой
+    update_similar_recipes; список рецепта читается по индексу
+    (recipe, -score).
+    """
+    recipe = models.ForeignKey(
+        RecipeList,
+        on_delete=models.CASCADE,
+        related_name='similar',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        RecipeList,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('recipe', '-score')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe')
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} -> {self.similar_id}: {self.score:.3f}'
+
+
+class RelatedRecipe(models.Model):
+    """
+    Модель Рецепт, который добавляют вместе.
+    Соседи рецепта по совместному появлению в избранном и корзинах,
+    рассчитанные командой update_recommendations; список рецепта
+    читается по индексу (recipe, -score).
+    """
+    recipe = models.ForeignKey(
+        RecipeList,
+        on_delete=models.CASCADE,
+        related_name='related',
+        verbose_name='Рецепт'
+    )
+    related = models.ForeignKey(
+        RecipeList,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Связанный рецепт'
+    )
+    score = models.FloatField('Связь')
+
+    class Meta:
+        verbose_name = 'Связанный рецепт'
+        verbose_name_plural = 'Связанные рецепты'
+        ordering = ('recipe', '-score')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'related'],
+                name='unique_related_recipe')
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='related_recipe_score_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} -> {self.related_id}: {self.score:.3f}'
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    """
+    Поддержка сводного списка покупок в актуальном состоянии.
+    """
+
+    def _change(self, recipes, user_ids, sign):
+        """ Сумма ингредиентов рецептов прибавляется одним UPDATE. """
+        amounts = IngredientInRecipe.objects.filter(
+            recipe__in=recipes, ingredient__isnull=False
+        ).values('ingredient_id').annotate(
+            total=Sum('amount')
+        ).values_list('ingredient_id', 'total').order_by()
+        self.change_amounts(
+            {ingredient_id: sign * amount
+             for ingredient_id, amount in amounts}, user_ids)
+
+    def change_amounts(self, deltas, user_ids):
+        """
+        Изменить количество ингредиентов в списках пользователей:
+        deltas - {ингредиент: прибавка}, отрицательная - вычесть.
+        Недостающие позиции создаются, обнуленные удаляются. Внутри
+        транзакции вызывающего кода точка сохранения не создается.
+        """
+        deltas = {ingredient_id: delta
+                  for ingredient_id, delta in deltas.items() if delta}
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic(savepoint=False):
+            added = [ingredient_id
+                     for ingredient_id, delta in deltas.items() if delta > 0]
+            if added:
+                self.bulk_create(
+                    [self.model(user_id=user_id,
+                                ingredient_id=ingredient_id,
+                                amount=0)
+                     for user_id in user_ids
+                     for ingredient_id in added],
+                    ignore_conflicts=True)
+            self.filter(
+                user_id__in=user_ids, ingredient_id__in=deltas
+            ).update(amount=F('amount') + Case(
+                *(When(ingredient_id=ingredient_id, then=Value(delta))
+                  for ingredient_id, delta in deltas.items()),
+                default=Value(0),
+                output_field=models.IntegerField()))
+            self.filter(
+                user_id__in=user_ids, ingredient_id__in=deltas,
+                amount__lte=0).delete()
+
+    def add_recipe(self, recipe, user_ids):
+        """ Добавить ингредиенты рецепта в списки пользователей. """
+        self._change([recipe], user_ids, 1)
+
+    def remove_recipe(self, recipe, user_ids):
+        """ Вычесть ингредиенты рецепта из списков пользователей. """
+        self._change([recipe], user_ids, -1)
+
+    def add_recipes(self, recipes, user_id):
+        """ Добавить ингредиенты нескольких рецептов в список. """
+        self._change(recipes, [user_id], 1)
+
+    def remove_recipes(self, recipes, user_id):
+        """ Вычесть ингредиенты нескольких рецептов из списка. """
+        self._change(recipes, [user_id], -1)
+
+    def aggregate_from_carts(self):
+        """ Список покупок, рассчитанный заново по корзинам. """
+        return IngredientInRecipe.objects.filter(
+            recipe__shopping_cart__isnull=False,
+            ingredient__isnull=False
+        ).values(
+            'recipe__shopping_cart__user', 'ingredient'
+        ).annotate(
+            total=Sum('amount')
+        ).order_by()
+
+
+class ShoppingListItem(models.Model):
+    """
+    Модель Сводный список покупок.
+    Суммарное количество ингредиента по всем рецептам в корзине.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(
+        'Количество',
+        default=0
+    )
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        ordering = ('user', 'ingredient')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item')
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} {self.amount}'
+
+
+# Счетчики: (модель, поле, модель связи, внешний ключ на модель).
+COUNTERS: tuple = (
+    (RecipeList, 'favorites_count', FavoriteRecipe, 'recipe'),
+    (RecipeList, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', RecipeList, 'author'),
+    (User, 'subscribers_count', Subscribe, 'author'),
+)
+
+
+def change_counter(model, field, pk, delta):
+    """ Атомарное изменение счетчика выражением F(). """
+    change_counters(model, field, [pk], delta)
+
+
+def change_counters(model, field, pks, delta):
+    """ Изменение счетчика нескольких объектов одним UPDATE. """
+    model._base_manager.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+class MediaFileQuerySet(models.QuerySet):
+    """
+    Счетчики ссылок на файлы хранилища.
+    """
+
+    def _change(self, name, delta):
+        if not name:
+            return
+        with transaction.atomic():
+            if delta > 0:
+                self.bulk_create([self.model(name=name)],
+                                 ignore_conflicts=True)
+            self.filter(name=name).update(
+                references=Greatest(F('references') + delta, 0),
+                updated=timezone.now())
+
+    def acquire(self, name):
+        """ Файл стал использоваться еще одним объектом. """
+        self._change(name, 1)
+
+    def release(self, name):
+        """ Файл перестал использоваться объектом. """
+        self._change(name, -1)
+
+    def orphans(self, before):
+        """
+        Файлы без ссылок, не изменявшиеся с момента before.
+        Файлы, на которые все же ссылаются рецепты, не попадают в выборку,
+        даже если счетчик разошелся с данными.
+        """
+        return self.filter(
+            references=0, updated__lt=before
+        ).exclude(
+            Exists(RecipeList.objects.filter(image=OuterRef('name')))
+        )
+
+
+class MediaFile(models.Model):
+    """
+    Модель Файл хранилища.
+    Количество рецептов, ссылающихся на файл; файлы без ссылок
+    удаляются командой gc_media.
+    """
+    name = models.CharField(
+        'Путь к файлу',
+        max_length=255,
+        unique=True
+    )
+    references = models.PositiveIntegerField(
+        'Количество ссылок',
+        default=0
+    )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        default=timezone.now
+    )
+
+    objects = MediaFileQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+        ordering = ('name',)
+        indexes = [
+            models.Index(
+                fields=['references', 'updated'],
+                name='media_file_orphans_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.references})'
@@ -0,0 +1,343 @@
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector
+)
+from django.db import connection
+from django.db.models import (
+    F,
+    FloatField,
+    OuterRef,
+    Subquery,
+    Value
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from .models import IngredientInRecipe, RecipeList
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE: int = 1000
+# Поля документа и их веса в ранжировании (как веса A, B, D в PostgreSQL).
+FIELD_WEIGHTS: tuple = (('name', 'A'), ('ingredients', 'B'), ('text', 'D'))
+RANK_WEIGHTS: dict = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+TOKEN_RE = re.compile(r'\w+')
+# Окончания, которые отбрасываются у слов длиннее MIN_STEM_LENGTH букв:
+# грубая замена русского стеммера PostgreSQL для индекса в памяти.
+ENDINGS: frozenset = frozenset((
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие',
+    'ов', 'ев', 'ах', 'ях', 'ам', 'ям', 'ом', 'ем', 'ую', 'юю',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+))
+MIN_STEM_LENGTH: int = 4
+# Служебные слова не индексируются, как в словаре russian PostgreSQL.
+STOP_WORDS: frozenset = frozenset((
+    'а', 'в', 'во', 'да', 'для', 'до', 'же', 'за', 'и', 'из', 'или', 'к',
+    'как', 'ко', 'на', 'не', 'но', 'о', 'об', 'от', 'по', 'под', 'при',
+    'с', 'со', 'у', 'что',
+))
+# Последнее слово запроса ищется по началу, если в нем не меньше букв.
+PREFIX_MIN_LENGTH: int = 3
+STEM_CACHE_SIZE: int = 100000
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(word):
+    """ Основа слова без регистра, различия е/ё и самого длинного
+    окончания; словарь текстов невелик, поэтому основы кэшируются. """
+    word = word.lower().replace('ё', 'е')
+    if len(word) > MIN_STEM_LENGTH:
+        for length in (3, 2, 1):
+            if word[-length:] in ENDINGS:
+                return word[:-length]
+    return word
+
+
+def tokenize(value):
+    """ Основы слов текста без служебных слов. """
+    return [stem(word) for word in TOKEN_RE.findall((value or '').lower())
+            if word not in STOP_WORDS]
+
+
+class SearchEngine(ABC):
+    """
+    Полнотекстовый поиск рецептов по названию, ингредиентам и описанию.
+    search() отбирает рецепты запроса и добавляет релевантность
+    в аннотацию search_rank; сортирует результат фильтр сортировки.
+    """
+
+    @abstractmethod
+    def search(self, queryset, query):
+        """ Рецепты запроса с аннотацией search_rank. """
+
+    @abstractmethod
+    def update(self, recipe_ids):
+        """ Переиндексация рецептов; удаленные рецепты выпадают из индекса. """
+
+    @abstractmethod
+    def rebuild(self):
+        """ Переиндексация всех рецептов. """
+
+
+class PostgresSearchEngine(SearchEngine):
+    """
+    Поиск по столбцу RecipeList.search_vector с GIN-индексом.
+    Вектор хранится в базе данных и пересчитывается одним UPDATE
+    при изменении рецепта или его ингредиентов.
+    """
+    config = settings.SEARCH_CONFIG
+
+    def vector(self):
+        """ Выражение вектора рецепта; ингредиенты - подзапросом. """
+        ingredients = IngredientInRecipe.objects.filter(
+            recipe=OuterRef('pk'), ingredient__isnull=False
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', delimiter=' ')
+        ).values('names')
+        fields = {'name': 'name', 'ingredients': Subquery(ingredients),
+                  'text': 'text'}
+        vectors = [
+            SearchVector(fields[field], weight=weight, config=self.config)
+            for field, weight in FIELD_WEIGHTS
+        ]
+        vector = vectors[0]
+        for other in vectors[1:]:
+            vector = vector + other
+        return vector
+
+    def search(self, queryset, query):
+        query = SearchQuery(query, config=self.config,
+                            search_type='websearch')
+        # ts_rank возвращает real: после приведения к double precision
+        # значение из курсора пагинации равно значению в строке.
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=Cast(SearchRank(F('search_vector'), query),
+                             FloatField()))
+
+    def update(self, recipe_ids, batch_size=BATCH_SIZE):
+        recipe_ids = list(recipe_ids)
+        for start in range(0, len(recipe_ids), batch_size):
+            RecipeList._base_manager.filter(
+                pk__in=recipe_ids[start:start + batch_size]
+            ).update(search_vector=self.vector())
+
+    def rebuild(self, batch_size=BATCH_SIZE):
+        pks = list(RecipeList._base_manager.order_by(
+            'pk').values_list('pk', flat=True))
+        self.update(pks, batch_size)
+        return len(pks)
+
+
+class InMemorySearchEngine(SearchEngine):
+    """
+    Инвертированный индекс в памяти процесса для SQLite и режима
+    разработки: основа слова -> {рецепт: вес}. Вес - сумма весов полей,
+    в которых встречается слово; релевантность - сумма весов слов
+    запроса с поправкой на их редкость (idf). Найденными считаются
+    рецепты со всеми словами запроса, последнее слово - по началу.
+    Индекс строится при первом обращении, изменения рецептов
+    вносятся в него сигналами, а полностью он перестраивается в фоне
+    не реже чем раз в SEARCH_INDEX_TTL секунд, чтобы изменения,
+    сделанные в других процессах, не терялись.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        self._documents = None
+        self._keys = None
+        self._built_at = 0
+        self._refreshing = False
+
+    @staticmethod
+    def _read(recipe_ids=None):
+        """ Слова рецептов с весами: {рецепт: {основа: вес}}. """
+        recipes = RecipeList._base_manager.order_by()
+        links = IngredientInRecipe.objects.filter(
+            ingredient__isnull=False).order_by()
+        if recipe_ids is not None:
+            recipes = recipes.filter(pk__in=recipe_ids)
+            links = links.filter(recipe_id__in=recipe_ids)
+        ingredients = defaultdict(list)
+        for recipe_id, name in links.values_list(
+                'recipe_id', 'ingredient__name').iterator():
+            ingredients[recipe_id].append(name)
+        documents = {}
+        for pk, name, text in recipes.values_list(
+                'pk', 'name', 'text').iterator():
+            fields = {'name': name, 'ingredients': ' '.join(ingredients[pk]),
+                      'text': text}
+            weights = {}
+            for field, weight in FIELD_WEIGHTS:
+                weight = RANK_WEIGHTS[weight]
+                for token, count in Counter(tokenize(fields[field])).items():
+                    weights[token] = weights.get(token, 0) + count * weight
+            documents[pk] = weights
+        return documents
+
+    def _add(self, pk, weights):
+        self._documents[pk] = tuple(weights)
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                insort(self._keys, token)
+            postings[pk] = weight
+
+    def _remove(self, pk):
+        for token in self._documents.pop(pk, ()):
+            postings = self._postings[token]
+            del postings[pk]
+            if not postings:
+                del self._postings[token]
+                del self._keys[bisect_left(self._keys, token)]
+
+    def _collect(self):
+        """ Новый индекс: (слово -> рецепты, рецепт -> слова, слова). """
+        postings, documents = defaultdict(dict), {}
+        for pk, weights in self._read().items():
+            documents[pk] = tuple(weights)
+            for token, weight in weights.items():
+                postings[token][pk] = weight
+        return dict(postings), documents, sorted(postings)
+
+    def _build(self):
+        self._postings, self._documents, self._keys = self._collect()
+        self._built_at = time.monotonic()
+
+    def _refresh(self):
+        """ Перестроение в фоновом потоке: до его окончания поиск
+        идет по прежнему индексу. """
+        try:
+            collected = self._collect()
+            with self._lock:
+                self._postings, self._documents, self._keys = collected
+                self._built_at = time.monotonic()
+        except Exception:
+            logger.exception('Не удалось перестроить поисковый индекс')
+        finally:
+            self._refreshing = False
+            connection.close()
+
+    def _ensure_built(self):
+        """ Первое построение - сразу; устаревший индекс перестраивается
+        в фоне, чтобы запрос не ждал чтения всех рецептов. """
+        if self._postings is None:
+            self._build()
+        elif (not self._refreshing and time.monotonic() - self._built_at
+              > settings.SEARCH_INDEX_TTL):
+            self._refreshing = True
+            threading.Thread(target=self._refresh, daemon=True,
+                             name='search-index').start()
+
+    def _match(self, token, prefix):
+        """ Рецепты с основой token (или основами, начинающимися с неё). """
+        if not prefix:
+            return self._postings.get(token, {})
+        start = bisect_left(self._keys, token)
+        end = bisect_left(self._keys, token + '\uffff', start)
+        if end - start == 1:
+            return self._postings[self._keys[start]]
+        matches = {}
+        for key in self._keys[start:end]:
+            for pk, weight in self._postings[key].items():
+                if weight > matches.get(pk, 0):
+                    matches[pk] = weight
+        return matches
+
+    def ranked(self, query, limit=None):
+        """ Не более limit пар (релевантность, рецепт) по убыванию. """
+        limit = limit or settings.SEARCH_RESULTS_LIMIT
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        with self._lock:
+            self._ensure_built()
+            total = len(self._documents)
+            matches = [self._match(token, prefix=(
+                position == len(tokens) - 1
+                and len(token) >= PREFIX_MIN_LENGTH))
+                for position, token in enumerate(tokens)]
+            matches.sort(key=len)
+            scores = {}
+            for position, postings in enumerate(matches):
+                idf = math.log(1 + total / max(len(postings), 1))
+                if position == 0:
+                    scores = {pk: weight * idf
+                              for pk, weight in postings.items()}
+                    continue
+                scores = {pk: score + postings[pk] * idf
+                          for pk, score in scores.items() if pk in postings}
+                if not scores:
+                    break
+        return heapq.nlargest(
+            limit, ((round(score, 6), pk) for pk, score in scores.items()))
+
+    def search(self, queryset, query):
+        ranked = self.ranked(query)
+        if not ranked:
+            return queryset.none().annotate(
+                search_rank=Value(0.0, output_field=FloatField()))
+        # Релевантность - один CASE в SQL: выражение из сотен When()
+        # компилируется ORM заметно дольше, чем выполняется.
+        column = '{0}.{1}'.format(
+            connection.ops.quote_name(RecipeList._meta.db_table),
+            connection.ops.quote_name(RecipeList._meta.pk.column))
+        rank = RawSQL(
+            'CASE {0} {1} ELSE 0 END'.format(
+                column, ' '.join(['WHEN %s THEN %s'] * len(ranked))),
+            [value for score, pk in ranked for value in (pk, score)],
+            output_field=FloatField())
+        return queryset.filter(
+            pk__in=[pk for _, pk in ranked]).annotate(search_rank=rank)
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+
+    def update(self, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        if self._postings is None:
+            return
+        if len(recipe_ids) > BATCH_SIZE:
+            self.invalidate()
+            return
+        documents = self._read(recipe_ids)
+        with self._lock:
+            if self._postings is None:
+                return
+            for pk in recipe_ids:
+                self._remove(pk)
+                if pk in documents:
+                    self._add(pk, documents[pk])
+
+    def rebuild(self):
+        with self._lock:
+            self._build()
+            return len(self._documents)
+
+
+postgres_engine = PostgresSearchEngine()
+memory_engine = InMemorySearchEngine()
+
+
+def search_engine():
+    """ Поиск средствами PostgreSQL, для других баз - индекс в памяти. """
+    if connection.vendor == 'postgresql':
+        return postgres_engine
+    return memory_engine
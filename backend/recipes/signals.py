@@ -0,0 +1,177 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .batching import CommitBatch
+from .images import schedule_thumbnails
+from .models import (
+    COUNTERS,
+    IngredientInRecipe,
+    MediaFile,
+    RecipeList,
+    ShoppingCart,
+    ShoppingListItem,
+    SimilarRecipe,
+    TagInRecipe,
+    change_counter,
+    change_counters,
+    ingredients_changed
+)
+from users.models import links_added, links_removed
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    """ Рецепт добавлен в корзину. """
+    if created:
+        ShoppingListItem.objects.add_recipe(
+            instance.recipe_id, [instance.user_id])
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    """ Рецепт удален из корзины, в том числе вместе с рецептом. """
+    ShoppingListItem.objects.remove_recipe(
+        instance.recipe_id, [instance.user_id])
+
+
+@receiver(links_added, sender=ShoppingCart)
+def add_many_to_shopping_list(sender, user_id, target_ids, **kwargs):
+    """ Несколько рецептов добавлены в корзину одним запросом. """
+    ShoppingListItem.objects.add_recipes(target_ids, user_id)
+
+
+@receiver(links_removed, sender=ShoppingCart)
+def remove_many_from_shopping_list(sender, user_id, target_ids, **kwargs):
+    """ Несколько рецептов удалены из корзины одним запросом. """
+    ShoppingListItem.objects.remove_recipes(target_ids, user_id)
+
+
+@receiver(post_save, sender=RecipeList)
+def create_thumbnails(sender, instance, update_fields=None, **kwargs):
+    """ Миниатюры изображения рецепта после фиксации транзакции. """
+    if not instance.image:
+        return
+    if update_fields is None or 'image' in update_fields:
+        transaction.on_commit(
+            partial(schedule_thumbnails, instance.image.name))
+
+
+@receiver(pre_save, sender=RecipeList)
+def remember_image(sender, instance, update_fields=None, **kwargs):
+    """ Запоминаем прежнее изображение рецепта для счетчика ссылок. """
+    if instance.pk is None:
+        instance._stored_image = None
+    elif update_fields is not None and 'image' not in update_fields:
+        instance._stored_image = instance.image.name
+    else:
+        instance._stored_image = RecipeList.objects.filter(
+            pk=instance.pk).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=RecipeList)
+def count_image_references(sender, instance, created, **kwargs):
+    """ Изображение рецепта заменено: переносим ссылку на новый файл. """
+    stored = None if created else getattr(instance, '_stored_image', None)
+    if instance.image.name != stored:
+        MediaFile.objects.acquire(instance.image.name)
+        MediaFile.objects.release(stored)
+
+
+@receiver(post_delete, sender=RecipeList)
+def release_image(sender, instance, **kwargs):
+    """ Рецепт удален: файл изображения теряет ссылку. """
+    MediaFile.objects.release(instance.image.name)
+
+
+def mark_similarity_changed(recipe_ids):
+    """ Похожие рецепты пересчитает команда update_similar_recipes. """
+    RecipeList._base_manager.filter(
+        pk__in=recipe_ids, similarity_changed__isnull=True
+    ).update(similarity_changed=timezone.now())
+
+
+# Отметка одним UPDATE после фиксации транзакции: удаление рецепта или
+# замена состава вызывает сигналы для каждой строки ингредиентов.
+similarity_marks = CommitBatch(mark_similarity_changed)
+
+
+@receiver(ingredients_changed, sender=RecipeList)
+def ingredients_replaced(sender, recipe_ids, **kwargs):
+    similarity_marks.add(recipe_ids)
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def ingredient_in_recipe_changed(sender, instance, **kwargs):
+    similarity_marks.add([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=TagInRecipe)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    """ Тэги рецепта изменены, в том числе со стороны тэга. """
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            similarity_marks.add([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        similarity_marks.add(pk_set)
+    elif action == 'pre_clear':
+        mark_similarity_changed(TagInRecipe.objects.filter(
+            tag=instance).values('recipelist_id'))
+
+
+@receiver(pre_delete, sender=RecipeList)
+def similar_recipe_deleted(sender, instance, **kwargs):
+    """ Рецепты, у которых удаляемый рецепт был похожим. """
+    mark_similarity_changed(SimilarRecipe.objects.filter(
+        similar=instance).values('recipe_id'))
+
+
+def count_created(sender, instance, created, raw=False, **kwargs):
+    """ Создан объект связи: увеличиваем счетчики. """
+    if not created or raw:
+        return
+    for model, field, source, foreign_key in COUNTERS:
+        if source is sender:
+            change_counter(model, field,
+                           getattr(instance, f'{foreign_key}_id'), 1)
+
+
+def count_deleted(sender, instance, **kwargs):
+    """ Удален объект связи: уменьшаем счетчики. """
+    for model, field, source, foreign_key in COUNTERS:
+        if source is sender:
+            change_counter(model, field,
+                           getattr(instance, f'{foreign_key}_id'), -1)
+
+
+def count_links(sender, target_ids, delta):
+    for model, field, source, foreign_key in COUNTERS:
+        if source is sender and foreign_key == sender.target_field:
+            change_counters(model, field, target_ids, delta)
+
+
+@receiver(links_added)
+def count_links_added(sender, target_ids, **kwargs):
+    """ Пакет связей добавлен: счетчики одним UPDATE. """
+    count_links(sender, target_ids, 1)
+
+
+@receiver(links_removed)
+def count_links_removed(sender, target_ids, **kwargs):
+    """ Пакет связей удален: счетчики одним UPDATE. """
+    count_links(sender, target_ids, -1)
+
+
+for source in {source for _, _, source, _ in COUNTERS}:
+    post_save.connect(count_created, sender=source)
+    post_delete.connect(count_deleted, sender=source)
@@ -0,0 +1,42 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище файлов по хэшу содержимого.
+    Одинаковые файлы записываются один раз, каталоги разбиты
+    по первым символам хэша: static/recipe/ab/cd/abcd....png.
+    """
+    shard_depth = 2
+    shard_width = 2
+
+    def hashed_name(self, name, digest):
+        """ Путь файла с заданным хэшем содержимого. """
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        shards = [
+            digest[level * self.shard_width:(level + 1) * self.shard_width]
+            for level in range(self.shard_depth)
+        ]
+        return '/'.join(
+            part for part in (directory, *shards, digest + extension) if part)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        name = self.hashed_name(name, digest.hexdigest())
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
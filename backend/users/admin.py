@@ -10,7 +10,8 @@ EMPTY_STRING: str = '-пусто-'
 class UserAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'username', 'email',
-        'first_name', 'last_name',)
+        'first_name', 'last_name',
+        'recipes_count', 'subscribers_count',)
     search_fields = ('email', 'username', 'first_name', 'last_name')
     list_filter = ('email', 'first_name')
     empty_value_display = EMPTY_STRING
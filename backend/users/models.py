@@ -1,13 +1,122 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef
+from django.dispatch import Signal
 
 USER = 'user'
 ADMIN = 'admin'
 
+# Результаты пакетного изменения связей для каждого id.
+ADDED = 'added'
+REMOVED = 'removed'
+EXISTS = 'exists'
+MISSING = 'missing'
+NOT_FOUND = 'not_found'
+FORBIDDEN = 'forbidden'
 
-class User(AbstractUser):
+# Пакетное изменение связей пользователя без save() и delete():
+# sender - модель связи, аргументы user_id и target_ids.
+links_added = Signal()
+links_removed = Signal()
+
+
+class CountersMixin:
+    """
+    Счетчики меняются только выражениями F() в сигналах: при сохранении
+    существующего объекта они не записываются, чтобы устаревшие значения
+    в памяти не затерли актуальные. Так же сохраняются поля computed_fields,
+    которые пересчитываются запросами UPDATE вне save() (рейтинг,
+    поисковый вектор и т.п.).
+    """
+    counter_fields: tuple = ()
+    computed_fields: tuple = ()
+
+    def save(self, *args, **kwargs):
+        if (not args and not self._state.adding
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.name not in self.computed_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+class UserLinkQuerySet(models.QuerySet):
+    """
+    Пакетное добавление и удаление связей пользователя с объектами
+    (рецептами в избранном и корзине, авторами в подписках).
+    Поле объекта задает target_field модели связи. Операции одного
+    пользователя выполняются по очереди: строка пользователя блокируется
+    до конца транзакции. Счетчики, списки покупок и кэш обновляют
+    получатели сигналов links_added и links_removed - один раз на пакет.
+    """
+
+    def _lock_user(self, user):
+        list(User._base_manager.select_for_update().filter(
+            pk=user.pk).values_list('pk'))
+
+    def bulk_add(self, user, target_ids):
+        """ Добавление связей: {id: ADDED|EXISTS|NOT_FOUND}. """
+        field = self.model.target_field
+        target_model = self.model._meta.get_field(field).related_model
+        with transaction.atomic():
+            self._lock_user(user)
+            found = dict(target_model._base_manager.filter(
+                pk__in=target_ids
+            ).annotate(linked=Exists(self.filter(
+                user=user, **{field: OuterRef('pk')}))
+            ).values_list('pk', 'linked'))
+            added = [pk for pk in target_ids
+                     if pk in found and not found[pk]]
+            if added:
+                self.bulk_create(
+                    [self.model(user=user, **{f'{field}_id': pk})
+                     for pk in added],
+                    ignore_conflicts=True)
+                links_added.send(sender=self.model, user_id=user.pk,
+                                 target_ids=added)
+        return {pk: NOT_FOUND if pk not in found else
+                EXISTS if found[pk] else ADDED for pk in target_ids}
+
+    def bulk_remove(self, user, target_ids):
+        """
+        Удаление связей: {id: REMOVED|MISSING}. Строки удаляются
+        запросами DELETE по частям из BULK_MAX_IDS id, без
+        QuerySet.delete(): тот вызывает pre_delete и post_delete для
+        каждой строки, и их получатели повторили бы работу получателей
+        links_removed. На строки связей не ссылаются другие таблицы,
+        поэтому каскадного удаления нет.
+        """
+        field = self.model.target_field
+        removed = set()
+        with transaction.atomic():
+            self._lock_user(user)
+            for start in range(0, len(target_ids), settings.BULK_MAX_IDS):
+                links = self.filter(user=user, **{
+                    f'{field}_id__in':
+                        target_ids[start:start + settings.BULK_MAX_IDS]})
+                found = set(links.order_by().values_list(
+                    f'{field}_id', flat=True))
+                if found:
+                    links._raw_delete(self.db)
+                    removed |= found
+            if removed:
+                links_removed.send(sender=self.model, user_id=user.pk,
+                                   target_ids=sorted(removed))
+        return {pk: REMOVED if pk in removed else MISSING
+                for pk in target_ids}
+
+
+class User(CountersMixin, AbstractUser):
     ROLES = ((USER, USER), (ADMIN, ADMIN))
+    counter_fields = ('recipes_count', 'subscribers_count')
 
     username = models.CharField(
         verbose_name='Ник пользователя',
@@ -36,6 +145,16 @@ class User(AbstractUser):
         max_length=150,
         help_text='Введите фамилию'
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -77,6 +196,9 @@ class Subscribe(models.Model):
         'Дата подписки',
         auto_now_add=True)
 
+    target_field = 'author'
+    objects = UserLinkQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'